@@ -0,0 +1,35 @@
+"""
+Prompt history
+Revision ID: 0002_prompt_history
+Revises: 0001_assets
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_prompt_history"
+down_revision = "0001_assets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prompt_history",
+        sa.Column("seq", sa.BigInteger(), primary_key=True, autoincrement=False),
+        sa.Column("prompt_id", sa.String(length=255), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=True),
+        sa.Column("completed_at", sa.BigInteger(), nullable=False),
+        sa.Column("entry", sa.Text(), nullable=False),
+    )
+    op.create_index("uq_prompt_history_prompt_id", "prompt_history", ["prompt_id"], unique=True)
+    op.create_index("ix_prompt_history_status", "prompt_history", ["status"])
+    op.create_index("ix_prompt_history_completed_at", "prompt_history", ["completed_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prompt_history_completed_at", table_name="prompt_history")
+    op.drop_index("ix_prompt_history_status", table_name="prompt_history")
+    op.drop_index("uq_prompt_history_prompt_id", table_name="prompt_history")
+    op.drop_table("prompt_history")
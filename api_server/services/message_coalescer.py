@@ -0,0 +1,32 @@
+# Events that carry the full current state, a newer one for the same key replaces an older one
+# that wasn't sent yet. The key is (event, sid) plus these fields of the data.
+COALESCED_EVENTS = {
+    "progress": ("prompt_id", "node"),
+    "progress_state": ("prompt_id",),
+    "status": (),
+}
+
+
+def coalesce_key(event, data, sid):
+    fields = COALESCED_EVENTS.get(event, None) if isinstance(event, str) else None
+    if fields is None or not isinstance(data, dict):
+        return None
+    return (event, sid) + tuple(data.get(f, None) for f in fields)
+
+
+def coalesce_messages(messages):
+    """
+    Drops the (event, data, sid) messages that a later message in the list supersedes. Returns the
+    remaining messages in order, each at the position of the newest message with its key.
+    """
+    seen = set()
+    out = []
+    for message in reversed(messages):
+        key = coalesce_key(*message)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(message)
+    out.reverse()
+    return out
@@ -0,0 +1,107 @@
+import json
+import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from protocol import BinaryEventTypes
+
+PREVIEW_IMAGE_TYPES = {"JPEG": 1, "PNG": 2, "WEBP": 3}
+PREVIEW_MIMETYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+# Threads that resize and encode previews, so it doesn't happen on the event loop
+PREVIEW_ENCODE_THREADS = 2
+
+
+def encode_preview_image(image_data):
+    """Resizes and encodes a (format, PIL image, max size) preview, returns the format and the encoded image."""
+    image_type = image_data[0]
+    image = image_data[1]
+    max_size = image_data[2]
+    if max_size is not None:
+        if hasattr(Image, 'Resampling'):
+            resampling = Image.Resampling.BILINEAR
+        else:
+            resampling = Image.Resampling.LANCZOS
+
+        image = ImageOps.contain(image, (max_size, max_size), resampling)
+
+    if image_type not in PREVIEW_IMAGE_TYPES:
+        image_type = "JPEG"
+    bytesIO = BytesIO()
+    if image_type == "WEBP":
+        image.save(bytesIO, format=image_type, quality=85, method=0)
+    else:
+        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
+    return image_type, bytesIO.getvalue()
+
+
+def encode_preview_message(event, data):
+    """Encodes an UNENCODED_PREVIEW_IMAGE or PREVIEW_IMAGE_WITH_METADATA message, returns the binary event to send and its data."""
+    if event == BinaryEventTypes.UNENCODED_PREVIEW_IMAGE:
+        image_type, image_bytes = encode_preview_image(data)
+        return BinaryEventTypes.PREVIEW_IMAGE, struct.pack(">I", PREVIEW_IMAGE_TYPES[image_type]) + image_bytes
+
+    # data is (preview_image, metadata)
+    image_data, metadata = data
+    image_type, image_bytes = encode_preview_image(image_data)
+    metadata = dict(metadata) if metadata is not None else {}
+    metadata["image_type"] = PREVIEW_MIMETYPES[image_type]
+    metadata_json = json.dumps(metadata).encode('utf-8')
+
+    combined_data = bytearray()
+    combined_data.extend(struct.pack(">I", len(metadata_json)))
+    combined_data.extend(metadata_json)
+    combined_data.extend(image_bytes)
+    return BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, combined_data
+
+
+class PreviewService:
+    """
+    Encodes previews on a few threads, so it doesn't block the event loop, and hands them to the
+    socket writers. Only the latest frame waits: a frame is dropped when a newer one arrives
+    before it was encoded, or before a slow socket was ready to receive it.
+    """
+
+    def __init__(self, server, threads=PREVIEW_ENCODE_THREADS):
+        self.server = server
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="preview_encode")
+        self.pending = {}
+
+    async def encode(self, event, data):
+        return await self.server.loop.run_in_executor(self.executor, encode_preview_message, event, data)
+
+    def send(self, event, data, sid=None):
+        writers = self.server.socket_writers
+        if (sid is None and len(writers) == 0) or (sid is not None and sid not in writers):
+            return
+        key = (event, sid)
+        waiting = key in self.pending
+        self.pending[key] = data
+        if not waiting:
+            self.server.loop.create_task(self._encode_pending(key))
+
+    async def _encode_pending(self, key):
+        event, sid = key
+        while key in self.pending:
+            data = self.pending[key]
+            try:
+                binary_event, binary_data = await self.encode(event, data)
+            except Exception as e:
+                logging.warning("Failed to encode preview: {}".format(e))
+                binary_event = None
+            # The key stays in pending while encoding so send doesn't start a second task for it
+            if self.pending.get(key) is data:
+                del self.pending[key]
+            if binary_event is None:
+                continue
+
+            message = self.server.encode_bytes(binary_event, binary_data)
+            writers = self.server.socket_writers
+            if sid is None:
+                for writer in list(writers.values()):
+                    writer.send_preview(message)
+            elif sid in writers:
+                writers[sid].send_preview(message)
@@ -0,0 +1,68 @@
+import asyncio
+import collections
+import logging
+
+import aiohttp
+
+# Messages that may wait for a client before it is considered too slow and disconnected. The
+# frontend reconnects and fetches the current state again.
+MAX_QUEUED_MESSAGES = 2048
+
+
+class SocketWriter:
+    """
+    Sends the messages for one websocket from its own task so a slow client doesn't hold up the
+    others. Messages are sent in order, previews after the queued messages and only the latest one.
+    """
+
+    def __init__(self, ws, loop, max_queued=MAX_QUEUED_MESSAGES):
+        self.ws = ws
+        self.max_queued = max_queued
+        self.queue = collections.deque()
+        self.preview = None
+        self.closed = False
+        self.wakeup = asyncio.Event()
+        self.task = loop.create_task(self.run())
+
+    def send(self, message):
+        """Queues a str (text frame) or bytes (binary frame) message."""
+        if self.closed:
+            return
+        if len(self.queue) >= self.max_queued:
+            logging.warning("websocket client is too slow, {} messages waiting. Disconnecting it.".format(len(self.queue)))
+            self.close()
+            asyncio.ensure_future(self.ws.close(code=aiohttp.WSCloseCode.TRY_AGAIN_LATER, message=b"Client too slow"))
+            return
+        self.queue.append(message)
+        self.wakeup.set()
+
+    def send_preview(self, message):
+        """Sets the preview to send next, replacing one that wasn't sent yet."""
+        if self.closed:
+            return
+        self.preview = message
+        self.wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        self.preview = None
+        self.task.cancel()
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while len(self.queue) > 0 or self.preview is not None:
+                if len(self.queue) > 0:
+                    message = self.queue.popleft()
+                else:
+                    message = self.preview
+                    self.preview = None
+                try:
+                    if isinstance(message, str):
+                        await self.ws.send_str(message)
+                    else:
+                        await self.ws.send_bytes(message)
+                except (aiohttp.ClientError, aiohttp.ClientPayloadError, ConnectionResetError, BrokenPipeError, ConnectionError) as err:
+                    logging.warning("send error: {}".format(err))
@@ -0,0 +1,33 @@
+import uuid
+
+from aiohttp import web
+
+# Versions restart at zero with the server, this tells them apart from the ones of an earlier run
+SERVER_RUN_ID = uuid.uuid4().hex[:8]
+
+
+def make_etag(*versions) -> str:
+    """Builds a strong ETag from the versions of the state a response was built from."""
+    return '"{}"'.format("-".join([SERVER_RUN_ID] + [str(v) for v in versions]))
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Checks an If-None-Match header value against an ETag, weak tags compare equal to strong ones."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def not_modified(request: web.Request, etag: str):
+    """Returns a 304 response if the client already has the version of the resource with this ETag, else None."""
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return web.Response(status=304, headers={"ETag": etag})
+    return None
@@ -11,7 +11,7 @@ import app.assets.manager as manager
 from app import user_manager
 from app.assets.api import schemas_in
 from app.assets.helpers import get_query_dict
-from app.assets.scanner import seed_assets
+from app.assets.scanner import asset_scanner, seed_assets
 
 import folder_paths
 
@@ -512,3 +512,26 @@ async def seed_assets_endpoint(request: web.Request) -> web.Response:
         return _error_response(500, "INTERNAL", "Seed operation failed")
 
     return web.json_response({"seeded": valid_roots}, status=200)
+
+
+@ROUTES.post("/api/assets/scan")
+async def scan_assets_endpoint(request: web.Request) -> web.Response:
+    """Queue a background scan that seeds and hashes the specified roots (models, input, output)."""
+    try:
+        payload = await request.json()
+        roots = payload.get("roots", ["models", "input", "output"])
+    except Exception:
+        roots = ["models", "input", "output"]
+
+    valid_roots = [r for r in roots if r in ("models", "input", "output")]
+    if not valid_roots:
+        return _error_response(400, "INVALID_BODY", "No valid roots specified")
+
+    asset_scanner.enqueue(tuple(valid_roots))
+    return web.json_response(asset_scanner.progress(), status=202)
+
+
+@ROUTES.get("/api/assets/scan")
+async def get_scan_progress(request: web.Request) -> web.Response:
+    """Progress of the background asset scan."""
+    return web.json_response(asset_scanner.progress(), status=200)
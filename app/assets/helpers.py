@@ -29,7 +29,9 @@ def list_tree(base_dir: str) -> list[str]:
     base_abs = os.path.abspath(base_dir)
     if not os.path.isdir(base_abs):
         return out
-    for dirpath, _subdirs, filenames in os.walk(base_abs, topdown=True, followlinks=False):
+    for dirpath, subdirs, filenames in os.walk(base_abs, topdown=True, followlinks=False):
+        # The counter claims of get_save_image_path are not assets
+        subdirs[:] = [d for d in subdirs if d != folder_paths.SAVE_COUNTER_LOCK_DIR]
         for name in filenames:
             out.append(os.path.abspath(os.path.join(dirpath, name)))
     return out
@@ -2,9 +2,14 @@ import contextlib
 import time
 import logging
 import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import sqlalchemy
+from sqlalchemy.exc import IntegrityError
 
 import folder_paths
+from comfy.cli_args import args
 from app.database.db import create_session, dependencies_available
 from app.assets.helpers import (
     collect_models_files, compute_relative_filename, fast_asset_file_check, get_name_and_tags_from_asset_path,
@@ -13,7 +18,11 @@ from app.assets.helpers import (
 )
 from app.assets.database.tags import add_missing_tag_for_asset_id, ensure_tags_exist, remove_missing_tag_for_asset_id
 from app.assets.database.bulk_ops import seed_from_paths_batch
-from app.assets.database.models import Asset, AssetCacheState, AssetInfo
+from app.assets.database.models import Asset, AssetCacheState, AssetInfo, AssetInfoMeta, AssetInfoTag
+
+# hashed files are committed in batches of this many, or at least this often
+HASH_COMMIT_BATCH = 32
+HASH_COMMIT_INTERVAL = 2.0
 
 
 def seed_assets(roots: tuple[RootType, ...], enable_logging: bool = False) -> None:
@@ -261,3 +270,272 @@ def _fast_db_consistency_pass(
             )
         sess.commit()
         return survivors if collect_existing_paths else None
+
+
+def _pending_hash_states(roots: tuple[RootType, ...]) -> list[tuple[int, str]]:
+    """(state id, path) of the files under the roots that still need a hash: the ones of seed
+    assets and the ones that changed on disk since they were hashed."""
+    conds = []
+    for r in roots:
+        for p in prefixes_for_root(r):
+            base = os.path.abspath(p)
+            if not base.endswith(os.sep):
+                base += os.sep
+            escaped, esc = escape_like_prefix(base)
+            conds.append(AssetCacheState.file_path.like(escaped + "%", escape=esc))
+    if not conds:
+        return []
+    with create_session() as sess:
+        rows = sess.execute(
+            sqlalchemy.select(AssetCacheState.id, AssetCacheState.file_path)
+            .join(Asset, Asset.id == AssetCacheState.asset_id)
+            .where(sqlalchemy.or_(*conds))
+            .where(sqlalchemy.or_(Asset.hash.is_(None), AssetCacheState.needs_verify.is_(True)))
+            .order_by(AssetCacheState.id.asc())
+        ).all()
+    return [(sid, fp) for sid, fp in rows]
+
+
+def _stat_key(path: str) -> tuple[int, int]:
+    st = os.stat(path, follow_symlinks=True)
+    return int(st.st_size), getattr(st, "st_mtime_ns", int(st.st_mtime * 1_000_000_000))
+
+
+def _hash_file(path: str) -> tuple[str, int, int] | None:
+    """Returns (hash, size, mtime_ns) of a file, None if it changed while it was read."""
+    import app.assets.hashing as hashing
+    before = _stat_key(path)
+    digest = hashing.blake3_hash(path)
+    if _stat_key(path) != before:
+        return None
+    return "blake3:" + digest, before[0], before[1]
+
+
+def _apply_hash(sess, state_id: int, asset_hash: str, size_bytes: int, mtime_ns: int) -> None:
+    """Points a cache state at the asset with its content hash. A seed asset gets the hash, or is
+    merged into the asset that already has it."""
+    state = sess.get(AssetCacheState, state_id)
+    if state is None:
+        return
+    asset = sess.get(Asset, state.asset_id)
+    existing = sess.execute(sqlalchemy.select(Asset).where(Asset.hash == asset_hash).limit(1)).scalars().first()
+    state.mtime_ns = mtime_ns
+    state.needs_verify = False
+    if existing is not None and existing.id == asset.id:
+        return
+    if asset.hash is None and existing is None:
+        asset.hash = asset_hash
+        asset.size_bytes = size_bytes
+        sess.flush()
+        return
+
+    if existing is None:
+        # a hashed file changed its content
+        existing = Asset(hash=asset_hash, size_bytes=size_bytes, mime_type=asset.mime_type)
+        sess.add(existing)
+        sess.flush()
+    state.asset_id = existing.id
+    if asset.hash is None:
+        # the infos of the seed move over, except the ones the asset already has under the same name
+        taken = set(
+            sess.execute(
+                sqlalchemy.select(AssetInfo.owner_id, AssetInfo.name).where(AssetInfo.asset_id == existing.id)
+            ).all()
+        )
+        dup_ids = [
+            info_id
+            for info_id, owner_id, name in sess.execute(
+                sqlalchemy.select(AssetInfo.id, AssetInfo.owner_id, AssetInfo.name).where(AssetInfo.asset_id == asset.id)
+            ).all()
+            if (owner_id, name) in taken
+        ]
+        if dup_ids:
+            sess.execute(sqlalchemy.delete(AssetInfoTag).where(AssetInfoTag.asset_info_id.in_(dup_ids)))
+            sess.execute(sqlalchemy.delete(AssetInfoMeta).where(AssetInfoMeta.asset_info_id.in_(dup_ids)))
+            sess.execute(sqlalchemy.delete(AssetInfo).where(AssetInfo.id.in_(dup_ids)))
+        sess.execute(sqlalchemy.update(AssetInfo).where(AssetInfo.asset_id == asset.id).values(asset_id=existing.id))
+        sess.flush()
+        if not sess.execute(
+            sqlalchemy.select(AssetCacheState.id).where(AssetCacheState.asset_id == asset.id).limit(1)
+        ).first():
+            sess.execute(sqlalchemy.delete(Asset).where(Asset.id == asset.id))
+    sess.flush()
+    remove_missing_tag_for_asset_id(sess, asset_id=existing.id)
+
+
+class AssetScanner:
+    """
+    Syncs the asset roots with the database on a background thread: seeds new files, then hashes
+    the unhashed and changed ones on a pool of threads. Each hash is committed as soon as it is
+    known, so a restarted scan only hashes what is left, and files whose size and mtime match
+    the database are never read again.
+    """
+
+    def __init__(self):
+        self.queue: queue.Queue[tuple[tuple[RootType, ...], bool]] = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.queued: set[tuple[tuple[RootType, ...], bool]] = set()
+        # path -> (size, mtime_ns) of files that could not be hashed, retried once they change
+        self.failed: dict[str, tuple[int, int]] = {}
+        self._progress = self._idle_progress()
+
+    @staticmethod
+    def _idle_progress() -> dict:
+        return {
+            "status": "idle",
+            "roots": [],
+            "files_total": 0,
+            "files_hashed": 0,
+            "files_failed": 0,
+            "bytes_total": 0,
+            "bytes_hashed": 0,
+            "started_at": None,
+            "finished_at": None,
+        }
+
+    def enqueue(self, roots: tuple[RootType, ...], hash_files: bool = True) -> None:
+        """Queues a scan of the roots, unless the same scan is already waiting."""
+        item = (tuple(roots), hash_files)
+        with self.lock:
+            if item in self.queued:
+                return
+            self.queued.add(item)
+            self.queue.put(item)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True, name="asset_scanner")
+                self.thread.start()
+
+    def progress(self) -> dict:
+        with self.lock:
+            out = dict(self._progress)
+            out["queued"] = [list(roots) for roots, _ in self.queued]
+            return out
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Waits until the queue is empty, returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                thread = self.thread
+            if thread is None or not thread.is_alive():
+                return True
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if deadline is not None and time.monotonic() >= deadline:
+                return thread is None or not thread.is_alive()
+
+    def _update(self, **values) -> None:
+        with self.lock:
+            self._progress.update(values)
+
+    def _run(self) -> None:
+        while True:
+            with self.lock:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    self.thread = None
+                    return
+                self.queued.discard(item)
+                progress = self._idle_progress()
+                progress.update(status="seeding", roots=list(item[0]), started_at=time.time())
+                self._progress = progress
+            roots, hash_files = item
+            try:
+                seed_assets(roots)
+                if hash_files:
+                    self._hash_pending(roots)
+            except Exception as e:
+                logging.exception("Assets scan(roots=%s) failed: %s", roots, e)
+            finally:
+                self._update(status="idle", finished_at=time.time())
+
+    def _hash_pending(self, roots: tuple[RootType, ...]) -> None:
+        workers = args.assets_hash_workers
+        if workers <= 0:
+            return
+        t_start = time.perf_counter()
+        todo: list[tuple[int, str, int]] = []
+        for sid, fp in _pending_hash_states(roots):
+            try:
+                key = _stat_key(fp)
+            except OSError:
+                continue
+            if self.failed.get(fp) == key:
+                continue
+            todo.append((sid, fp, key[0]))
+        if not todo:
+            return
+        self._update(status="hashing", files_total=len(todo), bytes_total=sum(size for _, _, size in todo))
+
+        hashed = 0
+        results: list[tuple[int, tuple[str, int, int]]] = []
+        last_commit = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset_hash") as executor:
+            pending = {}
+            items = iter(todo)
+            while True:
+                # only keep a few files in flight so a large tree doesn't queue every path at once
+                for sid, fp, size in items:
+                    pending[executor.submit(_hash_file, fp)] = (sid, fp, size)
+                    if len(pending) >= workers * 2:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, timeout=HASH_COMMIT_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sid, fp, size = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except OSError as e:
+                        logging.warning("Failed to hash %s: %s", fp, e)
+                        with contextlib.suppress(OSError):
+                            self.failed[fp] = _stat_key(fp)
+                        result = None
+                    with self.lock:
+                        if result is None:
+                            self._progress["files_failed"] += 1
+                        else:
+                            self._progress["files_hashed"] += 1
+                            self._progress["bytes_hashed"] += size
+                    if result is not None:
+                        self.failed.pop(fp, None)
+                        results.append((sid, result))
+                if results and (len(results) >= HASH_COMMIT_BATCH or time.monotonic() - last_commit >= HASH_COMMIT_INTERVAL):
+                    hashed += self._commit_hashes(results)
+                    results = []
+                    last_commit = time.monotonic()
+        if results:
+            hashed += self._commit_hashes(results)
+        logging.info(
+            "Assets scan(roots=%s) hashed %d of %d files in %.3fs",
+            roots,
+            hashed,
+            len(todo),
+            time.perf_counter() - t_start,
+        )
+
+    def _commit_hashes(self, results: list[tuple[int, tuple[str, int, int]]]) -> int:
+        with create_session() as sess:
+            try:
+                for sid, (asset_hash, size, mtime_ns) in results:
+                    _apply_hash(sess, sid, asset_hash, size, mtime_ns)
+                sess.commit()
+                return len(results)
+            except IntegrityError:
+                # the same content was added concurrently, apply one by one so it is merged
+                sess.rollback()
+        count = 0
+        for sid, (asset_hash, size, mtime_ns) in results:
+            with create_session() as sess:
+                try:
+                    _apply_hash(sess, sid, asset_hash, size, mtime_ns)
+                    sess.commit()
+                    count += 1
+                except IntegrityError:
+                    sess.rollback()
+                    logging.warning("Failed to store the hash of asset cache state %s", sid)
+        return count
+
+
+asset_scanner = AssetScanner()
@@ -1,6 +1,7 @@
 from typing import Any
 from datetime import datetime
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import BigInteger, Index, String, Text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 class Base(DeclarativeBase):
     pass
@@ -19,3 +20,19 @@ def to_dict(obj: Any, include_none: bool = False) -> dict[str, Any]:
     return out
 
 # TODO: Define models here
+
+class PromptHistory(Base):
+    """Executed prompts, see app.history_store.HistoryStore"""
+    __tablename__ = "prompt_history"
+
+    seq: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    prompt_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    status: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    completed_at: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    entry: Mapped[str] = mapped_column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("uq_prompt_history_prompt_id", "prompt_id", unique=True),
+        Index("ix_prompt_history_status", "status"),
+        Index("ix_prompt_history_completed_at", "completed_at"),
+    )
@@ -0,0 +1,235 @@
+import json
+import logging
+import threading
+import time
+
+
+class HistoryStore:
+    """
+    History of executed prompts, keyed by prompt id and ordered by completion.
+
+    Entries are kept in memory and, once enable_persistence was called, written through to the
+    prompt_history table so they survive restarts and can be paged and filtered with its indexes.
+    Stored entries must not be modified. The store has its own lock, it is only held while the
+    in memory index changes and never while entries are serialized or written.
+
+    Reads and writes of the database block, call them off the event loop.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = {}
+        # prompt_id -> (seq, status, completed_at), in the same order as entries
+        self.index = {}
+        self.next_seq = 0
+        # Changes on every put, delete and clear so readers can tell if their copy is current
+        self.version = 0
+        self.create_session = None
+        # Prompt ids of the entries in memory that could not be written to the database
+        self.unstored = set()
+
+    def enable_persistence(self, create_session):
+        """Loads the stored history and writes every change to the database from now on."""
+        from sqlalchemy import select
+        from app.database.models import PromptHistory
+        with create_session() as session:
+            rows = session.execute(select(PromptHistory).order_by(PromptHistory.seq.desc()).limit(self.max_size)).scalars().all()
+            rows = list(reversed(rows))
+        loaded = {}
+        for row in rows:
+            try:
+                loaded[row.prompt_id] = (row.seq, row.status, row.completed_at, json.loads(row.entry))
+            except ValueError:
+                logging.warning("Skipping unreadable history entry for prompt {}".format(row.prompt_id))
+
+        with self.lock:
+            # Anything added before loading is newer than the stored history
+            entries = {k: v[3] for k, v in loaded.items() if k not in self.entries}
+            index = {k: v[:3] for k, v in loaded.items() if k not in self.entries}
+            seq_base = rows[-1].seq + 1 if len(rows) > 0 else 0
+            for prompt_id, entry in self.entries.items():
+                seq, status, completed_at = self.index[prompt_id]
+                entries[prompt_id] = entry
+                index[prompt_id] = (seq + seq_base, status, completed_at)
+            while len(entries) > self.max_size:
+                oldest = next(iter(entries))
+                entries.pop(oldest)
+                index.pop(oldest)
+            self.entries = entries
+            self.index = index
+            self.next_seq += seq_base
+            self.version += 1
+            self.create_session = create_session
+            pending = [(k, self.index[k], self.entries[k]) for k in self.entries if self.index[k][0] >= seq_base]
+        for prompt_id, (seq, status, completed_at), entry in pending:
+            self._write(prompt_id, seq, status, completed_at, entry)
+        logging.info("Loaded {} history entries".format(len(rows)))
+
+    def put(self, prompt_id, entry):
+        self.write(self.add(prompt_id, entry))
+
+    def add(self, prompt_id, entry):
+        """Adds the entry in memory and returns what write() has to store in the database."""
+        status = entry.get("status", None)
+        status = status.get("status_str", None) if status is not None else None
+        completed_at = int(time.time() * 1000)
+        with self.lock:
+            self.entries.pop(prompt_id, None)
+            self.index.pop(prompt_id, None)
+            seq = self.next_seq
+            self.next_seq += 1
+            self.entries[prompt_id] = entry
+            self.index[prompt_id] = (seq, status, completed_at)
+            self.version += 1
+            removed = []
+            while len(self.entries) > self.max_size:
+                oldest = next(iter(self.entries))
+                self.entries.pop(oldest)
+                self.unstored.discard(oldest)
+                removed.append(self.index.pop(oldest)[0])
+            if self.create_session is None:
+                return None
+        return (prompt_id, seq, status, completed_at, entry, removed[-1] + 1 if len(removed) > 0 else None)
+
+    def write(self, pending):
+        """Stores an entry returned by add() in the database."""
+        if pending is not None:
+            self._write(*pending)
+
+    def _write(self, prompt_id, seq, status, completed_at, entry, removed_before=None):
+        try:
+            data = json.dumps(entry)
+        except (TypeError, ValueError) as e:
+            # Filtered lists are served from memory while such an entry is kept
+            logging.warning("History entry for prompt {} is only kept in memory, it can't be serialized: {}".format(prompt_id, e))
+            with self.lock:
+                if prompt_id in self.entries:
+                    self.unstored.add(prompt_id)
+            data = None
+        from sqlalchemy import delete
+        from app.database.models import PromptHistory
+        try:
+            with self.create_session() as session:
+                session.execute(delete(PromptHistory).where(PromptHistory.prompt_id == prompt_id))
+                if removed_before is not None:
+                    session.execute(delete(PromptHistory).where(PromptHistory.seq < removed_before))
+                if data is not None:
+                    session.add(PromptHistory(seq=seq, prompt_id=prompt_id, status=status, completed_at=completed_at, entry=data))
+                session.commit()
+        except Exception as e:
+            logging.warning("Failed to store history entry for prompt {}, it is only kept in memory: {}".format(prompt_id, e))
+            with self.lock:
+                if prompt_id in self.entries:
+                    self.unstored.add(prompt_id)
+
+    def get(self, prompt_id):
+        return self.entries.get(prompt_id, None)
+
+    def list(self, max_items=None, offset=-1, before=None, status=None, since=None, until=None):
+        """
+        Returns a list of (seq, prompt_id, entry), oldest first.
+
+        Without before, offset counts from the oldest matching entry, a negative offset returns the
+        newest max_items entries. With before, the newest max_items entries with a seq lower than
+        before are returned, the seq of the first one is the cursor for the page before it.
+        """
+        # The database holds the same entries as memory, unless some could not be written
+        if self.create_session is not None and len(self.unstored) == 0 and (before is not None or status is not None or since is not None or until is not None or offset > 0):
+            ids = self._query(max_items, offset, before, status, since, until)
+        else:
+            ids = self._scan(max_items, offset, before, status, since, until)
+        out = []
+        for seq, prompt_id in ids:
+            entry = self.entries.get(prompt_id, None)
+            if entry is not None:
+                out.append((seq, prompt_id, entry))
+        return out
+
+    def _scan(self, max_items, offset, before, status, since, until):
+        with self.lock:
+            index = list(self.index.items())
+        matching = [(v[0], k) for k, v in index if self._matches(v, before, status, since, until)]
+        return self._page(matching, max_items, offset, before)
+
+    def _query(self, max_items, offset, before, status, since, until):
+        from sqlalchemy import select
+        from app.database.models import PromptHistory
+        query = select(PromptHistory.seq, PromptHistory.prompt_id)
+        if before is not None:
+            query = query.where(PromptHistory.seq < before)
+        if status is not None:
+            query = query.where(PromptHistory.status == status)
+        if since is not None:
+            query = query.where(PromptHistory.completed_at >= since)
+        if until is not None:
+            query = query.where(PromptHistory.completed_at < until)
+
+        if before is not None or offset < 0:
+            query = query.order_by(PromptHistory.seq.desc())
+            if max_items is not None:
+                query = query.limit(max_items)
+        else:
+            query = query.order_by(PromptHistory.seq).offset(offset)
+            if max_items is not None:
+                query = query.limit(max_items)
+        with self.create_session() as session:
+            rows = [(row.seq, row.prompt_id) for row in session.execute(query)]
+        return sorted(rows)
+
+    @staticmethod
+    def _matches(index_entry, before, status, since, until):
+        seq, entry_status, completed_at = index_entry
+        if before is not None and seq >= before:
+            return False
+        if status is not None and entry_status != status:
+            return False
+        if since is not None and completed_at < since:
+            return False
+        if until is not None and completed_at >= until:
+            return False
+        return True
+
+    @staticmethod
+    def _page(matching, max_items, offset, before):
+        if before is not None or offset < 0:
+            if max_items is None:
+                return matching
+            return matching[max(len(matching) - max_items, 0):]
+        if max_items is None:
+            return matching[offset:]
+        return matching[offset:offset + max_items]
+
+    def delete(self, prompt_id):
+        with self.lock:
+            self.entries.pop(prompt_id, None)
+            self.unstored.discard(prompt_id)
+            removed = self.index.pop(prompt_id, None) is not None
+            self.version += 1
+            create_session = self.create_session
+        if removed and create_session is not None:
+            from sqlalchemy import delete
+            from app.database.models import PromptHistory
+            with create_session() as session:
+                session.execute(delete(PromptHistory).where(PromptHistory.prompt_id == prompt_id))
+                session.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.index = {}
+            self.unstored = set()
+            self.version += 1
+            create_session = self.create_session
+        if create_session is not None:
+            from sqlalchemy import delete
+            from app.database.models import PromptHistory
+            with create_session() as session:
+                session.execute(delete(PromptHistory))
+                session.commit()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, prompt_id):
+        return prompt_id in self.entries
@@ -0,0 +1,274 @@
+"""
+Background index of the files in the model folders, used by folder_paths and the model manager
+with --model-file-index instead of walking the folders when their mtimes changed.
+
+Every indexed folder is scanned once when it is first listed. After that a thread keeps the index
+up to date: with the watchdog package installed it rescans the directories inotify (or the
+platform equivalent) reports changes in, else it polls the directory mtimes. Polling continues
+at a lower rate with watchdog too, as it doesn't see changes behind symlinks or made by other
+machines on network volumes. Only changed directories are listed again.
+
+A file overwritten in place doesn't change the mtime of its directory, so polling alone doesn't
+see it. Every FILE_RESCAN_INTERVAL seconds all indexed directories are listed again, which also
+stats their files.
+"""
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    _WATCHDOG_AVAILABLE = True
+except ImportError:
+    _WATCHDOG_AVAILABLE = False
+
+EXCLUDED_DIR_NAMES = {".git"}
+# Seconds between checks of the directory mtimes, without and with watchdog
+POLL_INTERVAL = 5.0
+WATCHED_POLL_INTERVAL = 60.0
+# Seconds between listings of all indexed directories, to pick up files replaced in place
+FILE_RESCAN_INTERVAL = 300.0
+# Seconds to wait for more events after a change was reported, copying a file reports many
+EVENT_DELAY = 0.2
+
+
+class FileEntry(NamedTuple):
+    modified: float
+    created: float
+    size: int
+
+
+class DirListing(NamedTuple):
+    mtime: float
+    files: dict[str, FileEntry]
+    subdirs: frozenset[str]
+
+
+def list_directory(path: str) -> DirListing | None:
+    """Lists the files and subdirectories of a directory, following symlinks. None if it is gone."""
+    try:
+        mtime = os.path.getmtime(path)
+        files = {}
+        subdirs = set()
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if entry.name not in EXCLUDED_DIR_NAMES:
+                            subdirs.add(entry.name)
+                    else:
+                        st = entry.stat()
+                        files[entry.name] = FileEntry(st.st_mtime, st.st_ctime, st.st_size)
+                except OSError:
+                    logging.warning("Warning: Unable to access {}. Skipping this file.".format(entry.path))
+        return DirListing(mtime, files, frozenset(subdirs))
+    except OSError:
+        return None
+
+
+def is_symlink_loop(path: str) -> bool:
+    if not os.path.islink(path):
+        return False
+    target = os.path.realpath(path)
+    parent = os.path.realpath(os.path.dirname(path))
+    return parent == target or parent.startswith(target + os.sep)
+
+
+class IndexedFolder:
+    """The files below one model folder, keyed by their path relative to it."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files: dict[str, FileEntry] = {}
+        self.dirs: dict[str, DirListing] = {}
+        # Changes every time a file is added, removed or changes
+        self.version = 0
+
+    def scan(self, path: str) -> dict[str, DirListing | None]:
+        """Lists path and every subdirectory below it that isn't indexed yet. Doesn't change the index."""
+        out = {}
+        stack = [path]
+        while len(stack) > 0:
+            p = stack.pop()
+            listing = list_directory(p)
+            out[p] = listing
+            if listing is None:
+                continue
+            for name in listing.subdirs:
+                sub = os.path.join(p, name)
+                if sub not in self.dirs and sub not in out and not is_symlink_loop(sub):
+                    stack.append(sub)
+        return out
+
+    def apply(self, listings: dict[str, DirListing | None]) -> bool:
+        changed = False
+        for path, listing in listings.items():
+            old = self.dirs.get(path, None)
+            if listing is None:
+                if old is not None:
+                    self._remove_dir(path)
+                    changed = True
+                continue
+            if old is not None and old == listing:
+                continue
+            if old is not None:
+                for name in old.files.keys() - listing.files.keys():
+                    self.files.pop(self._relpath(path, name), None)
+                for name in old.subdirs - listing.subdirs:
+                    self._remove_dir(os.path.join(path, name))
+            for name, entry in listing.files.items():
+                self.files[self._relpath(path, name)] = entry
+            self.dirs[path] = listing
+            changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def _relpath(self, path, name):
+        return os.path.relpath(os.path.join(path, name), self.root)
+
+    def _remove_dir(self, path):
+        listing = self.dirs.pop(path, None)
+        if listing is None:
+            return
+        for name in listing.files:
+            self.files.pop(self._relpath(path, name), None)
+        for name in listing.subdirs:
+            self._remove_dir(os.path.join(path, name))
+
+    def changed_dirs(self) -> list[str]:
+        """Directories whose mtime changed, i.e. entries were added, removed or renamed."""
+        changed = []
+        for path, listing in list(self.dirs.items()):
+            try:
+                if os.path.getmtime(path) != listing.mtime:
+                    changed.append(path)
+            except OSError:
+                changed.append(path)
+        if self.root not in self.dirs and os.path.isdir(self.root):
+            changed.append(self.root)
+        return changed
+
+
+class ModelFileIndex:
+    def __init__(self, use_watchdog: bool = True):
+        self.lock = threading.Lock()
+        self.folders: dict[str, IndexedFolder] = {}
+        self.dirty: set[str] = set()
+        self.wakeup = threading.Event()
+        self.last_file_rescan = time.monotonic()
+        self.observer = None
+        if use_watchdog and _WATCHDOG_AVAILABLE:
+            self.observer = Observer()
+            self.observer.daemon = True
+            self.observer.start()
+            self.poll_interval = WATCHED_POLL_INTERVAL
+        else:
+            if use_watchdog:
+                logging.info("The watchdog package is not installed, the model file index polls the model folders for changes.")
+            self.poll_interval = POLL_INTERVAL
+        self.thread = threading.Thread(target=self._run, daemon=True, name="model_file_index")
+        self.thread.start()
+
+    def _folder(self, root: str) -> IndexedFolder:
+        with self.lock:
+            folder = self.folders.get(root, None)
+        if folder is not None:
+            return folder
+        folder = IndexedFolder(os.path.abspath(root))
+        folder.apply(folder.scan(folder.root))
+        with self.lock:
+            if root in self.folders:
+                return self.folders[root]
+            self.folders[root] = folder
+        if self.observer is not None and os.path.isdir(root):
+            try:
+                self.observer.schedule(_DirtyHandler(self), folder.root, recursive=True)
+            except Exception as e:
+                logging.warning("Can't watch {} for changes, polling it instead: {}".format(root, e))
+        return folder
+
+    def version(self, root: str) -> int | None:
+        with self.lock:
+            folder = self.folders.get(root, None)
+            return folder.version if folder is not None else None
+
+    def versions(self) -> dict[str, int]:
+        """The version of every indexed root."""
+        with self.lock:
+            return {root: folder.version for root, folder in self.folders.items()}
+
+    def search(self, root: str) -> tuple[list[str], dict[str, int]]:
+        """The files below root and {root: version}, like folder_paths.recursive_search with the version instead of mtimes."""
+        if not os.path.isdir(root):
+            return [], {}
+        folder = self._folder(root)
+        with self.lock:
+            return list(folder.files.keys()), {root: folder.version}
+
+    def stat_files(self, root: str) -> tuple[dict[str, FileEntry], int]:
+        folder = self._folder(root)
+        with self.lock:
+            return dict(folder.files), folder.version
+
+    def mark_dirty(self, path: str):
+        with self.lock:
+            self.dirty.add(path)
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            woken = self.wakeup.wait(timeout=self.poll_interval)
+            self.wakeup.clear()
+            if woken:
+                time.sleep(EVENT_DELAY)
+            try:
+                self.update(poll=not woken)
+            except Exception as e:
+                logging.warning("Failed to update the model file index: {}".format(e))
+
+    def update(self, poll: bool = True, rescan_files: bool | None = None):
+        """
+        Rescans the directories reported as changed, and with poll the ones whose mtime changed.
+        With rescan_files every directory is listed again, by default every FILE_RESCAN_INTERVAL.
+        """
+        if rescan_files is None:
+            rescan_files = poll and time.monotonic() - self.last_file_rescan >= FILE_RESCAN_INTERVAL
+        if rescan_files:
+            self.last_file_rescan = time.monotonic()
+        with self.lock:
+            dirty = self.dirty
+            self.dirty = set()
+            folders = list(self.folders.values())
+        for folder in folders:
+            paths = set(p for p in dirty if p in folder.dirs or p == folder.root)
+            if rescan_files:
+                paths.update(list(folder.dirs.keys()))
+            if poll:
+                paths.update(folder.changed_dirs())
+            if len(paths) == 0:
+                continue
+            listings = {}
+            for path in paths:
+                listings.update(folder.scan(path))
+            with self.lock:
+                folder.apply(listings)
+
+
+if _WATCHDOG_AVAILABLE:
+    class _DirtyHandler(FileSystemEventHandler):
+        def __init__(self, index: ModelFileIndex):
+            self.index = index
+
+        def on_any_event(self, event):
+            paths = [event.src_path, getattr(event, "dest_path", "")]
+            for path in paths:
+                if not path:
+                    continue
+                path = os.fsdecode(path)
+                self.index.mark_dirty(os.path.dirname(path))
+                if event.is_directory:
+                    self.index.mark_dirty(path)
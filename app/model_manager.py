@@ -84,10 +84,13 @@ class ModelFileManager:
         for index, folder in enumerate(folders[0]):
             if not os.path.isdir(folder):
                 continue
-            out = self.cache_model_file_list_(folder)
-            if out is None:
-                out = self.recursive_search_models_(folder, index)
-                self.set_cache(folder, out)
+            if folder_paths.model_file_index is not None:
+                out = self.indexed_model_file_list_(folder, index)
+            else:
+                out = self.cache_model_file_list_(folder)
+                if out is None:
+                    out = self.recursive_search_models_(folder, index)
+                    self.set_cache(folder, out)
             output_list.extend(out[0])
 
         return output_list
@@ -109,6 +112,31 @@ class ModelFileManager:
 
         return model_file_list_cache
 
+    def indexed_model_file_list_(self, folder: str, pathIndex: int) -> tuple[list[dict], dict[str, float], float]:
+        files, version = folder_paths.model_file_index.stat_files(folder)
+        cached = self.get_cache(folder)
+        if cached is not None and cached[1] == {folder: version} and (len(cached[0]) == 0 or cached[0][0]["pathIndex"] == pathIndex):
+            return cached
+
+        # TODO use settings
+        include_hidden_files = False
+        names = files.keys()
+        if not include_hidden_files:
+            names = [name for name in names if not any(part.startswith(".") for part in name.split(os.sep))]
+        result = []
+        for name in filter_files_extensions(names, folder_paths.supported_pt_extensions):
+            entry = files[name]
+            result.append({
+                "name": name,
+                "pathIndex": pathIndex,
+                "modified": entry.modified,
+                "created": entry.created,
+                "size": entry.size,
+            })
+        out = (result, {folder: version}, time.perf_counter())
+        self.set_cache(folder, out)
+        return out
+
     def recursive_search_models_(self, directory: str, pathIndex: int) -> tuple[list[str], dict[str, float], float]:
         if not os.path.isdir(directory):
             return [], {}, time.perf_counter()
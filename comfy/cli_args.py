@@ -44,6 +44,7 @@ parser.add_argument("--max-upload-size", type=float, default=100, help="Set the
 
 parser.add_argument("--base-directory", type=str, default=None, help="Set the ComfyUI base directory for models, custom_nodes, input, output, temp, and user directories.")
 parser.add_argument("--extra-model-paths-config", type=str, default=None, metavar="PATH", nargs='+', action='append', help="Load one or more extra_model_paths.yaml files.")
+parser.add_argument("--model-file-index", action="store_true", help="List the model folders from an index that is updated in the background, instead of walking them again when they changed. Uses the watchdog package to be notified of changes when it is installed, else polls the folders.")
 parser.add_argument("--output-directory", type=str, default=None, help="Set the ComfyUI output directory. Overrides --base-directory.")
 parser.add_argument("--temp-directory", type=str, default=None, help="Set the ComfyUI temp directory (default is in the ComfyUI directory). Overrides --base-directory.")
 parser.add_argument("--input-directory", type=str, default=None, help="Set the ComfyUI input directory. Overrides --base-directory.")
@@ -51,6 +52,11 @@ parser.add_argument("--auto-launch", action="store_true", help="Automatically la
 parser.add_argument("--disable-auto-launch", action="store_true", help="Disable auto launching the browser.")
 parser.add_argument("--cuda-device", type=int, default=None, metavar="DEVICE_ID", help="Set the id of the cuda device this instance will use. All other devices will not be visible.")
 parser.add_argument("--default-device", type=int, default=None, metavar="DEFAULT_DEVICE_ID", help="Set the id of the default device, all other devices will stay visible.")
+parser.add_argument("--workers", type=int, default=0, metavar="N", help="Execute prompts in N worker processes that share one queue, preferring the worker that already ran a prompt's models. 0 executes prompts in the server process.")
+parser.add_argument("--worker-devices", type=str, default=None, metavar="DEVICES", help="Comma separated device for each --workers process: a cuda device id or cpu. Defaults to cuda devices 0 to N-1, or cpu with --cpu.")
+parser.add_argument("--worker-address", type=str, default=None, help=argparse.SUPPRESS)
+parser.add_argument("--queue-policy", type=str, default="fifo", choices=["fifo", "model-affinity"], help="Order in which queued prompts run. model-affinity lets prompts that use the models of the last executed prompt run ahead of a few earlier prompts to avoid reloading models.")
+parser.add_argument("--batch-prompts", type=int, default=0, metavar="N", help="Merge up to N queued prompts that only differ in their sampler seeds and CLIPTextEncode texts into one batched sampling pass. Only simple text to image prompts with deterministic samplers are merged. Saved images keep the metadata of their own prompt.")
 cm_group = parser.add_mutually_exclusive_group()
 cm_group.add_argument("--cuda-malloc", action="store_true", help="Enable cudaMallocAsync (enabled by default for torch 2.0 and up).")
 cm_group.add_argument("--disable-cuda-malloc", action="store_true", help="Disable cudaMallocAsync.")
@@ -107,12 +113,16 @@ class LatentPreviewMethod(enum.Enum):
 parser.add_argument("--preview-method", type=LatentPreviewMethod, default=LatentPreviewMethod.NoPreviews, help="Default preview method for sampler nodes.", action=EnumAction)
 
 parser.add_argument("--preview-size", type=int, default=512, help="Sets the maximum preview size for sampler nodes.")
+parser.add_argument("--preview-format", type=str, default="jpeg", choices=["jpeg", "png", "webp"], help="Image format of the sampler previews sent to the frontend. webp previews are smaller than jpeg ones at the same quality.")
+parser.add_argument("--message-coalesce-ms", type=float, default=50.0, metavar="MS", help="How long progress and queue status messages wait to be replaced by a newer one before they are sent to the frontend. 0 only merges messages that are already waiting.")
 
 cache_group = parser.add_mutually_exclusive_group()
 cache_group.add_argument("--cache-classic", action="store_true", help="Use the old style (aggressive) caching.")
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
 cache_group.add_argument("--cache-none", action="store_true", help="Reduced RAM/VRAM usage at the expense of executing every node for each run.")
 cache_group.add_argument("--cache-ram", nargs='?', const=4.0, type=float, default=0, help="Use RAM pressure caching with the specified headroom threshold. If available RAM drops below the threhold the cache remove large items to free RAM. Default 4GB")
+parser.add_argument("--cache-disk", type=str, default=None, metavar="PATH", help="Persist CONDITIONING, LATENT, IMAGE and MASK node outputs to this directory so they are reused across restarts. Works together with the other cache modes.")
+parser.add_argument("--cache-disk-size", type=float, default=10.0, metavar="GB", help="Maximum size of the --cache-disk directory in GB. The least recently used entries are removed past this size.")
 
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
@@ -173,6 +183,7 @@ parser.add_argument("--quick-test-for-ci", action="store_true", help="Quick test
 parser.add_argument("--windows-standalone-build", action="store_true", help="Windows standalone build: Enable convenient things that most people using the standalone windows build will probably enjoy (like auto opening the page on startup).")
 
 parser.add_argument("--disable-metadata", action="store_true", help="Disable saving prompt metadata in files.")
+parser.add_argument("--save-image-format", type=str, default="png", choices=["png", "png-fast", "webp", "webp-lossless", "jxl"], help="File format of the images saved by the SaveImage node. png-fast uses a lower PNG compression level, webp-lossless the fastest lossless WebP mode, jxl needs a Pillow JPEG XL plugin like pillow-jxl-plugin.")
 parser.add_argument("--disable-all-custom-nodes", action="store_true", help="Disable loading all custom nodes.")
 parser.add_argument("--whitelist-custom-nodes", type=str, nargs='+', default=[], help="Specify custom node folders to load even when --disable-all-custom-nodes is enabled.")
 parser.add_argument("--disable-api-nodes", action="store_true", help="Disable loading all api nodes. Also prevents the frontend from communicating with the internet.")
@@ -227,12 +238,18 @@ parser.add_argument(
     default="https://api.comfy.org",
     help="Set the base URL for the ComfyUI API.  (default: https://api.comfy.org)",
 )
+parser.add_argument("--api-max-connections", type=int, default=100, help="Maximum number of open connections of the API nodes, 0 for no limit.")
+parser.add_argument("--api-max-connections-per-host", type=int, default=0, help="Maximum number of open connections of the API nodes to a single host, 0 for no limit.")
+parser.add_argument("--api-keepalive-timeout", type=float, default=30.0, help="Seconds the API nodes keep idle connections open for reuse.")
+parser.add_argument("--api-dns-cache-ttl", type=int, default=300, help="Seconds the API nodes cache resolved host names.")
 
 database_default_path = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "user", "comfyui.db")
 )
 parser.add_argument("--database-url", type=str, default=f"sqlite:///{database_default_path}", help="Specify the database URL, e.g. for an in-memory database you can use 'sqlite:///:memory:'.")
 parser.add_argument("--disable-assets-autoscan", action="store_true", help="Disable asset scanning on startup for database synchronization.")
+parser.add_argument("--assets-hash-workers", type=int, default=0, help="Number of threads the background asset scan hashes files with. Hashing reads every model file, by default (0) the scan only seeds the files without hashing them.")
+parser.add_argument("--persistent-history", action="store_true", help="Store the prompt history in the database so it is kept across restarts.")
 
 if comfy.options.args_parsing:
     args = parser.parse_args()
@@ -21,6 +21,7 @@ import folder_paths
 
 # used for image preview
 from comfy.cli_args import args
+from comfy_execution.image_writer import image_writer
 from ._io import ComfyNode, FolderType, Image, _UIOutput
 
 
@@ -148,7 +149,7 @@ class ImageSaveHelper:
             img = ImageSaveHelper._convert_tensor_to_pil(image_tensor)
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
             file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=compress_level)
+            image_writer.save(img, os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=compress_level)
             results.append(SavedResult(file, subfolder, folder_type))
             counter += 1
         return results
@@ -1,6 +1,7 @@
 from ._helpers import get_fs_object_size
 from .client import (
     ApiEndpoint,
+    CompletionNotifier,
     poll_op,
     poll_op_raw,
     sync_op,
@@ -57,6 +58,7 @@ from .validation_utils import (
 __all__ = [
     # API client
     "ApiEndpoint",
+    "CompletionNotifier",
     "poll_op",
     "poll_op_raw",
     "sync_op",
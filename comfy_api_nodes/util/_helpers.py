@@ -2,10 +2,12 @@ import asyncio
 import contextlib
 import os
 import re
+import threading
 import time
-from collections.abc import Callable
+from collections.abc import AsyncGenerator, Callable
 from io import BytesIO
 
+import aiohttp
 from yarl import URL
 
 from comfy.cli_args import args
@@ -17,6 +19,10 @@ from .common_exceptions import ProcessingInterrupted
 _HAS_PCT_ESC = re.compile(r"%[0-9A-Fa-f]{2}")  # any % followed by 2 hex digits
 _HAS_BAD_PCT = re.compile(r"%(?![0-9A-Fa-f]{2})")  # any % not followed by 2 hex digits
 
+# event loop -> (session, async generator closing it when the loop shuts down)
+_SESSIONS: dict[asyncio.AbstractEventLoop, tuple[aiohttp.ClientSession, AsyncGenerator]] = {}
+_SESSIONS_LOCK = threading.Lock()
+
 
 def is_processing_interrupted() -> bool:
     """Return True if user/runtime requested interruption."""
@@ -66,6 +72,46 @@ async def sleep_with_interrupt(
         await asyncio.sleep(min(1.0, end - now))
 
 
+async def _close_with_loop(loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession) -> AsyncGenerator[None, None]:
+    """Closes the session once the loop shuts down, asyncio.run() finalizes the async generators before closing it."""
+    try:
+        yield
+    finally:
+        with _SESSIONS_LOCK:
+            if loop in _SESSIONS and _SESSIONS[loop][0] is session:
+                del _SESSIONS[loop]
+        await session.close()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    The aiohttp session shared by all API node requests on the running event loop.
+
+    Its connection pool keeps connections alive between requests, so the polls and downloads of a task
+    reuse the connection of the request that created it instead of paying DNS, TCP and TLS setup again.
+    Don't close it, pass timeouts to the single requests.
+    """
+    loop = asyncio.get_running_loop()
+    with _SESSIONS_LOCK:
+        for closed_loop in [l for l in _SESSIONS if l.is_closed()]:
+            del _SESSIONS[closed_loop]
+        entry = _SESSIONS.get(loop, None)
+        if entry is not None and not entry[0].closed:
+            return entry[0]
+        connector = aiohttp.TCPConnector(
+            limit=args.api_max_connections,
+            limit_per_host=args.api_max_connections_per_host,
+            keepalive_timeout=args.api_keepalive_timeout,
+            use_dns_cache=args.api_dns_cache_ttl > 0,
+            ttl_dns_cache=args.api_dns_cache_ttl if args.api_dns_cache_ttl > 0 else None,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None))
+        closer = _close_with_loop(loop, session)
+        _SESSIONS[loop] = (session, closer)
+    await closer.__anext__()
+    return session
+
+
 def mimetype_to_extension(mime_type: str) -> str:
     """Converts a MIME type to a file extension."""
     return mime_type.split("/")[-1].lower()
@@ -74,7 +120,7 @@ def mimetype_to_extension(mime_type: str) -> str:
 def get_fs_object_size(path_or_object: str | BytesIO) -> int:
     if isinstance(path_or_object, str):
         return os.path.getsize(path_or_object)
-    return len(path_or_object.getvalue())
+    return path_or_object.getbuffer().nbytes
 
 
 def to_aiohttp_url(url: str) -> URL:
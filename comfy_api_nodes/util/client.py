@@ -2,10 +2,13 @@ import asyncio
 import contextlib
 import json
 import logging
+import random
+import threading
 import time
 import uuid
-from collections.abc import Callable, Iterable
+from collections.abc import Callable, Iterable, MutableMapping
 from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
 from enum import Enum
 from io import BytesIO
 from typing import Any, Literal, TypeVar
@@ -13,6 +16,7 @@ from urllib.parse import urljoin, urlparse
 
 import aiohttp
 from aiohttp.client_exceptions import ClientError, ContentTypeError
+from multidict import CIMultiDict
 from pydantic import BaseModel
 
 from comfy import utils
@@ -24,6 +28,7 @@ from ._helpers import (
     default_base_url,
     get_auth_header,
     get_node_id,
+    get_session,
     is_processing_interrupted,
     sleep_with_interrupt,
 )
@@ -65,6 +70,7 @@ class _RequestConfig:
     final_label_on_success: str | None = "Completed"
     progress_origin_ts: float | None = None
     price_extractor: Callable[[dict[str, Any]], float | None] | None = None
+    response_headers: MutableMapping[str, str] | None = None
 
 
 @dataclass
@@ -82,6 +88,59 @@ _RETRY_STATUS = {408, 429, 500, 502, 503, 504}
 COMPLETED_STATUSES = ["succeeded", "succeed", "success", "completed", "finished", "done", "complete"]
 FAILED_STATUSES = ["cancelled", "canceled", "canceling", "fail", "failed", "error"]
 QUEUED_STATUSES = ["created", "queued", "queueing", "submitted", "initializing"]
+# Upper bound for waits requested by a Retry-After header, in seconds
+MAX_RETRY_AFTER = 120.0
+
+
+class CompletionNotifier:
+    """
+    Wakes up poll_op before its next poll, for providers that report task updates through a webhook,
+    server-sent events or similar. The poll endpoint stays the source of truth, a notification only
+    makes poll_op check it right away instead of after the poll interval.
+
+    notify() may be called from any thread, e.g. from a webhook route of the server. Subclasses that
+    have to listen for the updates themselves, like an SSE client, do so between start() and close(),
+    which poll_op calls around its polling loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._notified = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._event: asyncio.Event | None = None
+
+    def notify(self) -> None:
+        with self._lock:
+            self._notified = True
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        """Waits up to timeout seconds for a notification, returns True if there was one."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is not loop:
+                self._loop = loop
+                self._event = asyncio.Event()
+            if self._notified:
+                self._notified = False
+                self._event.clear()
+                return True
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._lock:
+            notified = self._notified
+            self._notified = False
+            self._event.clear()
+        return notified
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
 
 
 async def sync_op(
@@ -141,6 +200,8 @@ async def poll_op(
     queued_statuses: list[str | int] | None = None,
     data: BaseModel | None = None,
     poll_interval: float = 5.0,
+    initial_poll_interval: float = 1.0,
+    poll_backoff: float = 1.5,
     max_poll_attempts: int = 160,
     timeout_per_poll: float = 120.0,
     max_retries_per_poll: int = 3,
@@ -149,6 +210,7 @@ async def poll_op(
     estimated_duration: int | None = None,
     cancel_endpoint: ApiEndpoint | None = None,
     cancel_timeout: float = 10.0,
+    completion_notifier: CompletionNotifier | None = None,
 ) -> M:
     raw = await poll_op_raw(
         cls,
@@ -161,6 +223,8 @@ async def poll_op(
         queued_statuses=queued_statuses,
         data=data,
         poll_interval=poll_interval,
+        initial_poll_interval=initial_poll_interval,
+        poll_backoff=poll_backoff,
         max_poll_attempts=max_poll_attempts,
         timeout_per_poll=timeout_per_poll,
         max_retries_per_poll=max_retries_per_poll,
@@ -169,6 +233,7 @@ async def poll_op(
         estimated_duration=estimated_duration,
         cancel_endpoint=cancel_endpoint,
         cancel_timeout=cancel_timeout,
+        completion_notifier=completion_notifier,
     )
     if not isinstance(raw, dict):
         raise Exception("Expected JSON response to validate into a Pydantic model, got non-JSON (binary or text).")
@@ -194,11 +259,14 @@ async def sync_op_raw(
     final_label_on_success: str | None = "Completed",
     progress_origin_ts: float | None = None,
     monitor_progress: bool = True,
+    response_headers: MutableMapping[str, str] | None = None,
 ) -> dict[str, Any] | bytes:
     """
     Make a single network request.
       - If as_binary=False (default): returns JSON dict (or {'_raw': '<text>'} if non-JSON).
       - If as_binary=True: returns bytes.
+      - If response_headers is given, it is filled with the headers of the response. Header names are
+        case-insensitive, pass a multidict.CIMultiDict to look them up that way.
     """
     if isinstance(data, BaseModel):
         data = data.model_dump(exclude_none=True)
@@ -222,6 +290,7 @@ async def sync_op_raw(
         final_label_on_success=final_label_on_success,
         progress_origin_ts=progress_origin_ts,
         price_extractor=price_extractor,
+        response_headers=response_headers,
     )
     return await _request_base(cfg, expect_binary=as_binary)
 
@@ -238,6 +307,8 @@ async def poll_op_raw(
     queued_statuses: list[str | int] | None = None,
     data: dict[str, Any] | BaseModel | None = None,
     poll_interval: float = 5.0,
+    initial_poll_interval: float = 1.0,
+    poll_backoff: float = 1.5,
     max_poll_attempts: int = 160,
     timeout_per_poll: float = 120.0,
     max_retries_per_poll: int = 3,
@@ -246,11 +317,18 @@ async def poll_op_raw(
     estimated_duration: int | None = None,
     cancel_endpoint: ApiEndpoint | None = None,
     cancel_timeout: float = 10.0,
+    completion_notifier: CompletionNotifier | None = None,
 ) -> dict[str, Any]:
     """
     Polls an endpoint until the task reaches a terminal state. Displays time while queued/processing,
     checks interruption every second, and calls Cancel endpoint (if provided) on interruption.
 
+    The first poll follows after initial_poll_interval, the interval then grows by poll_backoff up to
+    poll_interval, with some jitter so concurrent tasks don't poll in lockstep. It starts over when the
+    status changes. A Retry-After header of the poll response is honored, and a completion_notifier
+    triggers the next poll right away. The task times out after max_poll_attempts * poll_interval
+    seconds of polling while it isn't queued.
+
     Uses default complete, failed and queued states assumption.
 
     Returns the final JSON response from the poll endpoint.
@@ -259,7 +337,12 @@ async def poll_op_raw(
     failed_states = _normalize_statuses(FAILED_STATUSES if failed_statuses is None else failed_statuses)
     queued_states = _normalize_statuses(QUEUED_STATUSES if queued_statuses is None else queued_statuses)
     started = time.monotonic()
-    consumed_attempts = 0  # counts only non-queued polls
+    active_polling_budget = max_poll_attempts * poll_interval
+    consumed_seconds = 0.0  # counts only waits while not queued
+    interval = min(initial_poll_interval, poll_interval)
+    last_status: str | int | None = None
+    # Providers behind HTTP/2 or uvicorn send lowercase header names
+    response_headers: CIMultiDict[str] = CIMultiDict()
 
     progress_bar = utils.ProgressBar(100) if progress_extractor else None
     last_progress: int | None = None
@@ -286,13 +369,17 @@ async def poll_op_raw(
                     is_queued=state.is_queued,
                     processing_elapsed_seconds=int(proc_elapsed),
                 )
-                await asyncio.sleep(1.0)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop_ticker.wait(), timeout=1.0)  # returns as soon as polling is done
         except Exception as exc:
             logging.debug("Polling ticker exited: %s", exc)
 
     ticker_task = asyncio.create_task(_ticker())
     try:
-        while consumed_attempts < max_poll_attempts:
+        if completion_notifier is not None:
+            await completion_notifier.start()
+        while consumed_seconds < active_polling_budget:
+            response_headers.clear()
             try:
                 resp_json = await sync_op_raw(
                     cls,
@@ -307,6 +394,7 @@ async def poll_op_raw(
                     as_binary=False,
                     final_label_on_success=None,
                     monitor_progress=False,
+                    response_headers=response_headers,
                 )
                 if not isinstance(resp_json, dict):
                     raise Exception("Polling endpoint returned non-JSON response.")
@@ -383,8 +471,17 @@ async def poll_op_raw(
                 logging.error(msg)
                 raise Exception(msg)
 
+            if status != last_status:
+                interval = min(initial_poll_interval, poll_interval)
+                last_status = status
+            wait = interval * random.uniform(0.8, 1.2)
+            retry_after = _parse_retry_after(response_headers.get("Retry-After"))
+            if retry_after is not None:
+                wait = max(wait, min(retry_after, MAX_RETRY_AFTER))
+            interval = min(interval * poll_backoff, poll_interval)
             try:
-                await sleep_with_interrupt(poll_interval, cls, None, None, None)
+                wait_start = time.monotonic()
+                await _wait_for_next_poll(wait, completion_notifier)
             except ProcessingInterrupted:
                 if cancel_endpoint:
                     with contextlib.suppress(Exception):
@@ -401,12 +498,9 @@ async def poll_op_raw(
                         )
                 raise
             if not is_queued:
-                consumed_attempts += 1
+                consumed_seconds += time.monotonic() - wait_start
 
-        raise Exception(
-            f"Polling timed out after {max_poll_attempts} non-queued attempts "
-            f"(~{int(max_poll_attempts * poll_interval)}s of active polling)."
-        )
+        raise Exception(f"Polling timed out after ~{int(active_polling_budget)}s of active polling.")
     except ProcessingInterrupted:
         raise
     except (LocalNetworkError, ApiServerError):
@@ -417,6 +511,38 @@ async def poll_op_raw(
         stop_ticker.set()
         with contextlib.suppress(Exception):
             await ticker_task
+        if completion_notifier is not None:
+            with contextlib.suppress(Exception):
+                await completion_notifier.close()
+
+
+async def _wait_for_next_poll(seconds: float, notifier: CompletionNotifier | None) -> None:
+    """Sleeps in 1s slices checking for interruption, returns early when the notifier fires."""
+    end = time.monotonic() + seconds
+    while True:
+        if is_processing_interrupted():
+            raise ProcessingInterrupted("Task cancelled")
+        now = time.monotonic()
+        if now >= end:
+            return
+        if notifier is None:
+            await asyncio.sleep(min(1.0, end - now))
+        elif await notifier.wait(min(1.0, end - now)):
+            return
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 
 def _display_text(
@@ -593,7 +719,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
         attempt += 1
         stop_event = asyncio.Event()
         monitor_task: asyncio.Task | None = None
-        sess: aiohttp.ClientSession | None = None
 
         operation_id = _generate_operation_id(method, cfg.endpoint.path, attempt)
         logging.debug("[DEBUG] HTTP %s %s (attempt %d)", method, url, attempt)
@@ -612,8 +737,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             if cfg.monitor_progress:
                 monitor_task = asyncio.create_task(_monitor(stop_event, start_time))
 
-            timeout = aiohttp.ClientTimeout(total=cfg.timeout)
-            sess = aiohttp.ClientSession(timeout=timeout)
+            sess = await get_session()
 
             if cfg.content_type == "multipart/form-data" and method != "GET":
                 # aiohttp will set Content-Type boundary; remove any fixed Content-Type
@@ -665,7 +789,8 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             except Exception as _log_e:
                 logging.debug("[DEBUG] request logging failed: %s", _log_e)
 
-            req_coro = sess.request(method, url, params=params, **payload_kw)
+            timeout = aiohttp.ClientTimeout(total=cfg.timeout)
+            req_coro = sess.request(method, url, params=params, timeout=timeout, **payload_kw)
             req_task = asyncio.create_task(req_coro)
 
             # Race: request vs. monitor (interruption)
@@ -683,18 +808,22 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             # Otherwise, request finished
             resp = await req_task
             async with resp:
+                if cfg.response_headers is not None:
+                    cfg.response_headers.update(resp.headers)
                 if resp.status >= 400:
                     try:
                         body = await resp.json()
                     except (ContentTypeError, json.JSONDecodeError):
                         body = await resp.text()
                     if resp.status in _RETRY_STATUS and attempt <= cfg.max_retries:
+                        retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                        wait = delay if retry_after is None else max(delay, min(retry_after, MAX_RETRY_AFTER))
                         logging.warning(
                             "HTTP %s %s -> %s. Retrying in %.2fs (retry %d of %d).",
                             method,
                             url,
                             resp.status,
-                            delay,
+                            wait,
                             attempt,
                             cfg.max_retries,
                         )
@@ -712,7 +841,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                             logging.debug("[DEBUG] response logging failed: %s", _log_e)
 
                         await sleep_with_interrupt(
-                            delay,
+                            wait,
                             cfg.node_cls,
                             cfg.wait_label if cfg.monitor_progress else None,
                             start_time if cfg.monitor_progress else None,
@@ -869,9 +998,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
             if operation_succeeded and cfg.monitor_progress and cfg.final_label_on_success:
                 _display_time_progress(
                     cfg.node_cls,
@@ -30,7 +30,11 @@ def bytesio_to_image_tensor(image_bytesio: BytesIO, mode: str = "RGBA") -> torch
         PIL.UnidentifiedImageError: If the image data cannot be identified.
         ValueError: If the specified mode is invalid.
     """
-    image = Image.open(image_bytesio)
+    return pil_to_image_tensor(Image.open(image_bytesio), mode)
+
+
+def pil_to_image_tensor(image: Image.Image, mode: str = "RGBA") -> torch.Tensor:
+    """Converts a PIL Image to a (1, H, W, C) torch.Tensor in the given PIL mode."""
     image = image.convert(mode)
     image_array = np.array(image).astype(np.float32) / 255.0
     return torch.from_numpy(image_array).unsqueeze(0)
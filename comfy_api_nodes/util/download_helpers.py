@@ -1,5 +1,6 @@
 import asyncio
 import contextlib
+import os
 import uuid
 from io import BytesIO
 from pathlib import Path
@@ -9,22 +10,24 @@ from urllib.parse import urljoin, urlparse
 import aiohttp
 import torch
 from aiohttp.client_exceptions import ClientError, ContentTypeError
+from PIL import Image, ImageFile
 
 from comfy_api.latest import IO as COMFY_IO
 from comfy_api.latest import InputImpl, Types
-from folder_paths import get_output_directory
+from folder_paths import get_output_directory, get_temp_directory
 
 from . import request_logger
 from ._helpers import (
     default_base_url,
     get_auth_header,
+    get_session,
     is_processing_interrupted,
     sleep_with_interrupt,
     to_aiohttp_url,
 )
 from .client import _diagnose_connectivity
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
-from .conversions import bytesio_to_image_tensor
+from .conversions import pil_to_image_tensor
 
 _RETRY_STATUS = {408, 429, 500, 502, 503, 504}
 
@@ -73,7 +76,6 @@ async def download_url_to_bytesio(
 
         is_path_sink = isinstance(dest, (str, Path))
         fhandle = None
-        session: aiohttp.ClientSession | None = None
         stop_evt: asyncio.Event | None = None
         monitor_task: asyncio.Task | None = None
         req_task: asyncio.Task | None = None
@@ -82,7 +84,7 @@ async def download_url_to_bytesio(
             with contextlib.suppress(Exception):
                 request_logger.log_request_response(operation_id=op_id, request_method="GET", request_url=url)
 
-            session = aiohttp.ClientSession(timeout=timeout_cfg)
+            session = await get_session()
             stop_evt = asyncio.Event()
 
             async def _monitor():
@@ -96,7 +98,7 @@ async def download_url_to_bytesio(
 
             monitor_task = asyncio.create_task(_monitor())
 
-            req_task = asyncio.create_task(session.get(to_aiohttp_url(url), headers=headers))
+            req_task = asyncio.create_task(session.get(to_aiohttp_url(url), headers=headers, timeout=timeout_cfg))
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
 
             if monitor_task in done and req_task in pending:
@@ -142,6 +144,10 @@ async def download_url_to_bytesio(
                     sink = fhandle
                 else:
                     sink = dest  # BytesIO or file-like
+                    if hasattr(sink, "seekable") and sink.seekable():
+                        # Drop what an earlier attempt wrote before the connection broke
+                        sink.seek(0)
+                        sink.truncate()
 
                 written = 0
                 while True:
@@ -209,9 +215,6 @@ async def download_url_to_bytesio(
                 req_task.cancel()
                 with contextlib.suppress(Exception):
                     await req_task
-            if session:
-                with contextlib.suppress(Exception):
-                    await session.close()
             if fhandle:
                 with contextlib.suppress(Exception):
                     fhandle.flush()
@@ -224,10 +227,10 @@ async def download_url_to_image_tensor(
     timeout: float = None,
     cls: type[COMFY_IO.ComfyNode] = None,
 ) -> torch.Tensor:
-    """Downloads an image from a URL and returns a [B, H, W, C] tensor."""
-    result = BytesIO()
-    await download_url_to_bytesio(url, result, timeout=timeout, cls=cls)
-    return bytesio_to_image_tensor(result)
+    """Downloads an image from a URL and returns a [B, H, W, C] tensor, decoding it while it downloads."""
+    decoder = _ImageDecoder()
+    await download_url_to_bytesio(url, decoder, timeout=timeout, cls=cls)
+    return pil_to_image_tensor(decoder.close())
 
 
 async def download_url_to_video_output(
@@ -237,10 +240,18 @@ async def download_url_to_video_output(
     max_retries: int = 5,
     cls: type[COMFY_IO.ComfyNode] = None,
 ) -> InputImpl.VideoFromFile:
-    """Downloads a video from a URL and returns a `VIDEO` output."""
-    result = BytesIO()
-    await download_url_to_bytesio(video_url, result, timeout=timeout, max_retries=max_retries, cls=cls)
-    return InputImpl.VideoFromFile(result)
+    """Downloads a video from a URL into a file in the temp directory and returns a `VIDEO` output."""
+    temp_dir = get_temp_directory()
+    os.makedirs(temp_dir, exist_ok=True)
+    suffix = Path(urlparse(video_url).path).suffix[:8] or ".mp4"
+    path = os.path.join(temp_dir, f"api_video_{uuid.uuid4().hex}{suffix}")
+    try:
+        await download_url_to_bytesio(video_url, path, timeout=timeout, max_retries=max_retries, cls=cls)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        raise
+    return InputImpl.VideoFromFile(path)
 
 
 async def download_url_as_bytesio(
@@ -255,6 +266,28 @@ async def download_url_as_bytesio(
     return result
 
 
+class _ImageDecoder:
+    """A download sink feeding the chunks to PIL, which decodes the image while the rest arrives."""
+
+    def __init__(self):
+        self.parser = ImageFile.Parser()
+
+    def write(self, chunk: bytes) -> None:
+        self.parser.feed(chunk)
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int) -> None:
+        pass
+
+    def truncate(self) -> None:
+        self.parser = ImageFile.Parser()
+
+    def close(self) -> Image.Image:
+        return self.parser.close()
+
+
 def _generate_operation_id(method: str, url: str, attempt: int) -> str:
     try:
         parsed = urlparse(url)
@@ -1,8 +1,10 @@
 import asyncio
 import contextlib
 import logging
+import os
 import time
 import uuid
+from collections.abc import AsyncIterator
 from io import BytesIO
 from urllib.parse import urlparse
 
@@ -11,9 +13,10 @@ import torch
 from pydantic import BaseModel, Field
 
 from comfy_api.latest import IO, Input, Types
+from folder_paths import get_temp_directory
 
 from . import request_logger
-from ._helpers import is_processing_interrupted, sleep_with_interrupt
+from ._helpers import get_fs_object_size, get_session, is_processing_interrupted, sleep_with_interrupt
 from .client import (
     ApiEndpoint,
     _diagnose_connectivity,
@@ -28,6 +31,9 @@ from .conversions import (
 )
 
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
 class UploadRequest(BaseModel):
     file_name: str = Field(..., description="Filename to upload")
     content_type: str | None = Field(
@@ -75,16 +81,26 @@ async def upload_images_to_comfyapi(
     num_to_upload = min(len(tensors), max_images)
     batch_start_ts = time.monotonic()
 
-    for idx in range(num_to_upload):
-        tensor = tensors[idx]
-        img_io = tensor_to_bytesio(tensor, total_pixels=total_pixels, mime_type=mime_type)
-
-        effective_label = wait_label
-        if wait_label and show_batch_index and num_to_upload > 1:
-            effective_label = f"{wait_label} ({idx + 1}/{num_to_upload})"
+    def encode(idx: int) -> BytesIO:
+        return tensor_to_bytesio(tensors[idx], total_pixels=total_pixels, mime_type=mime_type)
 
-        url = await upload_file_to_comfyapi(cls, img_io, img_io.name, mime_type, effective_label, batch_start_ts)
-        download_urls.append(url)
+    # The next image is encoded on a thread while the current one uploads
+    next_encode = asyncio.ensure_future(asyncio.to_thread(encode, 0)) if num_to_upload > 0 else None
+    try:
+        for idx in range(num_to_upload):
+            img_io = await next_encode
+            if idx + 1 < num_to_upload:
+                next_encode = asyncio.ensure_future(asyncio.to_thread(encode, idx + 1))
+
+            effective_label = wait_label
+            if wait_label and show_batch_index and num_to_upload > 1:
+                effective_label = f"{wait_label} ({idx + 1}/{num_to_upload})"
+
+            url = await upload_file_to_comfyapi(cls, img_io, img_io.name, mime_type, effective_label, batch_start_ts)
+            download_urls.append(url)
+    finally:
+        if next_encode is not None and not next_encode.done():
+            next_encode.cancel()
     return download_urls
 
 
@@ -156,23 +172,27 @@ async def upload_video_to_comfyapi(
     upload_mime_type = f"video/{container.value.lower()}"
     filename = f"{uuid.uuid4()}.{container.value.lower()}"
 
-    # Convert VideoInput to BytesIO using specified container/codec
-    video_bytes_io = BytesIO()
-    video.save_to(video_bytes_io, format=container, codec=codec)
-    video_bytes_io.seek(0)
-
-    return await upload_file_to_comfyapi(cls, video_bytes_io, filename, upload_mime_type, wait_label)
+    # Encode into a temporary file and stream it from there, videos can be too large to keep in memory
+    temp_dir = get_temp_directory()
+    os.makedirs(temp_dir, exist_ok=True)
+    temp_path = os.path.join(temp_dir, f"api_upload_{filename}")
+    try:
+        await asyncio.to_thread(video.save_to, temp_path, format=container, codec=codec)
+        return await upload_file_to_comfyapi(cls, temp_path, filename, upload_mime_type, wait_label)
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
 
 
 async def upload_file_to_comfyapi(
     cls: type[IO.ComfyNode],
-    file_bytes_io: BytesIO,
+    file_bytes_io: BytesIO | str,
     filename: str,
     upload_mime_type: str | None,
     wait_label: str | None = "Uploading",
     progress_origin_ts: float | None = None,
 ) -> str:
-    """Uploads a single file to ComfyUI API and returns its download URL."""
+    """Uploads a single file, a BytesIO or a filesystem path, to ComfyUI API and returns its download URL."""
     if upload_mime_type is None:
         request_object = UploadRequest(file_name=filename)
     else:
@@ -211,20 +231,17 @@ async def upload_file(
     """
     Upload a file to a signed URL (e.g., S3 pre-signed PUT) with retries, Comfy progress display, and interruption.
 
+    Files are streamed in chunks instead of being read into memory, BytesIO buffers are sent without a copy.
+
     Raises:
         ProcessingInterrupted, LocalNetworkError, ApiServerError, Exception
     """
-    if isinstance(file, BytesIO):
-        with contextlib.suppress(Exception):
-            file.seek(0)
-        data = file.read()
-    elif isinstance(file, str):
-        with open(file, "rb") as f:
-            data = f.read()
-    else:
+    if not isinstance(file, (BytesIO, str)):
         raise ValueError("file must be a BytesIO or a filesystem path string")
+    size = get_fs_object_size(file)
 
-    headers: dict[str, str] = {}
+    # Signed URLs don't accept chunked transfer encoding
+    headers: dict[str, str] = {"Content-Length": str(size)}
     skip_auto_headers: set[str] = set()
     if content_type:
         headers["Content-Type"] = content_type
@@ -253,7 +270,7 @@ async def upload_file(
                 return
 
         monitor_task = asyncio.create_task(_monitor())
-        sess: aiohttp.ClientSession | None = None
+        view = None
         try:
             try:
                 request_logger.log_request_response(
@@ -262,13 +279,17 @@ async def upload_file(
                     request_url=upload_url,
                     request_headers=headers or None,
                     request_params=None,
-                    request_data=f"[File data {len(data)} bytes]",
+                    request_data=f"[File data {size} bytes]",
                 )
             except Exception as e:
                 logging.debug("[DEBUG] upload request logging failed: %s", e)
 
-            sess = aiohttp.ClientSession(timeout=timeout)
-            req = sess.put(upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers)
+            if isinstance(file, BytesIO):
+                data = view = file.getbuffer()  # sent without copying the buffer
+            else:
+                data = _read_file_chunks(file)
+            sess = await get_session()
+            req = sess.put(upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers, timeout=timeout)
             req_task = asyncio.create_task(req)
 
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
@@ -333,7 +354,7 @@ async def upload_file(
                         request_method="PUT",
                         request_url=upload_url,
                         request_headers=headers or None,
-                        request_data=f"[File data {len(data)} bytes]",
+                        request_data=f"[File data {size} bytes]",
                         error_message=f"{type(e).__name__}: {str(e)} (will retry)",
                     )
                 await sleep_with_interrupt(
@@ -359,9 +380,18 @@ async def upload_file(
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
+            if view is not None:
                 with contextlib.suppress(Exception):
-                    await sess.close()
+                    view.release()
+
+
+async def _read_file_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
 
 
 def _generate_operation_id(method: str, url: str, attempt: int, op_uuid: str) -> str:
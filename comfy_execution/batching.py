@@ -0,0 +1,272 @@
+"""
+Merging of queued prompts for --batch-prompts.
+
+Prompts that only differ in their sampler seeds and CLIPTextEncode texts are merged into one prompt
+that samples all of them as a single batch. The merged prompt encodes each text separately and
+stacks the conditionings, and gives every latent of the batch the noise of its own seed, so the
+images match what the prompts would produce on their own. Saved images get the metadata of the
+prompt they belong to.
+"""
+import copy
+import json
+import logging
+import threading
+import time
+import uuid
+
+import execution
+from comfy_execution.graph_utils import is_link
+
+# Only prompts made of these nodes are merged, they all handle a batch the same way as the
+# equivalent prompts one at a time. Custom node packs can add their own nodes here.
+BATCH_SAFE_NODES = {
+    "CheckpointLoaderSimple",
+    "CheckpointLoader",
+    "UNETLoader",
+    "CLIPLoader",
+    "DualCLIPLoader",
+    "VAELoader",
+    "LoraLoader",
+    "LoraLoaderModelOnly",
+    "CLIPSetLastLayer",
+    "CLIPTextEncode",
+    "EmptyLatentImage",
+    "EmptySD3LatentImage",
+    "LatentUpscale",
+    "LatentUpscaleBy",
+    "KSampler",
+    "KSamplerAdvanced",
+    "VAEDecode",
+    "SaveImage",
+    "PreviewImage",
+}
+
+# Nodes that create the latent batch and the input holding its size
+BATCH_LATENT_SOURCES = {
+    "EmptyLatentImage": "batch_size",
+    "EmptySD3LatentImage": "batch_size",
+}
+
+# Nodes that save images and the nodes replacing them in merged prompts, these write the metadata
+# of the prompt each image belongs to
+BATCH_SAVE_NODES = {
+    "SaveImage": "PromptBatchSaveImage",
+    "PreviewImage": "PromptBatchPreviewImage",
+}
+
+# Original prompt and extra_pnginfo of every prompt in the batch, keyed by the id of the running
+# merged prompt
+batch_members = {}
+
+# Prompt ids of the running batch and the ones of them an interrupt was aimed at
+interrupt_lock = threading.Lock()
+running_prompts = set()
+interrupted_prompts = set()
+
+# Sampler nodes and their seed input
+BATCH_SEED_INPUTS = {
+    "KSampler": "seed",
+    "KSamplerAdvanced": "noise_seed",
+}
+
+# Nodes that are encoded once for every merged prompt when their text differs
+BATCH_TEXT_INPUTS = {
+    "CLIPTextEncode": "text",
+}
+
+# Samplers that don't draw noise while sampling or adapt their steps to the whole batch. With the
+# others every sample of a batch would depend on the first seed or on the other samples.
+DETERMINISTIC_SAMPLERS = {
+    "euler", "euler_cfg_pp", "heun", "heunpp2", "dpm_2", "lms", "dpmpp_2m", "dpmpp_2m_cfg_pp",
+    "ipndm", "ipndm_v", "deis", "res_multistep", "res_multistep_cfg_pp", "gradient_estimation",
+    "gradient_estimation_cfg_pp", "ddim", "uni_pc", "uni_pc_bh2",
+}
+
+
+def batch_key(item):
+    """Returns a key that is equal for queue items that can be merged, or None if the item can't be merged."""
+    prompt = item[2]
+    masked = {}
+    for node_id, node in prompt.items():
+        class_type = node.get("class_type", None)
+        if class_type not in BATCH_SAFE_NODES:
+            return None
+        inputs = dict(node.get("inputs", {}))
+        if class_type in BATCH_LATENT_SOURCES and inputs.get(BATCH_LATENT_SOURCES[class_type], None) != 1:
+            return None
+        if class_type in BATCH_SEED_INPUTS:
+            if inputs.get("sampler_name", None) not in DETERMINISTIC_SAMPLERS:
+                return None
+            seed = inputs.get(BATCH_SEED_INPUTS[class_type], None)
+            if not isinstance(seed, int):
+                return None
+            inputs[BATCH_SEED_INPUTS[class_type]] = None
+        if class_type in BATCH_TEXT_INPUTS and not is_link(inputs.get(BATCH_TEXT_INPUTS[class_type], None)):
+            inputs[BATCH_TEXT_INPUTS[class_type]] = None
+        masked[node_id] = [class_type, inputs]
+    try:
+        return json.dumps([masked, sorted(item[4])], sort_keys=True)
+    except TypeError:
+        return None
+
+
+def merge_prompts(prompts):
+    """Merges prompts with the same batch_key into one prompt that samples them as one batch."""
+    count = len(prompts)
+    merged = copy.deepcopy(prompts[0])
+    for node_id, node in prompts[0].items():
+        class_type = node["class_type"]
+        if class_type in BATCH_LATENT_SOURCES:
+            merged[node_id]["inputs"][BATCH_LATENT_SOURCES[class_type]] = count
+        elif class_type in BATCH_SEED_INPUTS:
+            seeds = [prompt[node_id]["inputs"][BATCH_SEED_INPUTS[class_type]] for prompt in prompts]
+            seeds_id = "{}.seeds".format(node_id)
+            merged[seeds_id] = {
+                "class_type": "PromptBatchSeeds",
+                "inputs": {"samples": node["inputs"]["latent_image"], "seeds": ",".join(str(s) for s in seeds)},
+            }
+            merged[node_id]["inputs"]["latent_image"] = [seeds_id, 0]
+        elif class_type in BATCH_SAVE_NODES:
+            merged[node_id]["class_type"] = BATCH_SAVE_NODES[class_type]
+        elif class_type in BATCH_TEXT_INPUTS:
+            texts = [prompt[node_id]["inputs"][BATCH_TEXT_INPUTS[class_type]] for prompt in prompts]
+            if all(text == texts[0] for text in texts):
+                continue
+            # Encode every text on its own and stack the results in prompt order. The last stack node
+            # takes the id of the original node so the nodes using its output don't change.
+            previous = None
+            for i, prompt in enumerate(prompts):
+                encode_id = "{}.{}".format(node_id, i)
+                merged[encode_id] = copy.deepcopy(prompt[node_id])
+                if previous is None:
+                    previous = [encode_id, 0]
+                    continue
+                stack_id = node_id if i == count - 1 else "{}.stack{}".format(node_id, i)
+                merged[stack_id] = {
+                    "class_type": "PromptBatchStackConditioning",
+                    "inputs": {"conditioning_a": previous, "conditioning_b": [encode_id, 0]},
+                }
+                previous = [stack_id, 0]
+    return merged
+
+
+def split_history_result(history_result, count):
+    """
+    Splits the history of a merged prompt into the history of every prompt in it. Nodes that save
+    the images of each prompt list the [start, end) range of every prompt in "prompt_slices", the
+    outputs of other nodes are the same for every prompt.
+    """
+    results = [{"outputs": {}, "meta": copy.deepcopy(history_result.get("meta", {}))} for _ in range(count)]
+    for node_id, ui in history_result.get("outputs", {}).items():
+        slices = ui.get("prompt_slices", None)
+        for i in range(count):
+            outputs = {}
+            for k, v in ui.items():
+                if k == "prompt_slices":
+                    continue
+                outputs[k] = v[slices[i][0]:slices[i][1]] if slices is not None and isinstance(v, list) else v
+            results[i]["outputs"][node_id] = outputs
+    return results
+
+
+def interrupt_prompt(prompt_id):
+    """
+    Records an interrupt aimed at one prompt of the running batch, the batch is then run again
+    without it. Returns False if no batch runs the prompt.
+    """
+    with interrupt_lock:
+        if prompt_id not in running_prompts:
+            return False
+        interrupted_prompts.add(prompt_id)
+        return True
+
+
+def take_batch(queue, queue_item, max_size):
+    """Takes the queued prompts that can be merged with queue_item, returns the whole batch."""
+    key = batch_key(queue_item[0])
+    if key is None:
+        return [queue_item]
+    return [queue_item] + queue.get_matching(batch_key, key, max_size - 1)
+
+
+def execute_batch(executor, server, queue, batch, execute_item):
+    """
+    Runs a batch from take_batch as one merged prompt and finishes every queue item in it.
+    Falls back to execute_item(item, item_id) for every prompt if the merged prompt fails.
+    """
+    first = batch[0][0]
+    prompt_ids = [item[1] for item, _ in batch]
+    logging.info("Running {} prompts as one batch".format(len(batch)))
+    server.last_prompt_id = first[1]
+
+    # The merged prompt runs for a client id no client connects with, so its progress and previews
+    # are dropped. Every prompt gets its own messages afterwards.
+    extra_data = first[3].copy()
+    extra_data["client_id"] = "batch-{}".format(uuid.uuid4().hex)
+    for k, v in first[5].items():
+        extra_data[k] = v
+    batch_members[first[1]] = [(item[2], item[3].get("extra_pnginfo", None)) for item, _ in batch]
+    with interrupt_lock:
+        running_prompts.update(prompt_ids)
+    try:
+        executor.execute(merge_prompts([item[2] for item, _ in batch]), first[1], extra_data, first[4])
+    finally:
+        batch_members.pop(first[1], None)
+        with interrupt_lock:
+            running_prompts.difference_update(prompt_ids)
+            targeted = interrupted_prompts.intersection(prompt_ids)
+            interrupted_prompts.difference_update(prompt_ids)
+    interrupted = any(event == "execution_interrupted" for event, _ in executor.status_messages)
+    if not executor.success and not interrupted:
+        logging.warning("The batch of prompts {} failed, running them one at a time.".format(", ".join(prompt_ids)))
+        for item, item_id in batch:
+            execute_item(item, item_id)
+        return
+
+    if interrupted and len(targeted) > 0:
+        # The interrupt was aimed at some of the prompts, the others run again without them
+        remaining = [(item, item_id) for item, item_id in batch if item[1] not in targeted]
+        _finish_batch(executor, server, queue, [(item, item_id) for item, item_id in batch if item[1] in targeted])
+        if len(remaining) > 1:
+            execute_batch(executor, server, queue, remaining, execute_item)
+        else:
+            for item, item_id in remaining:
+                execute_item(item, item_id)
+        return
+    _finish_batch(executor, server, queue, batch)
+
+
+def _finish_batch(executor, server, queue, batch):
+    """Finishes the queue items of a merged prompt executor ran, with their part of its outputs."""
+    remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
+    if executor.success:
+        results = split_history_result(executor.history_result, len(batch))
+    else:
+        results = [{"outputs": {}, "meta": {}} for _ in batch]
+    for (item, item_id), history_result in zip(batch, results):
+        prompt_id = item[1]
+        client_id = item[3].get("client_id", None)
+        messages = []
+        for event, data in executor.status_messages:
+            data = data.copy()
+            if "prompt_id" in data:
+                data["prompt_id"] = prompt_id
+            messages.append((event, data))
+        if client_id is not None and executor.success:
+            timestamp = int(time.time() * 1000)
+            server.send_sync("execution_start", {"prompt_id": prompt_id, "timestamp": timestamp}, client_id)
+            for node_id, ui in history_result["outputs"].items():
+                server.send_sync("executed", {"node": node_id, "display_node": node_id, "output": ui, "prompt_id": prompt_id}, client_id)
+            server.send_sync("execution_success", {"prompt_id": prompt_id, "timestamp": timestamp}, client_id)
+        elif client_id is not None:
+            for event, data in messages:
+                if event == "execution_interrupted":
+                    server.send_sync(event, data, client_id)
+        queue.task_done(item_id,
+                        history_result,
+                        status=execution.PromptQueue.ExecutionStatus(
+                            status_str='success' if executor.success else 'error',
+                            completed=executor.success,
+                            messages=messages), process_item=remove_sensitive)
+        if client_id is not None:
+            server.send_sync("executing", {"node": None, "prompt_id": prompt_id}, client_id)
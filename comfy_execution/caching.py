@@ -1,14 +1,29 @@
-import bisect
+import collections
 import gc
+import hashlib
+import heapq
 import itertools
+import logging
+import math
+import numpy
+import os
 import psutil
+import sys
+import tempfile
 import time
 import torch
-from typing import Sequence, Mapping, Dict
+import weakref
+from typing import Callable, Sequence, Mapping, Dict
 from comfy_execution.graph import DynamicPrompt
 from abc import ABC, abstractmethod
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 import nodes
+import folder_paths
 
 from comfy_execution.graph_utils import is_link
 
@@ -50,19 +65,103 @@ class Unhashable:
     def __init__(self):
         self.value = float("NaN")
 
+def _content_hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+#Tensors are keyed by identity and revalidated with the in-place modification counter so
+#the same constant isn't rehashed for every cache and subcache that sees it.
+_TENSOR_DIGESTS = {}
+
+def tensor_digest(tensor):
+    try:
+        version = tensor._version
+    except RuntimeError:
+        # Inference tensors don't track in-place modifications
+        version = None
+    cached = _TENSOR_DIGESTS.get(id(tensor), None)
+    if cached is not None and cached[0]() is tensor and version is not None and cached[1] == version:
+        return cached[2]
+    h = _content_hasher()
+    try:
+        h.update(tensor.detach().contiguous().reshape(-1).view(torch.uint8).numpy())
+    except (RuntimeError, TypeError):
+        return Unhashable()
+    digest = ("TENSOR", str(tensor.dtype), tuple(tensor.shape), h.hexdigest())
+    if version is not None:
+        key = id(tensor)
+        _TENSOR_DIGESTS[key] = (weakref.ref(tensor, lambda _: _TENSOR_DIGESTS.pop(key, None)), version, digest)
+    return digest
+
+def ndarray_digest(array):
+    h = _content_hasher()
+    h.update(numpy.ascontiguousarray(array).reshape(-1).view(numpy.uint8))
+    return ("NDARRAY", str(array.dtype), tuple(array.shape), h.hexdigest())
+
 def to_hashable(obj):
+    """Converts a node input into a hashable value for use in cache signatures.
+
+    Objects can opt in by defining a __comfy_hash__() method returning any value this function
+    accepts. CPU tensors and numpy arrays are hashed by content. Anything else is Unhashable and
+    disables caching for the node.
+    """
     # So that we don't infinitely recurse since frozenset and tuples
     # are Sequences.
     if isinstance(obj, (int, float, str, bool, bytes, type(None))):
         return obj
+    elif hasattr(type(obj), "__comfy_hash__"):
+        return ("__comfy_hash__", type(obj).__module__, type(obj).__qualname__, to_hashable(obj.__comfy_hash__()))
     elif isinstance(obj, Mapping):
         return frozenset([(to_hashable(k), to_hashable(v)) for k, v in sorted(obj.items())])
     elif isinstance(obj, Sequence):
         return frozenset(zip(itertools.count(), [to_hashable(i) for i in obj]))
+    elif isinstance(obj, torch.Tensor) and obj.device.type == "cpu" and obj.layout == torch.strided:
+        return tensor_digest(obj)
+    elif isinstance(obj, numpy.ndarray) and obj.dtype.kind in "biufc":
+        return ndarray_digest(obj)
     else:
-        # TODO - Support other objects like tensors?
         return Unhashable()
 
+class UnstableSignature(Exception):
+    pass
+
+def _update_signature_digest(h, obj):
+    # frozensets have no stable iteration order and str hashing is salted per process,
+    # so hash() of a signature can't be used as a digest.
+    if obj is None or isinstance(obj, (bool, int, str, bytes)):
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, float):
+        if obj != obj:
+            raise UnstableSignature()
+        h.update(f"float:{obj!r};".encode())
+    elif isinstance(obj, frozenset):
+        items = []
+        for item in obj:
+            item_hash = hashlib.sha256()
+            _update_signature_digest(item_hash, item)
+            items.append(item_hash.digest())
+        h.update(b"set(")
+        for item in sorted(items):
+            h.update(item)
+        h.update(b")")
+    elif isinstance(obj, tuple):
+        h.update(b"tuple(")
+        for item in obj:
+            _update_signature_digest(h, item)
+        h.update(b")")
+    else:
+        raise UnstableSignature()
+
+def signature_digest(signature):
+    """Returns a process independent hex digest of a to_hashable() result or None if it contains unhashable values."""
+    h = hashlib.sha256()
+    try:
+        _update_signature_digest(h, signature)
+    except UnstableSignature:
+        return None
+    return h.hexdigest()
+
 class CacheKeySetID(CacheKeySet):
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
@@ -83,6 +182,7 @@ class CacheKeySetInputSignature(CacheKeySet):
         super().__init__(dynprompt, node_ids, is_changed_cache)
         self.dynprompt = dynprompt
         self.is_changed_cache = is_changed_cache
+        self.signatures = {}
 
     def include_node_id_in_input(self) -> bool:
         return False
@@ -98,17 +198,31 @@ class CacheKeySetInputSignature(CacheKeySet):
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
     async def get_node_signature(self, dynprompt, node_id):
-        signature = []
-        ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
-        signature.append(await self.get_immediate_node_signature(dynprompt, node_id, order_mapping))
-        for ancestor_id in ancestors:
-            signature.append(await self.get_immediate_node_signature(dynprompt, ancestor_id, order_mapping))
-        return to_hashable(signature)
-
-    async def get_immediate_node_signature(self, dynprompt, node_id, ancestor_order_mapping):
+        # Signatures are Merkle style digests: a node's digest covers its own inputs plus the
+        # digests of the nodes it links to, so every node in the graph is only hashed once.
+        if node_id in self.signatures:
+            return self.signatures[node_id]
+        stack = [node_id]
+        expanded = set()
+        while len(stack) > 0:
+            current_id = stack[-1]
+            if current_id in self.signatures:
+                stack.pop()
+                continue
+            if current_id not in expanded:
+                expanded.add(current_id)
+                pending = [x for x in self.get_ancestor_ids(dynprompt, current_id) if x not in self.signatures and x not in expanded]
+                if len(pending) > 0:
+                    stack.extend(pending)
+                    continue
+            self.signatures[current_id] = await self.get_immediate_node_signature(dynprompt, current_id)
+            stack.pop()
+        return self.signatures[node_id]
+
+    async def get_immediate_node_signature(self, dynprompt, node_id):
         if not dynprompt.has_node(node_id):
             # This node doesn't exist -- we can't cache it.
-            return [float("NaN")]
+            return Unhashable()
         node = dynprompt.get_node(node_id)
         class_type = node["class_type"]
         class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
@@ -119,32 +233,23 @@ class CacheKeySetInputSignature(CacheKeySet):
         for key in sorted(inputs.keys()):
             if is_link(inputs[key]):
                 (ancestor_id, ancestor_socket) = inputs[key]
-                ancestor_index = ancestor_order_mapping[ancestor_id]
-                signature.append((key,("ANCESTOR", ancestor_index, ancestor_socket)))
+                ancestor_signature = self.signatures.get(ancestor_id, None)
+                if not isinstance(ancestor_signature, str):
+                    # Anything downstream of an uncacheable node is uncacheable too
+                    return Unhashable()
+                signature.append((key,("ANCESTOR", ancestor_signature, ancestor_socket)))
             else:
                 signature.append((key, inputs[key]))
-        return signature
-
-    # This function returns a list of all ancestors of the given node. The order of the list is
-    # deterministic based on which specific inputs the ancestor is connected by.
-    def get_ordered_ancestry(self, dynprompt, node_id):
-        ancestors = []
-        order_mapping = {}
-        self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
-        return ancestors, order_mapping
+        digest = signature_digest(to_hashable(signature))
+        if digest is None:
+            return Unhashable()
+        return digest
 
-    def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
+    def get_ancestor_ids(self, dynprompt, node_id):
         if not dynprompt.has_node(node_id):
-            return
+            return []
         inputs = dynprompt.get_node(node_id)["inputs"]
-        input_keys = sorted(inputs.keys())
-        for key in input_keys:
-            if is_link(inputs[key]):
-                ancestor_id = inputs[key][0]
-                if ancestor_id not in order_mapping:
-                    ancestors.append(ancestor_id)
-                    order_mapping[ancestor_id] = len(ancestors) - 1
-                    self.get_ordered_ancestry_internal(dynprompt, ancestor_id, ancestors, order_mapping)
+        return [inputs[key][0] for key in sorted(inputs.keys()) if is_link(inputs[key])]
 
 class BasicCache:
     def __init__(self, key_class):
@@ -364,23 +469,111 @@ RAM_CACHE_DEFAULT_RAM_USAGE = 0.1
 
 RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER = 1.3
 
+#Score Tensors at a 50% discount for RAM usage as they are likely to be high value intermediates
+
+RAM_CACHE_TENSOR_DISCOUNT = 0.5
+
+RAM_USAGE_ESTIMATORS: Dict[type, Callable[[object], int]] = {}
+
+def register_ram_usage_estimator(object_type, estimator):
+    """Registers estimator(obj) -> bytes of RAM held by objects of object_type when they sit in the output cache."""
+    RAM_USAGE_ESTIMATORS[object_type] = estimator
+
+def _get_ram_usage_estimator(obj):
+    for object_type in type(obj).__mro__:
+        estimator = RAM_USAGE_ESTIMATORS.get(object_type, None)
+        if estimator is not None:
+            return estimator
+    return None
+
+def estimate_ram_usage(outputs):
+    """Returns (total_bytes, tensor_bytes) of RAM held by a node's cached outputs.
+
+    Containers are walked once and shared objects are only counted once.
+    """
+    total = 0
+    tensor_total = 0
+    seen = set()
+    pending = [outputs]
+    while len(pending) > 0:
+        obj = pending.pop()
+        if obj is None or isinstance(obj, (bool, int, float, str, bytes)) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, torch.Tensor):
+            if obj.device.type == 'cpu':
+                size = obj.numel() * obj.element_size()
+                total += size
+                tensor_total += size
+        elif isinstance(obj, (list, tuple)):
+            #conditioning lists and batched outputs
+            pending.extend(obj)
+        elif isinstance(obj, dict):
+            #latent dicts and conditioning extras
+            pending.extend(obj.values())
+        else:
+            estimator = _get_ram_usage_estimator(obj)
+            if estimator is not None:
+                total += estimator(obj)
+            elif hasattr(obj, "get_ram_usage"):
+                #ModelPatcher, CLIP and VAE report the size of their weights
+                total += obj.get_ram_usage()
+    return total, tensor_total
+
 class RAMPressureCache(LRUCache):
 
     def __init__(self, key_class):
         super().__init__(key_class, 0)
         self.timestamps = {}
+        self.ram_usage = {}
+        self.ram_weights = {}
+        self.entry_nodes = {}
+        #Max-heap on OOM score with lazy invalidation: every touch pushes a fresh entry and
+        #stale ones are skipped when popped.
+        self.eviction_heap = []
+        self.eviction_stamps = {}
+        self.eviction_counter = itertools.count()
 
     def clean_unused(self):
         self._clean_subcaches()
 
+    def _push_eviction_entry(self, key):
+        #MULTIPLIER ** (generation - used_generation) * usage orders entries the same way for any
+        #generation, so the log of the generation independent part is a stable heap priority.
+        score = math.log(self.ram_weights[key]) - self.used_generation[key] * math.log(RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER)
+        stamp = next(self.eviction_counter)
+        self.eviction_stamps[key] = stamp
+        #In the case where we have no information on the node ram usage at all,
+        #break OOM score ties on the last touch timestamp (pure LRU)
+        heapq.heappush(self.eviction_heap, (-score, self.timestamps[key], stamp, key))
+        if len(self.eviction_heap) > 4 * len(self.cache) + 64:
+            self.eviction_heap = [x for x in self.eviction_heap if self.eviction_stamps.get(x[3], None) == x[2]]
+            heapq.heapify(self.eviction_heap)
+
+    def _mark_used(self, node_id):
+        super()._mark_used(node_id)
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        if cache_key in self.ram_weights:
+            self._push_eviction_entry(cache_key)
+
     def set(self, node_id, value):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        self.timestamps[cache_key] = time.time()
+        ram_usage, tensor_usage = estimate_ram_usage(value.outputs)
+        self.ram_usage[cache_key] = ram_usage
+        self.ram_weights[cache_key] = RAM_CACHE_DEFAULT_RAM_USAGE + ram_usage - tensor_usage * (1.0 - RAM_CACHE_TENSOR_DISCOUNT)
+        self.entry_nodes[cache_key] = (node_id, self.dynprompt.get_node(node_id)["class_type"])
         super().set(node_id, value)
 
     def get(self, node_id):
         self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
         return super().get(node_id)
 
+    def _evict(self, key):
+        del self.cache[key]
+        for metadata in (self.timestamps, self.ram_usage, self.ram_weights, self.entry_nodes, self.eviction_stamps):
+            metadata.pop(key, None)
+
     def poll(self, ram_headroom):
         def _ram_gb():
             return psutil.virtual_memory().available / (1024**3)
@@ -391,33 +584,320 @@ class RAMPressureCache(LRUCache):
         if _ram_gb() > ram_headroom:
             return
 
-        clean_list = []
-
-        for key, (outputs, _), in self.cache.items():
-            oom_score =  RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER ** (self.generation - self.used_generation[key])
-
-            ram_usage = RAM_CACHE_DEFAULT_RAM_USAGE
-            def scan_list_for_ram_usage(outputs):
-                nonlocal ram_usage
-                if outputs is None:
-                    return
-                for output in outputs:
-                    if isinstance(output, list):
-                        scan_list_for_ram_usage(output)
-                    elif isinstance(output, torch.Tensor) and output.device.type == 'cpu':
-                        #score Tensors at a 50% discount for RAM usage as they are likely to
-                        #be high value intermediates
-                        ram_usage += (output.numel() * output.element_size()) * 0.5
-                    elif hasattr(output, "get_ram_usage"):
-                        ram_usage += output.get_ram_usage()
-            scan_list_for_ram_usage(outputs)
-
-            oom_score *= ram_usage
-            #In the case where we have no information on the node ram usage at all,
-            #break OOM score ties on the last touch timestamp (pure LRU)
-            bisect.insort(clean_list, (oom_score, self.timestamps[key], key))
-
-        while _ram_gb() < ram_headroom * RAM_CACHE_HYSTERESIS and clean_list:
-            _, _, key = clean_list.pop()
-            del self.cache[key]
+        while _ram_gb() < ram_headroom * RAM_CACHE_HYSTERESIS and self.eviction_heap:
+            _, _, stamp, key = heapq.heappop(self.eviction_heap)
+            if self.eviction_stamps.get(key, None) != stamp:
+                continue
+            self._evict(key)
             gc.collect()
+
+    def ram_usage_report(self):
+        usage = dict(self.ram_usage)
+        entry_nodes = dict(self.entry_nodes)
+        timestamps = dict(self.timestamps)
+        report = []
+        for key, ram_usage in usage.items():
+            node_id, class_type = entry_nodes.get(key, (None, None))
+            report.append({"node_id": node_id, "class_type": class_type, "ram_usage": ram_usage, "last_used": timestamps.get(key, None)})
+        report.sort(key=lambda x: x["ram_usage"], reverse=True)
+        return report
+
+#Output types the disk cache is willing to persist. These are plain tensor containers
+#that round-trip through torch.save/torch.load(weights_only=True).
+
+DISK_CACHE_OUTPUT_TYPES = frozenset(("CONDITIONING", "LATENT", "IMAGE", "MASK"))
+
+DISK_CACHE_FILE_EXTENSION = ".pt"
+
+def _is_disk_serializable(obj):
+    if obj is None or isinstance(obj, (bool, int, float, str, torch.Tensor)):
+        return True
+    elif isinstance(obj, (list, tuple)):
+        return all(_is_disk_serializable(x) for x in obj)
+    elif isinstance(obj, dict):
+        return all(isinstance(k, str) and _is_disk_serializable(v) for k, v in obj.items())
+    return False
+
+_NODE_CLASS_VERSIONS: Dict[str, str] = {}
+
+def _node_class_version(class_type):
+    #A node pack update must not serve results computed by the old code, so key on the
+    #mtime of the module that defines the node.
+    if class_type in _NODE_CLASS_VERSIONS:
+        return _NODE_CLASS_VERSIONS[class_type]
+    class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
+    version = class_def.__module__
+    module = sys.modules.get(class_def.__module__, None)
+    module_file = getattr(module, "__file__", None)
+    if module_file is not None:
+        try:
+            version = f"{version}:{os.path.getmtime(module_file)}"
+        except OSError:
+            pass
+    _NODE_CLASS_VERSIONS[class_type] = version
+    return version
+
+_COMFYUI_VERSION = None
+
+def _git_commit(root):
+    git_dir = os.path.join(root, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[len("ref: "):]
+        ref_path = os.path.join(git_dir, *ref.split("/"))
+        if os.path.isfile(ref_path):
+            with open(ref_path) as f:
+                return f.read().strip()
+        with open(os.path.join(git_dir, "packed-refs")) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+def _comfyui_version():
+    #Updates of the core code (samplers, model loading...) change results as much as node updates.
+    global _COMFYUI_VERSION
+    if _COMFYUI_VERSION is None:
+        import comfyui_version
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        _COMFYUI_VERSION = f"{comfyui_version.__version__}:{_git_commit(root)}"
+    return _COMFYUI_VERSION
+
+class DiskCache:
+    """Persistent tier in front of an outputs cache.
+
+    Outputs of nodes that only return tensor types are written to a content addressed directory
+    keyed by their input signature so they survive restarts. Lookups that miss the wrapped cache
+    fall back to disk and repopulate it. The directory is kept under max_size bytes by evicting the
+    least recently used files.
+
+    Besides the signature, the key holds the ComfyUI version, the versions of the node modules and
+    the size and mtime of the model files the node and its ancestors load, as none of these are part
+    of the signature.
+    """
+
+    def __init__(self, cache, directory, max_size, entry_class):
+        self.cache = cache
+        self.directory = directory
+        self.max_size = max_size
+        self.entry_class = entry_class
+        self.dynprompt = None
+        self.digests = {}
+        # Per prompt: node id -> model file versions of it and its ancestors, file name -> versions,
+        # class type -> names of its combo inputs
+        self.node_file_versions = {}
+        self.file_versions = {}
+        self.file_inputs = {}
+        self.files = collections.OrderedDict()
+        self.total_size = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith(DISK_CACHE_FILE_EXTENSION):
+                continue
+            stat = entry.stat()
+            found.append((stat.st_mtime, entry.name[:-len(DISK_CACHE_FILE_EXTENSION)], stat.st_size))
+        for _, digest, size in sorted(found):
+            self.files[digest] = size
+            self.total_size += size
+        logging.info("Disk cache at {} holds {} entries ({:.2f} GB).".format(self.directory, len(self.files), self.total_size / (1024**3)))
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + DISK_CACHE_FILE_EXTENSION)
+
+    def _digest(self, node_id):
+        cache = self.cache
+        if isinstance(cache, HierarchicalCache):
+            cache = cache._get_cache_for(node_id)
+            if cache is None:
+                return None
+        if not cache.initialized:
+            return None
+        key = cache.cache_key_set.get_data_key(node_id)
+        if key is None:
+            return None
+        if key not in self.digests:
+            class_type = self.dynprompt.get_node(node_id)["class_type"]
+            version = (_comfyui_version(), _node_class_version(class_type), self._model_file_versions(node_id))
+            self.digests[key] = signature_digest((version, key))
+        return self.digests[key]
+
+    def _file_version(self, name):
+        #A model replaced under the same name must not serve results computed with the old one.
+        if name not in self.file_versions:
+            versions = []
+            extension = os.path.splitext(name)[1].lower()
+            if len(extension) > 0:
+                for folder_name, (_, extensions) in list(folder_paths.folder_names_and_paths.items()):
+                    if len(extensions) > 0 and extension not in extensions:
+                        continue
+                    path = folder_paths.get_full_path(folder_name, name)
+                    if path is None:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    versions.append((folder_name, stat.st_size, stat.st_mtime_ns))
+            self.file_versions[name] = tuple(versions)
+        return self.file_versions[name]
+
+    def _file_inputs(self, class_type):
+        #Files are picked with combo inputs, free text inputs are never looked up as files.
+        if class_type not in self.file_inputs:
+            names = set()
+            class_def = nodes.NODE_CLASS_MAPPINGS.get(class_type, None)
+            if class_def is not None:
+                valid_inputs = class_def.INPUT_TYPES()
+                for category in ("required", "optional"):
+                    for name, input_info in valid_inputs.get(category, {}).items():
+                        if isinstance(input_info[0], list) or input_info[0] == "COMBO":
+                            names.add(name)
+            self.file_inputs[class_type] = names
+        return self.file_inputs[class_type]
+
+    def _model_file_versions(self, node_id):
+        if node_id in self.node_file_versions:
+            return self.node_file_versions[node_id]
+        stack = [node_id]
+        while len(stack) > 0:
+            current = stack[-1]
+            if current in self.node_file_versions:
+                stack.pop()
+                continue
+            if not self.dynprompt.has_node(current):
+                self.node_file_versions[current] = frozenset()
+                stack.pop()
+                continue
+            node = self.dynprompt.get_node(current)
+            inputs = node["inputs"]
+            parents = [v[0] for v in inputs.values() if is_link(v) and v[0] not in self.node_file_versions]
+            if len(parents) > 0:
+                stack.extend(parents)
+                continue
+            file_inputs = self._file_inputs(node["class_type"])
+            versions = set()
+            for name, value in inputs.items():
+                if is_link(value):
+                    versions.update(self.node_file_versions[value[0]])
+                elif isinstance(value, str) and name in file_inputs:
+                    file_version = self._file_version(value)
+                    if len(file_version) > 0:
+                        versions.add((value, file_version))
+            self.node_file_versions[current] = frozenset(versions)
+            stack.pop()
+        return self.node_file_versions[node_id]
+
+    def _is_spillable(self, node_id, value):
+        if value.ui is not None or value.outputs is None:
+            return False
+        class_def = nodes.NODE_CLASS_MAPPINGS[self.dynprompt.get_node(node_id)["class_type"]]
+        return_types = getattr(class_def, "RETURN_TYPES", ())
+        if len(return_types) == 0 or not all(t in DISK_CACHE_OUTPUT_TYPES for t in return_types):
+            return False
+        return _is_disk_serializable(value.outputs)
+
+    def _load(self, digest):
+        path = self._path(digest)
+        try:
+            outputs = torch.load(path, map_location="cpu", weights_only=True)
+            os.utime(path)
+        except Exception as e:
+            logging.warning("Dropping unreadable disk cache entry {}: {}".format(path, e))
+            self._remove(digest)
+            return None
+        self.files.move_to_end(digest)
+        return self.entry_class(ui=None, outputs=outputs)
+
+    def _store(self, digest, outputs):
+        path = self._path(digest)
+        temp_path = None
+        try:
+            # Unique name, several --workers may share the directory
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                torch.save(outputs, f)
+            os.replace(temp_path, path)
+            temp_path = None
+            size = os.path.getsize(path)
+        except Exception as e:
+            logging.warning("Failed to write disk cache entry {}: {}".format(path, e))
+            return
+        finally:
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        self.files[digest] = size
+        self.total_size += size
+        while self.total_size > self.max_size and len(self.files) > 1:
+            self._remove(next(iter(self.files)))
+
+    def _remove(self, digest):
+        size = self.files.pop(digest, 0)
+        self.total_size -= size
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    async def set_prompt(self, dynprompt, node_ids, is_changed_cache):
+        self.dynprompt = dynprompt
+        self.digests = {}
+        self.node_file_versions = {}
+        self.file_versions = {}
+        self.file_inputs = {}
+        await self.cache.set_prompt(dynprompt, node_ids, is_changed_cache)
+
+    def all_node_ids(self):
+        return self.cache.all_node_ids()
+
+    def clean_unused(self):
+        self.cache.clean_unused()
+
+    def poll(self, **kwargs):
+        self.cache.poll(**kwargs)
+
+    def get(self, node_id):
+        value = self.cache.get(node_id)
+        if value is not None:
+            return value
+        digest = self._digest(node_id)
+        if digest is None or digest not in self.files:
+            return None
+        value = self._load(digest)
+        if value is not None:
+            self.cache.set(node_id, value)
+        return value
+
+    def set(self, node_id, value):
+        self.cache.set(node_id, value)
+        if not self._is_spillable(node_id, value):
+            return
+        digest = self._digest(node_id)
+        if digest is None:
+            return
+        if digest in self.files:
+            self.files.move_to_end(digest)
+            return
+        self._store(digest, value.outputs)
+
+    async def ensure_subcache_for(self, node_id, children_ids):
+        return await self.cache.ensure_subcache_for(node_id, children_ids)
+
+    def ram_usage_report(self):
+        report = getattr(self.cache, "ram_usage_report", None)
+        return report() if report is not None else []
+
+    def recursive_debug_dump(self):
+        return self.cache.recursive_debug_dump()
@@ -0,0 +1,131 @@
+"""
+Encodes and writes the images of SaveImage and similar nodes on a pool of threads, so the next
+node can start while a batch is still being written.
+
+The "executed" message of a node is only sent once its images are written, and PromptExecutor
+waits for all writes of a prompt before it finishes, so the files exist by the time the
+frontend or the history refers to them.
+"""
+import logging
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from comfy.cli_args import args
+from comfy_execution.utils import get_executing_context
+
+try:
+    import pillow_jxl  # noqa: F401 registers the JPEG XL plugin with Pillow
+except ImportError:
+    pass
+
+# --save-image-format: file extension and Image.save arguments
+SAVE_IMAGE_FORMATS = {
+    "png": (".png", {"compress_level": 4}),
+    "png-fast": (".png", {"compress_level": 1}),
+    "webp": (".webp", {"quality": 95, "method": 4}),
+    "webp-lossless": (".webp", {"lossless": True, "quality": 0, "method": 0}),
+    "jxl": (".jxl", {"quality": 95, "effort": 3}),
+}
+
+
+def save_image_format():
+    """Returns the extension and Image.save arguments for the configured --save-image-format."""
+    extension, save_args = SAVE_IMAGE_FORMATS[args.save_image_format]
+    if extension not in Image.registered_extensions():
+        raise RuntimeError("Saving {} images is not supported, install a Pillow plugin for it (pillow-jxl-plugin for JPEG XL).".format(extension))
+    return extension, save_args
+
+
+class _WriteGroup:
+    """The writes of one node execution."""
+
+    def __init__(self):
+        self.remaining = 0
+        self.callbacks = []
+        self.errors = []
+        self.done = threading.Event()
+        self.done.set()
+
+
+class ImageWriter:
+    def __init__(self, threads=None):
+        if threads is None:
+            threads = min(8, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="image_writer")
+        self.lock = threading.Lock()
+        # (prompt_id, node_id) -> _WriteGroup
+        self.groups = {}
+
+    def save(self, image, path, **save_args):
+        """
+        Writes a PIL image with image.save(path, **save_args). Inside a node execution this returns
+        right away and the image is written in the background, else it is written before returning.
+        """
+        context = get_executing_context()
+        if context is None:
+            image.save(path, **save_args)
+            return
+        key = (context.prompt_id, context.node_id)
+        with self.lock:
+            group = self.groups.get(key, None)
+            if group is None:
+                group = _WriteGroup()
+                self.groups[key] = group
+            group.remaining += 1
+            group.done.clear()
+        self.executor.submit(self._write, group, image, path, save_args)
+
+    def _write(self, group, image, path, save_args):
+        error = None
+        try:
+            image.save(path, **save_args)
+        except Exception as e:
+            logging.error("Failed to write {}: {}".format(path, e))
+            error = (path, e, traceback.format_tb(e.__traceback__))
+        with self.lock:
+            if error is not None:
+                group.errors.append(error)
+            group.remaining -= 1
+            if group.remaining > 0:
+                return
+            callbacks = group.callbacks
+            group.callbacks = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logging.exception("Error after writing images")
+        with self.lock:
+            # A write saved since then sets done once it finishes
+            if group.remaining == 0:
+                group.done.set()
+
+    def after_writes(self, prompt_id, node_id, callback):
+        """Calls callback once the node's images are written, right away if none are pending."""
+        with self.lock:
+            group = self.groups.get((prompt_id, node_id), None)
+            if group is not None and group.remaining > 0:
+                group.callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, prompt_id):
+        """Waits for all writes of a prompt, returns a list of (node_id, path, exception, traceback) for the ones that failed."""
+        with self.lock:
+            groups = [(key[1], group) for key, group in self.groups.items() if key[0] == prompt_id]
+        errors = []
+        for node_id, group in groups:
+            group.done.wait()
+            errors.extend((node_id,) + error for error in group.errors)
+        with self.lock:
+            for node_id, group in groups:
+                if self.groups.get((prompt_id, node_id), None) is group and group.remaining == 0:
+                    del self.groups[(prompt_id, node_id)]
+        return errors
+
+
+image_writer = ImageWriter()
@@ -233,6 +233,57 @@ def get_job(prompt_id: str, running: list, queued: list, history: dict) -> Optio
     return None
 
 
+def summarize_jobs(running: list, queued: list, history: dict) -> list[dict]:
+    """
+    Normalize every running, queued and history item into a job dict, unfiltered and unsorted.
+
+    The result only depends on its arguments, so callers may keep it and pass it to
+    filter_jobs for any number of requests until the queue or history changes.
+    """
+    jobs = []
+    for item in running:
+        jobs.append(normalize_queue_item(item, JobStatus.IN_PROGRESS))
+    for item in queued:
+        jobs.append(normalize_queue_item(item, JobStatus.PENDING))
+    for prompt_id, history_item in history.items():
+        jobs.append(normalize_history_item(prompt_id, history_item))
+    return jobs
+
+
+def filter_jobs(
+    jobs: list[dict],
+    status_filter: Optional[list[str]] = None,
+    workflow_id: Optional[str] = None,
+    sort_by: str = "created_at",
+    sort_order: str = "desc",
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> tuple[list[dict], int]:
+    """
+    Filter, sort and paginate job dicts from summarize_jobs. The job dicts are not modified.
+
+    Returns:
+        tuple: (jobs_list, total_count)
+    """
+    if status_filter is not None:
+        statuses = set(status_filter)
+        jobs = [j for j in jobs if j.get('status') in statuses]
+
+    if workflow_id:
+        jobs = [j for j in jobs if j.get('workflow_id') == workflow_id]
+
+    jobs = apply_sorting(jobs, sort_by, sort_order)
+
+    total_count = len(jobs)
+
+    if offset > 0:
+        jobs = jobs[offset:]
+    if limit is not None:
+        jobs = jobs[:limit]
+
+    return (jobs, total_count)
+
+
 def get_all_jobs(
     running: list,
     queued: list,
@@ -261,37 +312,4 @@ def get_all_jobs(
     Returns:
         tuple: (jobs_list, total_count)
     """
-    jobs = []
-
-    if status_filter is None:
-        status_filter = JobStatus.ALL
-
-    if JobStatus.IN_PROGRESS in status_filter:
-        for item in running:
-            jobs.append(normalize_queue_item(item, JobStatus.IN_PROGRESS))
-
-    if JobStatus.PENDING in status_filter:
-        for item in queued:
-            jobs.append(normalize_queue_item(item, JobStatus.PENDING))
-
-    history_statuses = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
-    requested_history_statuses = history_statuses & set(status_filter)
-    if requested_history_statuses:
-        for prompt_id, history_item in history.items():
-            job = normalize_history_item(prompt_id, history_item)
-            if job.get('status') in requested_history_statuses:
-                jobs.append(job)
-
-    if workflow_id:
-        jobs = [j for j in jobs if j.get('workflow_id') == workflow_id]
-
-    jobs = apply_sorting(jobs, sort_by, sort_order)
-
-    total_count = len(jobs)
-
-    if offset > 0:
-        jobs = jobs[offset:]
-    if limit is not None:
-        jobs = jobs[:limit]
-
-    return (jobs, total_count)
+    return filter_jobs(summarize_jobs(running, queued, history), status_filter, workflow_id, sort_by, sort_order, limit, offset)
@@ -0,0 +1,47 @@
+from typing import Dict, Tuple
+
+# Loader nodes whose inputs identify the models a prompt will load. Custom node packs can add
+# their own loaders here.
+MODEL_LOADER_INPUTS: Dict[str, Tuple[str, ...]] = {
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "CheckpointLoader": ("config_name", "ckpt_name"),
+    "ImageOnlyCheckpointLoader": ("ckpt_name",),
+    "UNETLoader": ("unet_name", "weight_dtype"),
+    "CLIPLoader": ("clip_name", "type", "device"),
+    "DualCLIPLoader": ("clip_name1", "clip_name2", "type", "device"),
+    "TripleCLIPLoader": ("clip_name1", "clip_name2", "clip_name3"),
+    "QuadrupleCLIPLoader": ("clip_name1", "clip_name2", "clip_name3", "clip_name4"),
+    "VAELoader": ("vae_name",),
+}
+
+
+def get_prompt_model_keys(prompt: dict) -> frozenset:
+    """Returns the set of (class_type, *loader inputs) tuples for the model loaders in a prompt."""
+    keys = []
+    for node in prompt.values():
+        input_names = MODEL_LOADER_INPUTS.get(node.get("class_type"), None)
+        if input_names is None:
+            continue
+        inputs = node.get("inputs", {})
+        values = tuple(inputs.get(name, None) for name in input_names)
+        # Linked or otherwise non literal inputs can't be known before execution
+        if not all(isinstance(v, (str, int, float, bool, type(None))) for v in values):
+            continue
+        keys.append((node["class_type"],) + values)
+    return frozenset(keys)
+
+
+class ModelAffinity:
+    """PromptQueue.get affinity that prefers prompts using the models of the last prompt that ran."""
+
+    def __init__(self):
+        self.model_keys = frozenset()
+
+    def __call__(self, item) -> int:
+        return len(get_prompt_model_keys(item[2]) & self.model_keys)
+
+    def update(self, prompt: dict):
+        self.model_keys = get_prompt_model_keys(prompt)
+
+    def reset(self):
+        self.model_keys = frozenset()
@@ -0,0 +1,364 @@
+"""
+Multi-process prompt execution for --workers.
+
+The main process keeps the HTTP server and the PromptQueue. Every worker is a separate ComfyUI
+process started with --worker-address that runs the regular prompt_worker loop against a
+WorkerQueue, which receives prompts over an authenticated multiprocessing connection. Messages the
+executor sends to the frontend are forwarded back to the main server.
+"""
+import collections
+import logging
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from aiohttp import web
+
+import execution
+import nodes
+from comfy_execution.scheduling import ModelAffinity
+
+WORKER_AUTHKEY_ENV = "COMFYUI_WORKER_AUTHKEY"
+
+#Seconds to wait before starting a worker process again after it exited or failed to connect
+WORKER_RESTART_DELAY = 5.0
+
+
+def parse_worker_devices(worker_count, devices=None, cpu=False):
+    """Returns one device per worker: 'cpu' or a cuda device index as a string."""
+    if devices is not None:
+        devices = [d.strip() for d in devices.split(",") if len(d.strip()) > 0]
+        if len(devices) == 0:
+            raise ValueError("--worker-devices is empty")
+        return [devices[i % len(devices)] for i in range(worker_count)]
+    if cpu:
+        return ["cpu"] * worker_count
+    return [str(i) for i in range(worker_count)]
+
+
+def strip_worker_args(argv):
+    """Removes the arguments that only apply to the main process from a command line."""
+    main_only = ("--workers", "--worker-devices", "--worker-address", "--cuda-device", "--default-device")
+    out = []
+    skip_value = False
+    for arg in argv:
+        if skip_value:
+            skip_value = False
+            continue
+        name = arg.split("=", 1)[0]
+        if name in main_only:
+            skip_value = "=" not in arg
+            continue
+        if name == "--cpu":
+            continue
+        out.append(arg)
+    return out
+
+
+class WorkerProcess:
+    def __init__(self, index, device, argv):
+        self.index = index
+        self.device = device
+        self.argv = argv
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.prompt_id = None
+        # Whether the worker confirmed it received the prompt being sent to it
+        self.accepted = False
+        self.affinity = ModelAffinity()
+
+    def device_args(self):
+        if self.device == "cpu":
+            return ["--cpu"]
+        return ["--cuda-device", self.device]
+
+    def start(self, authkey):
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = listener.address
+        main_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "main.py")
+        command = [sys.executable, main_path] + self.argv + self.device_args() + ["--worker-address", "{}:{}".format(host, port)]
+        env = dict(os.environ)
+        env[WORKER_AUTHKEY_ENV] = authkey.hex()
+        logging.info("Starting worker {} on device {}".format(self.index, self.device))
+        self.process = subprocess.Popen(command, env=env)
+
+        connected = threading.Event()
+        def close_listener_on_exit():
+            # Listener.accept has no timeout, unblock it if the process dies before connecting
+            self.process.wait()
+            if not connected.is_set():
+                listener.close()
+        threading.Thread(target=close_listener_on_exit, daemon=True).start()
+        try:
+            self.conn = listener.accept()
+        finally:
+            connected.set()
+            listener.close()
+        logging.info("Worker {} connected".format(self.index))
+
+    def stop(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+        self.process = None
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+
+class WorkerPool:
+    def __init__(self, server, prompt_queue, devices, argv):
+        self.server = server
+        self.prompt_queue = prompt_queue
+        self.authkey = secrets.token_bytes(32)
+        self.workers = [WorkerProcess(i, device, argv) for i, device in enumerate(devices)]
+
+    def start(self):
+        for worker in self.workers:
+            threading.Thread(target=self._dispatch_loop, args=(worker,), daemon=True).start()
+
+    def interrupt(self, prompt_id=None):
+        for worker in self.workers:
+            if worker.conn is None or worker.prompt_id is None:
+                continue
+            if prompt_id is None or worker.prompt_id == prompt_id:
+                try:
+                    worker.send(("interrupt", prompt_id))
+                except OSError:
+                    pass
+
+    def _broadcast(self, message):
+        for worker in self.workers:
+            if worker.conn is not None:
+                try:
+                    worker.send(message)
+                except OSError:
+                    pass
+
+    def _dispatch_loop(self, worker):
+        while True:
+            if worker.conn is not None and not worker.is_alive():
+                # Died while idle, don't hand it a prompt
+                logging.error("Worker {} exited, restarting it".format(worker.index))
+                worker.stop()
+            if worker.conn is None:
+                try:
+                    worker.start(self.authkey)
+                except Exception as e:
+                    logging.error("Worker {} failed to start: {}".format(worker.index, e))
+                    worker.stop()
+                    time.sleep(WORKER_RESTART_DELAY)
+                    continue
+
+            queue_item = self.prompt_queue.get(timeout=1.0, affinity=worker.affinity)
+            flags = self.prompt_queue.get_flags()
+            if len(flags) > 0:
+                self._broadcast(("flags", flags))
+                if flags.get("unload_models", flags.get("free_memory", False)):
+                    for w in self.workers:
+                        w.affinity.reset()
+            if queue_item is None:
+                continue
+
+            self._run_item(worker, *queue_item)
+
+    def _run_item(self, worker, item, item_id):
+        try:
+            self._execute(worker, item, item_id)
+        except (EOFError, OSError) as e:
+            if not worker.accepted:
+                # The prompt never ran, another worker can take it
+                logging.error("Worker {} exited before it received prompt {}, queueing it again: {}".format(worker.index, item[1], e))
+                self.prompt_queue.requeue(item_id)
+            else:
+                logging.error("Worker {} exited while executing prompt {}: {}".format(worker.index, item[1], e))
+                if worker.prompt_id is not None:
+                    self._fail_prompt(item, item_id, "Worker process {} exited unexpectedly.".format(worker.index))
+            worker.stop()
+        finally:
+            worker.prompt_id = None
+
+    def _execute(self, worker, item, item_id):
+        worker.prompt_id = item[1]
+        worker.accepted = False
+        client_id = item[3].get("client_id", None)
+        sockets_metadata = {}
+        if client_id in self.server.sockets_metadata:
+            sockets_metadata[client_id] = self.server.sockets_metadata[client_id]
+        worker.send(("execute", item, sockets_metadata))
+
+        # The worker sends "idle" once it finished post processing a prompt so messages sent after
+        # task_done still reach the frontend in order.
+        while True:
+            message = worker.conn.recv()
+            kind = message[0]
+            if kind == "accepted":
+                worker.accepted = True
+            elif kind == "message":
+                _, event, data, sid = message
+                self.server.send_sync(event, data, sid)
+            elif kind == "progress_text":
+                _, text, node_id, sid = message
+                self.server.send_progress_text(text, node_id, sid)
+            elif kind == "done":
+                _, history_result, status, processed_item = message
+                self.prompt_queue.task_done(item_id, history_result, status=status, process_item=lambda _: processed_item)
+                worker.prompt_id = None
+                worker.affinity.update(item[2])
+            elif kind == "idle":
+                return
+
+    def _fail_prompt(self, item, item_id, exception_message):
+        prompt_id = item[1]
+        client_id = item[3].get("client_id", None)
+        mes = {
+            "prompt_id": prompt_id,
+            "node_id": None,
+            "node_type": None,
+            "executed": [],
+            "exception_message": exception_message,
+            "exception_type": "WorkerProcessError",
+            "traceback": [],
+            "current_inputs": {},
+            "current_outputs": [],
+            "timestamp": int(time.time() * 1000),
+        }
+        remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
+        self.prompt_queue.task_done(item_id,
+                                    {"outputs": {}, "meta": {}},
+                                    status=execution.PromptQueue.ExecutionStatus(
+                                        status_str='error',
+                                        completed=False,
+                                        messages=[("execution_error", mes)]), process_item=remove_sensitive)
+        if client_id is not None:
+            self.server.send_sync("execution_error", mes, client_id)
+            self.server.send_sync("executing", {"node": None, "prompt_id": prompt_id}, client_id)
+
+
+class WorkerServer:
+    """Stands in for PromptServer.instance inside a worker process and forwards messages to the main server."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.routes = web.RouteTableDef()
+        self.prompt_queue = None
+        self.prompt_executors = []
+        self.sockets_metadata = {}
+        self.client_id = None
+        self.last_node_id = None
+        self.last_prompt_id = None
+
+    def send_message(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def send_sync(self, event, data, sid=None):
+        self.send_message(("message", event, data, sid))
+
+    def send_progress_text(self, text, node_id, sid=None):
+        self.send_message(("progress_text", text, node_id, sid))
+
+    def queue_updated(self):
+        pass
+
+    def add_on_prompt_handler(self, handler):
+        pass
+
+
+class WorkerQueue:
+    """The PromptQueue interface prompt_worker uses, backed by the connection to the main process."""
+
+    def __init__(self, server):
+        self.server = server
+        self.mutex = threading.RLock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.queue = collections.deque()
+        self.currently_running = {}
+        self.task_counter = 0
+        self.flags = {}
+        self.pending_idle = False
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                message = self.server.conn.recv()
+            except (EOFError, OSError):
+                logging.info("Lost connection to the main process, exiting worker.")
+                os._exit(0)
+            kind = message[0]
+            if kind == "execute":
+                _, item, sockets_metadata = message
+                self.server.send_message(("accepted",))
+                with self.not_empty:
+                    self.server.sockets_metadata.update(sockets_metadata)
+                    self.queue.append(item)
+                    self.not_empty.notify()
+            elif kind == "interrupt":
+                prompt_id = message[1]
+                if prompt_id is None or prompt_id == self.server.last_prompt_id:
+                    nodes.interrupt_processing()
+            elif kind == "flags":
+                with self.not_empty:
+                    self.flags.update(message[1])
+                    self.not_empty.notify()
+
+    def get(self, timeout=None, affinity=None):
+        # The main process already chose the prompt, affinity is ignored
+        if self.pending_idle:
+            self.pending_idle = False
+            self.server.send_message(("idle",))
+        with self.not_empty:
+            while len(self.queue) == 0:
+                self.not_empty.wait(timeout=timeout)
+                if timeout is not None and len(self.queue) == 0:
+                    return None
+            item = self.queue.popleft()
+            i = self.task_counter
+            self.currently_running[i] = item
+            self.task_counter += 1
+            return (item, i)
+
+    def get_matching(self, key, value, limit):
+        # Prompts are only merged in the main process queue
+        return []
+
+    def task_done(self, item_id, history_result, status, process_item=None):
+        with self.mutex:
+            item = self.currently_running.pop(item_id)
+        if process_item is not None:
+            item = process_item(item)
+        self.server.send_message(("done", history_result, status, item))
+        self.pending_idle = True
+
+    def get_flags(self, reset=True):
+        with self.mutex:
+            if reset:
+                ret = self.flags
+                self.flags = {}
+                return ret
+            else:
+                return self.flags.copy()
+
+
+def connect_worker(address):
+    """Connects a worker process to the main process, returns the WorkerServer and WorkerQueue to run prompt_worker with."""
+    host, port = address.rsplit(":", 1)
+    authkey = bytes.fromhex(os.environ[WORKER_AUTHKEY_ENV])
+    conn = Client((host, int(port)), authkey=authkey)
+    server = WorkerServer(conn)
+    queue = WorkerQueue(server)
+    server.prompt_queue = queue
+    return server, queue
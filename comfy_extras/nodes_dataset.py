@@ -1,45 +1,128 @@
 import logging
+import math
 import os
 import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+import psutil
 import torch
 from PIL import Image
 from typing_extensions import override
 
+import comfy.utils
 import folder_paths
+from comfy.cli_args import args
 import node_helpers
 from comfy_api.latest import ComfyExtension, io
 
 
-def load_and_process_images(image_files, input_dir):
+# With --cache-ram, decoded images are kept as uint8 arrays up to this many bytes, so loading the
+# same folder again only decodes the files that changed. The cache is emptied once the available RAM
+# drops below the --cache-ram headroom.
+DECODED_CACHE_BYTES = 512 * 1024 * 1024
+_decoded_cache = OrderedDict()  # (path, mtime_ns, size, shorter_edge, center_crop) -> np.ndarray
+_decoded_cache_bytes = 0
+_decoded_cache_lock = threading.Lock()
+
+
+def _decode_image(image_path, shorter_edge=0, center_crop=False):
+    """Decodes an image file to an RGB uint8 array, optionally resized so the shorter edge is
+    shorter_edge long and center cropped to a square."""
+    st = os.stat(image_path)
+    key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size, shorter_edge, center_crop)
+    if args.cache_ram > 0:
+        with _decoded_cache_lock:
+            cached = _decoded_cache.get(key, None)
+            if cached is not None:
+                _decoded_cache.move_to_end(key)
+                return cached
+
+    img = node_helpers.pillow(Image.open, image_path)
+    if shorter_edge > 0:
+        # Lets JPEG decode at a reduced scale that is still at least the target size
+        scale = shorter_edge / min(img.size)
+        if scale < 1:
+            img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+
+    if img.mode == "I":
+        img = img.point(lambda i: i * (1 / 255))
+    img = img.convert("RGB")
+
+    if shorter_edge > 0:
+        w, h = img.size
+        if w < h:
+            new_w, new_h = shorter_edge, int(h * (shorter_edge / w))
+        else:
+            new_w, new_h = int(w * (shorter_edge / h)), shorter_edge
+        if (new_w, new_h) != (w, h):
+            img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+        if center_crop:
+            left = (img.width - shorter_edge) // 2
+            top = (img.height - shorter_edge) // 2
+            img = img.crop((left, top, left + shorter_edge, top + shorter_edge))
+    decoded = np.array(img)
+    if args.cache_ram > 0:
+        _cache_decoded(key, decoded)
+    return decoded
+
+
+def _cache_decoded(key, decoded):
+    global _decoded_cache_bytes
+    with _decoded_cache_lock:
+        if psutil.virtual_memory().available / (1024**3) < args.cache_ram:
+            _decoded_cache.clear()
+            _decoded_cache_bytes = 0
+            return
+        if key not in _decoded_cache and decoded.nbytes <= DECODED_CACHE_BYTES:
+            _decoded_cache[key] = decoded
+            _decoded_cache_bytes += decoded.nbytes
+            while _decoded_cache_bytes > DECODED_CACHE_BYTES:
+                _, evicted = _decoded_cache.popitem(last=False)
+                _decoded_cache_bytes -= evicted.nbytes
+
+
+def load_and_process_images(image_files, input_dir, shorter_edge=0, center_crop=False):
     """Utility function to load and process a list of images.
 
     Args:
         image_files: List of image filenames
         input_dir: Base directory containing the images
-        resize_method: How to handle images of different sizes ("None", "Stretch", "Crop", "Pad")
+        shorter_edge: Resize the images so the shorter edge has this length while decoding, 0 keeps the original size
+        center_crop: Center crop the resized images to a square
 
     Returns:
-        torch.Tensor: Batch of processed images
+        list[torch.Tensor]: One [1, H, W, 3] tensor per image
     """
     if not image_files:
         raise ValueError("No valid images found in input")
 
-    output_images = []
-
-    for file in image_files:
-        image_path = os.path.join(input_dir, file)
-        img = node_helpers.pillow(Image.open, image_path)
+    # PIL releases the GIL while decoding, the images are decoded on a pool of threads
+    paths = [os.path.join(input_dir, file) for file in image_files]
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="dataset_decode") as pool:
+        decoded = pool.map(lambda path: _decode_image(path, shorter_edge, center_crop), paths)
+        return [torch.from_numpy(img.astype(np.float32) / 255.0)[None,] for img in decoded]
 
-        if img.mode == "I":
-            img = img.point(lambda i: i * (1 / 255))
-        img = img.convert("RGB")
-        img_array = np.array(img).astype(np.float32) / 255.0
-        img_tensor = torch.from_numpy(img_array)[None,]
-        output_images.append(img_tensor)
 
-    return output_images
+def _load_options_inputs():
+    return [
+        io.Int.Input(
+            "shorter_edge",
+            default=0,
+            min=0,
+            max=8192,
+            optional=True,
+            tooltip="Resize the images so the shorter edge has this length while loading, 0 keeps the original size.",
+        ),
+        io.Boolean.Input(
+            "center_crop",
+            default=False,
+            optional=True,
+            tooltip="Center crop the resized images to a square, needs shorter_edge.",
+        ),
+    ]
 
 
 class LoadImageDataSetFromFolderNode(io.ComfyNode):
@@ -55,7 +138,8 @@ class LoadImageDataSetFromFolderNode(io.ComfyNode):
                     "folder",
                     options=folder_paths.get_input_subfolders(),
                     tooltip="The folder to load images from.",
-                )
+                ),
+                *_load_options_inputs(),
             ],
             outputs=[
                 io.Image.Output(
@@ -67,7 +151,7 @@ class LoadImageDataSetFromFolderNode(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, folder):
+    def execute(cls, folder, shorter_edge=0, center_crop=False):
         sub_input_dir = os.path.join(folder_paths.get_input_directory(), folder)
         valid_extensions = [".png", ".jpg", ".jpeg", ".webp"]
         image_files = [
@@ -75,7 +159,7 @@ class LoadImageDataSetFromFolderNode(io.ComfyNode):
             for f in os.listdir(sub_input_dir)
             if any(f.lower().endswith(ext) for ext in valid_extensions)
         ]
-        output_tensor = load_and_process_images(image_files, sub_input_dir)
+        output_tensor = load_and_process_images(image_files, sub_input_dir, shorter_edge, center_crop)
         return io.NodeOutput(output_tensor)
 
 
@@ -92,7 +176,8 @@ class LoadImageTextDataSetFromFolderNode(io.ComfyNode):
                     "folder",
                     options=folder_paths.get_input_subfolders(),
                     tooltip="The folder to load images from.",
-                )
+                ),
+                *_load_options_inputs(),
             ],
             outputs=[
                 io.Image.Output(
@@ -109,7 +194,7 @@ class LoadImageTextDataSetFromFolderNode(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, folder):
+    def execute(cls, folder, shorter_edge=0, center_crop=False):
         logging.info(f"Loading images from folder: {folder}")
 
         sub_input_dir = os.path.join(folder_paths.get_input_directory(), folder)
@@ -147,7 +232,7 @@ class LoadImageTextDataSetFromFolderNode(io.ComfyNode):
             else:
                 captions.append("")
 
-        output_tensor = load_and_process_images(image_files, sub_input_dir)
+        output_tensor = load_and_process_images(image_files, sub_input_dir, shorter_edge, center_crop)
 
         logging.info(f"Loaded {len(output_tensor)} images from {sub_input_dir}.")
         return io.NodeOutput(output_tensor, captions)
@@ -947,6 +1032,100 @@ class StripWhitespaceNode(TextProcessingNode):
 # ========== Group Processing Example Nodes ==========
 
 
+# Images are hashed in batches of about this many pixel values
+HASH_BATCH_ELEMENTS = 1 << 24
+# Below this distance duplicates are looked up in a multi-index hash table, above it every
+# kept hash is compared, most images are duplicates of few kept ones at such thresholds anyway
+MULTI_INDEX_MAX_DISTANCE = 8
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_GRAY_WEIGHTS = torch.tensor([0.299, 0.587, 0.114])
+# Bit values of the 64 hash bits as int64, the top bit wraps to the sign
+_HASH_BIT_VALUES = torch.tensor([1 << b for b in range(63)] + [-(1 << 63)], dtype=torch.int64)
+
+
+def average_hashes(images):
+    """Perceptual average hashes of a list of image tensors as a uint64 array.
+
+    Each image is shrunk to 8x8 grayscale and every pixel above the mean sets a bit. Images of
+    the same size are hashed together in batches on the device they are on.
+    """
+    hashes = np.zeros(len(images), dtype=np.uint64)
+    by_shape = {}
+    for i, img in enumerate(images):
+        if img.dim() == 4 and img.shape[0] == 1:
+            img = img[0]
+        by_shape.setdefault(tuple(img.shape), []).append(i)
+
+    for shape, indices in by_shape.items():
+        batch_size = max(1, HASH_BATCH_ELEMENTS // max(1, np.prod(shape)))
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            batch = torch.stack([images[i].reshape(shape) for i in chunk]).float()
+            # Shrinking and the grayscale conversion are both linear, shrink the channels last
+            # batch first so the conversion only touches 8x8 pixels
+            small = torch.nn.functional.adaptive_avg_pool2d(batch.movedim(-1, 1), (8, 8))
+            if shape[-1] >= 3:
+                small = small[:, :3].movedim(1, -1) @ _GRAY_WEIGHTS.to(small.device)
+            else:
+                small = small[:, 0]
+            small = small.reshape(len(chunk), 64)
+            bits = small > small.mean(dim=1, keepdim=True)
+            packed = (bits.to(torch.int64) * _HASH_BIT_VALUES.to(bits.device)).sum(dim=1)
+            hashes[chunk] = packed.cpu().numpy().view(np.uint64)
+    return hashes
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[np.ascontiguousarray(values).view(np.uint8)].reshape(len(values), 8).sum(axis=1)
+
+
+def deduplicate_hashes(hashes, max_distance):
+    """Greedily keeps the hashes that are more than max_distance bits away from every kept one.
+
+    Returns the kept indices and a list of (index, kept index, distance) of the duplicates.
+    """
+    keep_indices = []
+    duplicates = []
+    if max_distance < MULTI_INDEX_MAX_DISTANCE:
+        # Split the 64 bits in max_distance + 1 parts, a hash within max_distance of another
+        # shares at least one of them exactly
+        parts = max_distance + 1
+        bounds = [64 * k // parts for k in range(parts + 1)]
+        masks = [(bounds[k], (1 << (bounds[k + 1] - bounds[k])) - 1) for k in range(parts)]
+        tables = [{} for _ in range(parts)]
+        values = hashes.tolist()
+        for i, h in enumerate(values):
+            match = None
+            keys = [(h >> shift) & mask for shift, mask in masks]
+            for table, key in zip(tables, keys):
+                for j in table.get(key, ()):
+                    distance = (h ^ values[j]).bit_count()
+                    if distance <= max_distance and (match is None or j < match[0]):
+                        match = (j, distance)
+            if match is not None:
+                duplicates.append((i, match[0], match[1]))
+                continue
+            keep_indices.append(i)
+            for table, key in zip(tables, keys):
+                table.setdefault(key, []).append(i)
+        return keep_indices, duplicates
+
+    kept = np.empty(len(hashes), dtype=np.uint64)
+    for i in range(len(hashes)):
+        if keep_indices:
+            distances = _popcount(kept[:len(keep_indices)] ^ hashes[i])
+            hits = np.flatnonzero(distances <= max_distance)
+            if hits.size:
+                duplicates.append((i, keep_indices[hits[0]], int(distances[hits[0]])))
+                continue
+        kept[len(keep_indices)] = hashes[i]
+        keep_indices.append(i)
+    return keep_indices, duplicates
+
+
 class ImageDeduplicationNode(ImageProcessingNode):
     """Remove duplicate or very similar images from the dataset using perceptual hashing."""
 
@@ -970,44 +1149,13 @@ class ImageDeduplicationNode(ImageProcessingNode):
         if len(images) == 0:
             return []
 
-        # Compute simple perceptual hash for each image
-        def compute_hash(img_tensor):
-            """Compute a simple perceptual hash by resizing to 8x8 and comparing to average."""
-            img = tensor_to_pil(img_tensor)
-            # Resize to 8x8
-            img_small = img.resize((8, 8), Image.Resampling.LANCZOS).convert("L")
-            # Get pixels
-            pixels = list(img_small.getdata())
-            # Compute average
-            avg = sum(pixels) / len(pixels)
-            # Create hash (1 if above average, 0 otherwise)
-            hash_bits = "".join("1" if p > avg else "0" for p in pixels)
-            return hash_bits
-
-        def hamming_distance(hash1, hash2):
-            """Compute Hamming distance between two hash strings."""
-            return sum(c1 != c2 for c1, c2 in zip(hash1, hash2))
-
-        # Compute hashes for all images
-        hashes = [compute_hash(img) for img in images]
-
-        # Find duplicates
-        keep_indices = []
-        for i in range(len(images)):
-            is_duplicate = False
-            for j in keep_indices:
-                # Compare hashes
-                distance = hamming_distance(hashes[i], hashes[j])
-                similarity = 1.0 - (distance / 64.0)  # 64 bits total
-                if similarity >= similarity_threshold:
-                    is_duplicate = True
-                    logging.info(
-                        f"Image {i} is similar to image {j} (similarity: {similarity:.3f}), skipping"
-                    )
-                    break
-
-            if not is_duplicate:
-                keep_indices.append(i)
+        # Largest Hamming distance that still counts as similar, 64 bits total
+        max_distance = max(d for d in range(65) if 1.0 - (d / 64.0) >= similarity_threshold)
+        keep_indices, duplicates = deduplicate_hashes(average_hashes(images), max_distance)
+        for i, j, distance in duplicates:
+            logging.debug(
+                f"Image {i} is similar to image {j} (similarity: {1.0 - distance / 64.0:.3f}), skipping"
+            )
 
         # Return only unique images
         unique_images = [images[i] for i in keep_indices]
@@ -1307,6 +1455,32 @@ class MakeTrainingDataset(io.ComfyNode):
         return io.NodeOutput(latents_list, conditioning_list)
 
 
+def _pack_tensors(value, key, tensors):
+    """Turns a latent dict or conditioning into a JSON serializable structure, its tensors are put in tensors under keys starting with key."""
+    if isinstance(value, torch.Tensor):
+        # Copy, safetensors refuses tensors that share storage like the slices of a batch
+        tensors[key] = value.detach().to("cpu", copy=True).contiguous()
+        return {"tensor": key}
+    if isinstance(value, dict):
+        return {"dict": {k: _pack_tensors(v, f"{key}.{k}", tensors) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"list": [_pack_tensors(v, f"{key}.{i}", tensors) for i, v in enumerate(value)]}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {"value": value}
+    raise ValueError(f"Can't save {key} of type {type(value).__name__} in a training dataset.")
+
+
+def _unpack_tensors(packed, tensors):
+    """Inverse of _pack_tensors."""
+    if "tensor" in packed:
+        return tensors[packed["tensor"]]
+    if "dict" in packed:
+        return {k: _unpack_tensors(v, tensors) for k, v in packed["dict"].items()}
+    if "list" in packed:
+        return [_unpack_tensors(v, tensors) for v in packed["list"]]
+    return packed["value"]
+
+
 class SaveTrainingDataset(io.ComfyNode):
     """Save encoded training dataset (latents + conditioning) to disk."""
     @classmethod
@@ -1372,23 +1546,27 @@ class SaveTrainingDataset(io.ComfyNode):
             f"Saving {num_samples} samples to {num_shards} shards in {output_dir}..."
         )
 
-        # Save data in shards
+        # Save data in safetensors shards, the index in metadata.json describes the samples in them
+        shard_files = []
+        samples = []
         for shard_idx in range(num_shards):
             start_idx = shard_idx * shard_size
             end_idx = min(start_idx + shard_size, num_samples)
 
-            # Get shard data (list of latent dicts and conditioning lists)
-            shard_data = {
-                "latents": latents[start_idx:end_idx],
-                "conditioning": conditioning[start_idx:end_idx],
-            }
-
-            # Save shard
-            shard_filename = f"shard_{shard_idx:04d}.pkl"
-            shard_path = os.path.join(output_dir, shard_filename)
-
-            with open(shard_path, "wb") as f:
-                torch.save(shard_data, f)
+            tensors = {}
+            for i in range(start_idx, end_idx):
+                shape = list(latents[i]["samples"].shape)
+                samples.append({
+                    "shard": shard_idx,
+                    "shape": shape,
+                    "bucket": shape[-2:],
+                    "latent": _pack_tensors(latents[i], f"{i}.latent", tensors),
+                    "conditioning": _pack_tensors(conditioning[i], f"{i}.conditioning", tensors),
+                })
+
+            shard_filename = f"shard_{shard_idx:04d}.safetensors"
+            comfy.utils.save_torch_file(tensors, os.path.join(output_dir, shard_filename))
+            shard_files.append(shard_filename)
 
             logging.info(
                 f"Saved shard {shard_idx + 1}/{num_shards}: {shard_filename} ({end_idx - start_idx} samples)"
@@ -1396,13 +1574,16 @@ class SaveTrainingDataset(io.ComfyNode):
 
         # Save metadata
         metadata = {
+            "format": "safetensors",
             "num_samples": num_samples,
             "num_shards": num_shards,
             "shard_size": shard_size,
+            "shards": shard_files,
+            "samples": samples,
         }
         metadata_path = os.path.join(output_dir, "metadata.json")
         with open(metadata_path, "w") as f:
-            json.dump(metadata, f, indent=2)
+            json.dump(metadata, f)
 
         logging.info(f"Successfully saved {num_samples} samples to {output_dir}.")
         return io.NodeOutput()
@@ -1447,7 +1628,15 @@ class LoadTrainingDataset(io.ComfyNode):
         if not os.path.exists(dataset_dir):
             raise ValueError(f"Dataset directory not found: {dataset_dir}")
 
-        # Find all shard files
+        metadata_path = os.path.join(dataset_dir, "metadata.json")
+        metadata = {}
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r") as f:
+                metadata = json.load(f)
+        if metadata.get("format") == "safetensors":
+            return io.NodeOutput(*cls.load_safetensors_shards(dataset_dir, metadata))
+
+        # Datasets saved before the safetensors format are pickled shards
         shard_files = sorted(
             [
                 f
@@ -1481,6 +1670,32 @@ class LoadTrainingDataset(io.ComfyNode):
         )
         return io.NodeOutput(all_latents, all_conditioning)
 
+    @staticmethod
+    def load_safetensors_shards(dataset_dir, metadata):
+        """
+        Memory maps the shards, the returned tensors are only read from disk when they are used so
+        a dataset larger than RAM can be loaded right away.
+        """
+        shard_tensors = []
+        for shard_file in metadata["shards"]:
+            shard_path = os.path.join(dataset_dir, shard_file)
+            if not os.path.exists(shard_path):
+                raise ValueError(f"Shard file not found: {shard_path}")
+            tensors, _ = comfy.utils.load_safetensors(shard_path)
+            shard_tensors.append(tensors)
+
+        all_latents = []  # list[{"samples": tensor}]
+        all_conditioning = []  # list[list[cond]]
+        for sample in metadata["samples"]:
+            tensors = shard_tensors[sample["shard"]]
+            all_latents.append(_unpack_tensors(sample["latent"], tensors))
+            all_conditioning.append(_unpack_tensors(sample["conditioning"], tensors))
+
+        logging.info(
+            f"Memory mapped {len(all_latents)} samples from {len(shard_tensors)} shards in {dataset_dir}."
+        )
+        return all_latents, all_conditioning
+
 
 # ========== Extension Setup ==========
 
@@ -0,0 +1,154 @@
+import torch
+from typing_extensions import override
+
+import comfy.conds
+import nodes
+from comfy_api.latest import ComfyExtension, io
+from comfy_execution.utils import get_executing_context
+
+
+def stack_conditioning_batches(conditioning_a, conditioning_b):
+    if len(conditioning_a) != len(conditioning_b):
+        raise ValueError("Can't stack conditioning with a different number of entries: {} and {}".format(len(conditioning_a), len(conditioning_b)))
+
+    out = []
+    for (cond_a, options_a), (cond_b, options_b) in zip(conditioning_a, conditioning_b):
+        cond = comfy.conds.CONDCrossAttn(cond_a).concat([comfy.conds.CONDCrossAttn(cond_b)])
+        options = {}
+        for k in options_a.keys() | options_b.keys():
+            a = options_a.get(k, None)
+            b = options_b.get(k, None)
+            if torch.is_tensor(a) and torch.is_tensor(b) and a.shape[1:] == b.shape[1:]:
+                options[k] = torch.cat((a, b))
+            elif a is b or (not torch.is_tensor(a) and not torch.is_tensor(b) and a == b):
+                options[k] = a
+            else:
+                raise ValueError("Can't stack the conditioning option {} into one batch".format(k))
+        out.append([cond, options])
+    return out
+
+
+def save_member_images(saver, images, filename_prefix, prompt, extra_pnginfo):
+    """
+    Saves the images of a merged prompt with the metadata of the prompt each of them belongs to.
+    Returns the ui output with the [start, end) range of the images of every prompt in prompt_slices.
+    """
+    from comfy_execution.batching import batch_members
+    context = get_executing_context()
+    members = batch_members.get(context.prompt_id, None) if context is not None else None
+    if members is None:
+        return {"images": saver.save_images(images, filename_prefix, prompt, extra_pnginfo)["ui"]["images"]}
+    if len(images) % len(members) != 0:
+        # Can't tell which prompt an image belongs to, every prompt gets all of them
+        results = saver.save_images(images, filename_prefix, prompt, extra_pnginfo)["ui"]["images"]
+        return {"images": results, "prompt_slices": [[0, len(results)] for _ in members]}
+
+    step = len(images) // len(members)
+    results = []
+    slices = []
+    for i, (member_prompt, member_extra_pnginfo) in enumerate(members):
+        start = len(results)
+        results += saver.save_images(images[i * step:(i + 1) * step], filename_prefix, member_prompt, member_extra_pnginfo)["ui"]["images"]
+        slices.append([start, len(results)])
+    return {"images": results, "prompt_slices": slices}
+
+
+class PromptBatchStackConditioning(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        return io.Schema(
+            node_id="PromptBatchStackConditioning",
+            category="_for_testing/conditioning",
+            description="Stacks two conditionings along the batch dimension so every latent in a batch gets its own conditioning. Used when queued prompts are merged with --batch-prompts.",
+            inputs=[
+                io.Conditioning.Input("conditioning_a"),
+                io.Conditioning.Input("conditioning_b"),
+            ],
+            outputs=[io.Conditioning.Output()],
+            is_dev_only=True,
+        )
+
+    @classmethod
+    def execute(cls, conditioning_a, conditioning_b) -> io.NodeOutput:
+        return io.NodeOutput(stack_conditioning_batches(conditioning_a, conditioning_b))
+
+
+class PromptBatchSeeds(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        return io.Schema(
+            node_id="PromptBatchSeeds",
+            category="_for_testing/latent",
+            description="Sets one noise seed for each latent in the batch. Used when queued prompts are merged with --batch-prompts.",
+            inputs=[
+                io.Latent.Input("samples"),
+                io.String.Input("seeds", tooltip="Comma separated seeds, one for each latent in the batch."),
+            ],
+            outputs=[io.Latent.Output()],
+            is_dev_only=True,
+        )
+
+    @classmethod
+    def execute(cls, samples, seeds) -> io.NodeOutput:
+        seeds = [int(s) for s in seeds.split(",")]
+        if len(seeds) != samples["samples"].shape[0]:
+            raise ValueError("Got {} seeds for a batch of {} latents".format(len(seeds), samples["samples"].shape[0]))
+        s = samples.copy()
+        s["batch_seeds"] = seeds
+        return io.NodeOutput(s)
+
+
+class PromptBatchSaveImage(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        return io.Schema(
+            node_id="PromptBatchSaveImage",
+            category="_for_testing/image",
+            description="Saves the images of merged prompts, each with the metadata of its own prompt. Used when queued prompts are merged with --batch-prompts.",
+            inputs=[
+                io.Image.Input("images"),
+                io.String.Input("filename_prefix", default="ComfyUI"),
+            ],
+            hidden=[io.Hidden.prompt, io.Hidden.extra_pnginfo],
+            is_output_node=True,
+            is_dev_only=True,
+        )
+
+    @classmethod
+    def execute(cls, images, filename_prefix) -> io.NodeOutput:
+        return io.NodeOutput(ui=save_member_images(nodes.SaveImage(), images, filename_prefix, cls.hidden.prompt, cls.hidden.extra_pnginfo))
+
+
+class PromptBatchPreviewImage(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        return io.Schema(
+            node_id="PromptBatchPreviewImage",
+            category="_for_testing/image",
+            description="Previews the images of merged prompts, each with the metadata of its own prompt. Used when queued prompts are merged with --batch-prompts.",
+            inputs=[
+                io.Image.Input("images"),
+            ],
+            hidden=[io.Hidden.prompt, io.Hidden.extra_pnginfo],
+            is_output_node=True,
+            is_dev_only=True,
+        )
+
+    @classmethod
+    def execute(cls, images) -> io.NodeOutput:
+        return io.NodeOutput(ui=save_member_images(nodes.PreviewImage(), images, "ComfyUI", cls.hidden.prompt, cls.hidden.extra_pnginfo))
+
+
+class PromptBatchingExtension(ComfyExtension):
+    @override
+    async def get_node_list(self) -> list[type[io.ComfyNode]]:
+        return [
+            PromptBatchStackConditioning,
+            PromptBatchSeeds,
+            PromptBatchSaveImage,
+            PromptBatchPreviewImage,
+        ]
+
+
+async def comfy_entrypoint() -> PromptBatchingExtension:
+    return PromptBatchingExtension()
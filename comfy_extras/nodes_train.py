@@ -1,5 +1,6 @@
 import logging
 import os
+import time
 
 import numpy as np
 import safetensors
@@ -130,6 +131,12 @@ class TrainSampler(comfy.samplers.Sampler):
         training_dtype=torch.bfloat16,
         real_dataset=None,
         bucket_latents=None,
+        start_step=0,
+        rng_state=None,
+        checkpoint_every=0,
+        checkpoint_callback=None,
+        micro_batch_size=0,
+        metrics_callback=None,
     ):
         self.loss_fn = loss_fn
         self.optimizer = optimizer
@@ -151,6 +158,20 @@ class TrainSampler(comfy.samplers.Sampler):
             self.bucket_offsets = None
             self.bucket_weights = None
             self.num_images = None
+        # Resuming from a checkpoint: the step to continue at and the RNG state saved with it
+        self.start_step = start_step
+        self.rng_state = rng_state
+        # checkpoint_callback(step) is called every checkpoint_every optimizer steps and at the end
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_callback = checkpoint_callback
+        # Batches are run in micro batches of at most this many samples whose gradients add up,
+        # 0 sizes them to the free memory and shrinks them when running out of memory
+        self.micro_batch_size = micro_batch_size
+        self.auto_micro_batch = micro_batch_size == 0
+        self.measure_micro_batch = False
+        # metrics_callback(step, metrics) gets the throughput of every optimizer step
+        self.metrics_callback = metrics_callback
+        self.throughput = {}
 
     def _init_bucket_data(self, bucket_latents):
         """Initialize bucket offsets and weights for sampling."""
@@ -174,6 +195,7 @@ class TrainSampler(comfy.samplers.Sampler):
         extra_args,
         dataset_size,
         bwd=True,
+        scale=1.0,
     ):
         xt = model_wrap.inner_model.model_sampling.noise_scaling(
             batch_sigmas, batch_noise, batch_latent, False
@@ -198,10 +220,82 @@ class TrainSampler(comfy.samplers.Sampler):
             )
             loss = self.loss_fn(x0_pred, x0)
         if bwd:
-            bwd_loss = loss / self.grad_acc
+            bwd_loss = loss * scale / self.grad_acc
             bwd_loss.backward()
         return loss
 
+    def _fwd_bwd_micro_batches(
+        self,
+        model_wrap,
+        batch_sigmas,
+        batch_noise,
+        batch_latent,
+        cond,
+        indicies,
+        extra_args,
+        dataset_size,
+    ):
+        """Runs fwd_bwd on micro batches of the batch, the accumulated gradients and the returned
+        loss are the ones of the whole batch."""
+        total = len(indicies)
+        while True:
+            size = min(self.micro_batch_size, total)
+            grads = self._save_grads() if self.auto_micro_batch and size > 1 else None
+            device = batch_latent.device
+            measure = self.measure_micro_batch and device.type == "cuda"
+            if measure:
+                torch.cuda.reset_peak_memory_stats(device)
+                memory_before = torch.cuda.memory_allocated(device)
+            try:
+                loss = 0.0
+                for start in range(0, total, size):
+                    end = min(start + size, total)
+                    micro_loss = self.fwd_bwd(
+                        model_wrap,
+                        batch_sigmas[start:end],
+                        batch_noise[start:end],
+                        batch_latent[start:end],
+                        cond,
+                        indicies[start:end],
+                        extra_args,
+                        dataset_size,
+                        bwd=True,
+                        scale=(end - start) / total,
+                    )
+                    loss = loss + micro_loss.detach() * ((end - start) / total)
+            except comfy.model_management.OOM_EXCEPTION:
+                if not self.auto_micro_batch or size == 1:
+                    raise
+                self._restore_grads(grads)
+                self.micro_batch_size = max(1, size // 2)
+                self.measure_micro_batch = False
+                logging.warning(f"Out of memory in micro batches of {size} samples, retrying with {self.micro_batch_size}.")
+                comfy.model_management.soft_empty_cache()
+                continue
+            if measure:
+                used_per_sample = (torch.cuda.max_memory_allocated(device) - memory_before) / size
+                self._fit_micro_batch_size(device, used_per_sample)
+            return loss
+
+    def _fit_micro_batch_size(self, device, used_per_sample):
+        """Picks the largest micro batch that fits the free memory, measured with one sample."""
+        free_memory = comfy.model_management.get_free_memory(device)
+        fits = int(free_memory * 0.9 / max(used_per_sample, 1))
+        self.micro_batch_size = max(1, min(self.batch_size, fits))
+        self.measure_micro_batch = False
+        logging.info(f"Training in micro batches of {self.micro_batch_size} samples.")
+
+    def _save_grads(self):
+        return [
+            [None if param.grad is None else param.grad.clone() for param in group["params"]]
+            for group in self.optimizer.param_groups
+        ]
+
+    def _restore_grads(self, grads):
+        for group, group_grads in zip(self.optimizer.param_groups, grads):
+            for param, grad in zip(group["params"], group_grads):
+                param.grad = grad
+
     def _generate_batch_sigmas(self, model_wrap, batch_size, device):
         """Generate random sigma values for a batch."""
         batch_sigmas = [
@@ -232,7 +326,7 @@ class TrainSampler(comfy.samplers.Sampler):
         )
         batch_sigmas = self._generate_batch_sigmas(model_wrap, actual_batch_size, batch_latent.device)
 
-        loss = self.fwd_bwd(
+        loss = self._fwd_bwd_micro_batches(
             model_wrap,
             batch_sigmas,
             batch_noise,
@@ -241,11 +335,11 @@ class TrainSampler(comfy.samplers.Sampler):
             absolute_indices,
             extra_args,
             self.num_images,
-            bwd=True,
         )
         if self.loss_callback:
             self.loss_callback(loss.item())
-        pbar.set_postfix({"loss": f"{loss.item():.4f}", "bucket": bucket_idx})
+        pbar.set_postfix({"loss": f"{loss.item():.4f}", "bucket": bucket_idx, **self.throughput})
+        return actual_batch_size, actual_batch_size * batch_latent[0, 0].numel()
 
     def _train_step_standard_mode(self, model_wrap, cond, extra_args, noisegen, latent_image, dataset_size, pbar):
         """Execute one training step in standard (non-bucket, non-multi-res) mode."""
@@ -256,7 +350,7 @@ class TrainSampler(comfy.samplers.Sampler):
         )
         batch_sigmas = self._generate_batch_sigmas(model_wrap, min(self.batch_size, dataset_size), batch_latent.device)
 
-        loss = self.fwd_bwd(
+        loss = self._fwd_bwd_micro_batches(
             model_wrap,
             batch_sigmas,
             batch_noise,
@@ -265,16 +359,17 @@ class TrainSampler(comfy.samplers.Sampler):
             indicies,
             extra_args,
             dataset_size,
-            bwd=True,
         )
         if self.loss_callback:
             self.loss_callback(loss.item())
-        pbar.set_postfix({"loss": f"{loss.item():.4f}"})
+        pbar.set_postfix({"loss": f"{loss.item():.4f}", **self.throughput})
+        return len(indicies), len(indicies) * batch_latent[0, 0].numel()
 
     def _train_step_multires_mode(self, model_wrap, cond, extra_args, noisegen, latent_image, dataset_size, pbar):
         """Execute one training step in multi-resolution mode (real_dataset is set)."""
         indicies = torch.randperm(dataset_size)[: self.batch_size].tolist()
         total_loss = 0
+        tokens = 0
         for index in indicies:
             single_latent = self.real_dataset[index].to(latent_image)
             batch_noise = noisegen.generate_noise(
@@ -298,11 +393,13 @@ class TrainSampler(comfy.samplers.Sampler):
                 bwd=False,
             )
             total_loss += loss
+            tokens += single_latent[0, 0].numel()
         total_loss = total_loss / self.grad_acc / len(indicies)
         total_loss.backward()
         if self.loss_callback:
             self.loss_callback(total_loss.item())
-        pbar.set_postfix({"loss": f"{total_loss.item():.4f}"})
+        pbar.set_postfix({"loss": f"{total_loss.item():.4f}", **self.throughput})
+        return len(indicies), tokens
 
     def sample(
         self,
@@ -320,8 +417,20 @@ class TrainSampler(comfy.samplers.Sampler):
         dataset_size = sigmas.size(0)
         torch.cuda.empty_cache()
         ui_pbar = ProgressBar(self.total_steps)
+        if self.start_step > 0:
+            ui_pbar.update_absolute(self.start_step)
+        if self.rng_state is not None:
+            set_rng_state(self.rng_state)
+        if self.micro_batch_size == 0:
+            # Measure the memory one sample takes to size the micro batches on CUDA
+            self.micro_batch_size = 1 if latent_image.device.type == "cuda" else self.batch_size
+            self.measure_micro_batch = latent_image.device.type == "cuda"
+        step_samples = 0
+        step_tokens = 0
+        step_start = time.perf_counter()
         for i in (
             pbar := trange(
+                self.start_step,
                 self.total_steps,
                 desc="Training LoRA",
                 smoothing=0.01,
@@ -333,11 +442,13 @@ class TrainSampler(comfy.samplers.Sampler):
             )
 
             if self.bucket_latents is not None:
-                self._train_step_bucket_mode(model_wrap, cond, extra_args, noisegen, latent_image, pbar)
+                samples, tokens = self._train_step_bucket_mode(model_wrap, cond, extra_args, noisegen, latent_image, pbar)
             elif self.real_dataset is None:
-                self._train_step_standard_mode(model_wrap, cond, extra_args, noisegen, latent_image, dataset_size, pbar)
+                samples, tokens = self._train_step_standard_mode(model_wrap, cond, extra_args, noisegen, latent_image, dataset_size, pbar)
             else:
-                self._train_step_multires_mode(model_wrap, cond, extra_args, noisegen, latent_image, dataset_size, pbar)
+                samples, tokens = self._train_step_multires_mode(model_wrap, cond, extra_args, noisegen, latent_image, dataset_size, pbar)
+            step_samples += samples
+            step_tokens += tokens
 
             if (i + 1) % self.grad_acc == 0:
                 for param_groups in self.optimizer.param_groups:
@@ -347,6 +458,21 @@ class TrainSampler(comfy.samplers.Sampler):
                         param.grad.data = param.grad.data.to(param.data.dtype)
                 self.optimizer.step()
                 self.optimizer.zero_grad()
+                elapsed = max(time.perf_counter() - step_start, 1e-9)
+                metrics = {
+                    "samples_per_sec": step_samples / elapsed,
+                    "tokens_per_sec": step_tokens / elapsed,
+                    "micro_batch_size": min(self.micro_batch_size, self.batch_size),
+                }
+                self.throughput = {"samples/s": f"{metrics['samples_per_sec']:.2f}", "tokens/s": f"{metrics['tokens_per_sec']:.0f}"}
+                if self.metrics_callback is not None:
+                    self.metrics_callback((i + 1) // self.grad_acc, metrics)
+                step_samples = 0
+                step_tokens = 0
+                step_start = time.perf_counter()
+                if self.checkpoint_callback is not None and self.checkpoint_every > 0:
+                    if ((i + 1) // self.grad_acc) % self.checkpoint_every == 0 or i + 1 == self.total_steps:
+                        self.checkpoint_callback(i + 1)
             ui_pbar.update(1)
         torch.cuda.empty_cache()
         return torch.zeros_like(latent_image)
@@ -486,6 +612,29 @@ def _process_conditioning(positive):
     return flat_positive
 
 
+class _LazyCastList:
+    """Casts each latent when the sampler picks it, so latents loaded from a memory mapped dataset are only read from disk as they are used."""
+
+    def __init__(self, latents, dtype):
+        self.latents = latents
+        self.dtype = dtype
+
+    def __len__(self):
+        return len(self.latents)
+
+    def __getitem__(self, index):
+        latent = self.latents[index].to(self.dtype)
+        if latent is self.latents[index]:
+            # Never hand out the read only memory mapped tensor itself
+            latent = latent.clone()
+        return latent
+
+
+def _is_memory_mapped(tensor):
+    """Tensors memory mapped from a saved dataset are views of a buffer that can't be resized."""
+    return not tensor.untyped_storage().resizable()
+
+
 def _prepare_latents_and_count(latents, dtype, bucket_mode):
     """Convert latents to dtype and compute image counts.
 
@@ -512,18 +661,21 @@ def _prepare_latents_and_count(latents, dtype, bucket_mode):
     # Non-bucket mode
     if isinstance(latents, list):
         all_shapes = set()
-        latents = [t.to(dtype) for t in latents]
         for latent in latents:
             all_shapes.add(latent.shape)
         logging.debug(f"Latent shapes: {all_shapes}")
-        if len(all_shapes) > 1:
+        # Memory mapped datasets are read one sample at a time instead of concatenated in RAM
+        if len(all_shapes) > 1 or any(_is_memory_mapped(t) for t in latents):
             multi_res = True
+            latents = _LazyCastList(latents, dtype)
         else:
             multi_res = False
-            latents = torch.cat(latents, dim=0)
+            latents = torch.cat([t.to(dtype) for t in latents], dim=0)
         num_images = len(latents)
     elif isinstance(latents, torch.Tensor):
         latents = latents.to(dtype)
+        if _is_memory_mapped(latents):
+            latents = latents.clone()
         num_images = latents.shape[0]
         multi_res = False
     else:
@@ -793,6 +945,69 @@ def _create_loss_function(loss_function_name):
         return torch.nn.SmoothL1Loss()
 
 
+def get_rng_state():
+    return {
+        "cpu": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+    }
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["cpu"])
+    if torch.cuda.is_available() and len(state["cuda"]) == torch.cuda.device_count():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def _training_checkpoint_path(checkpoint_name):
+    """Path of the checkpoint file, inside output/training_checkpoints/<checkpoint_name>."""
+    base = os.path.abspath(os.path.join(folder_paths.get_output_directory(), "training_checkpoints"))
+    path = os.path.abspath(os.path.join(base, checkpoint_name, "checkpoint.pt"))
+    if os.path.commonpath((base, path)) != base:
+        raise ValueError(f"Invalid checkpoint name: {checkpoint_name}")
+    return path
+
+
+def _save_training_checkpoint(path, step, lora_sd, optimizer, loss, config):
+    """Saves everything needed to continue the training at step, replacing the previous checkpoint."""
+    state = {
+        "step": step,
+        "config": config,
+        "adapter": {k: v.detach().cpu() for k, v in lora_sd.items()},
+        "optimizer": optimizer.state_dict(),
+        "rng": get_rng_state(),
+        "loss": list(loss),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to it first so a crash while saving keeps the previous checkpoint
+    temp_path = path + ".tmp"
+    torch.save(state, temp_path)
+    os.replace(temp_path, path)
+    logging.info(f"Saved training checkpoint at step {step} to {path}")
+
+
+def _load_training_checkpoint(path, lora_sd, optimizer, config):
+    """Restores the adapter weights and optimizer state of a checkpoint.
+
+    Returns:
+        tuple: (step, rng_state, loss) to continue from, None if there is no checkpoint
+    """
+    if not os.path.exists(path):
+        return None
+    state = torch.load(path, map_location="cpu", weights_only=True)
+    changed = [k for k in config if state["config"].get(k) != config[k]]
+    if changed:
+        logging.warning(f"Resuming training with different settings than the checkpoint: {', '.join(changed)}")
+    missing = set(lora_sd.keys()) - set(state["adapter"].keys())
+    if missing:
+        raise ValueError(f"Training checkpoint {path} doesn't match the LoRA being trained, it lacks {len(missing)} weights.")
+    with torch.no_grad():
+        for k, v in lora_sd.items():
+            v.copy_(state["adapter"][k])
+    optimizer.load_state_dict(state["optimizer"])
+    logging.info(f"Resuming training from step {state['step']} of {path}")
+    return state["step"], state["rng"], state["loss"]
+
+
 def _run_training_loop(
     guider, train_sampler, latents, num_images, seed, bucket_mode, multi_res
 ):
@@ -952,6 +1167,34 @@ class TrainLoraNode(io.ComfyNode):
                     default=False,
                     tooltip="Enable bypass mode for training. When enabled, adapters are applied via forward hooks instead of weight modification. Useful for quantized models where weights cannot be directly modified.",
                 ),
+                io.Int.Input(
+                    "checkpoint_every",
+                    default=0,
+                    min=0,
+                    max=100000,
+                    optional=True,
+                    tooltip="Save a checkpoint to resume the training from every this many steps, 0 disables checkpoints.",
+                ),
+                io.String.Input(
+                    "checkpoint_name",
+                    default="lora_training",
+                    optional=True,
+                    tooltip="Name of the checkpoint folder inside output/training_checkpoints.",
+                ),
+                io.Boolean.Input(
+                    "resume",
+                    default=False,
+                    optional=True,
+                    tooltip="Continue the training from the last checkpoint in checkpoint_name, if there is one.",
+                ),
+                io.Int.Input(
+                    "micro_batch_size",
+                    default=0,
+                    min=0,
+                    max=10000,
+                    optional=True,
+                    tooltip="Run each batch in micro batches of this many samples and add up their gradients, to train large batches with less memory. 0 picks the size from the free memory.",
+                ),
             ],
             outputs=[
                 io.Custom("LORA_MODEL").Output(
@@ -962,6 +1205,7 @@ class TrainLoraNode(io.ComfyNode):
                 ),
                 io.Int.Output(display_name="steps", tooltip="Total training steps"),
             ],
+            hidden=[io.Hidden.unique_id],
         )
 
     @classmethod
@@ -985,6 +1229,10 @@ class TrainLoraNode(io.ComfyNode):
         existing_lora,
         bucket_mode,
         bypass_mode,
+        checkpoint_every=(0,),
+        checkpoint_name=("lora_training",),
+        resume=(False,),
+        micro_batch_size=(0,),
     ):
         # Extract scalars from lists (due to is_input_list=True)
         model = model[0]
@@ -1003,6 +1251,10 @@ class TrainLoraNode(io.ComfyNode):
         existing_lora = existing_lora[0]
         bucket_mode = bucket_mode[0]
         bypass_mode = bypass_mode[0]
+        checkpoint_every = checkpoint_every[0]
+        checkpoint_name = checkpoint_name[0]
+        resume = resume[0]
+        micro_batch_size = micro_batch_size[0]
 
         # Process latents based on mode
         if bucket_mode:
@@ -1073,6 +1325,46 @@ class TrainLoraNode(io.ComfyNode):
             def loss_callback(loss):
                 loss_map["loss"].append(loss)
 
+            # Setup checkpoints
+            checkpoint_path = None
+            if checkpoint_every > 0 or resume:
+                checkpoint_path = _training_checkpoint_path(checkpoint_name)
+            checkpoint_config = {
+                "num_images": num_images,
+                "batch_size": batch_size,
+                "grad_accumulation_steps": grad_accumulation_steps,
+                "learning_rate": learning_rate,
+                "rank": rank,
+                "optimizer": optimizer_name,
+                "seed": seed,
+                "algorithm": algorithm,
+            }
+            start_step, rng_state = 0, None
+            if resume:
+                restored = _load_training_checkpoint(checkpoint_path, lora_sd, optimizer, checkpoint_config)
+                if restored is None:
+                    logging.warning(f"No training checkpoint found at {checkpoint_path}, starting from the beginning.")
+                else:
+                    start_step, rng_state, loss_map["loss"] = restored
+
+            def checkpoint_callback(step, optimizer=optimizer):
+                _save_training_checkpoint(checkpoint_path, step, lora_sd, optimizer, loss_map["loss"], checkpoint_config)
+
+            # Report the throughput, at most once a second
+            last_report = [0.0]
+
+            def metrics_callback(step, metrics):
+                now = time.perf_counter()
+                if cls.hidden.unique_id is None or now - last_report[0] < 1.0:
+                    return
+                last_report[0] = now
+                from server import PromptServer
+                PromptServer.instance.send_progress_text(
+                    f"step {step}/{steps}: {metrics['samples_per_sec']:.2f} samples/s, {metrics['tokens_per_sec']:.0f} tokens/s\n"
+                    f"micro batch size: {metrics['micro_batch_size']}",
+                    cls.hidden.unique_id,
+                )
+
             # Create sampler
             if bucket_mode:
                 train_sampler = TrainSampler(
@@ -1085,6 +1377,12 @@ class TrainLoraNode(io.ComfyNode):
                     seed=seed,
                     training_dtype=dtype,
                     bucket_latents=latents,
+                    start_step=start_step,
+                    rng_state=rng_state,
+                    checkpoint_every=checkpoint_every,
+                    checkpoint_callback=checkpoint_callback,
+                    micro_batch_size=micro_batch_size,
+                    metrics_callback=metrics_callback,
                 )
             else:
                 train_sampler = TrainSampler(
@@ -1097,6 +1395,12 @@ class TrainLoraNode(io.ComfyNode):
                     seed=seed,
                     training_dtype=dtype,
                     real_dataset=latents if multi_res else None,
+                    start_step=start_step,
+                    rng_state=rng_state,
+                    checkpoint_every=checkpoint_every,
+                    checkpoint_callback=checkpoint_callback,
+                    micro_batch_size=micro_batch_size,
+                    metrics_callback=metrics_callback,
                 )
 
             # Setup guider
@@ -24,6 +24,7 @@ from comfy_execution.caching import (
     BasicCache,
     CacheKeySetID,
     CacheKeySetInputSignature,
+    DiskCache,
     NullCache,
     HierarchicalCache,
     LRUCache,
@@ -39,8 +40,10 @@ from comfy_execution.graph_utils import GraphBuilder, is_link
 from comfy_execution.validation import validate_node_input
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
 from comfy_execution.utils import CurrentNodeContext
+from comfy_execution.image_writer import image_writer
 from comfy_api.internal import _ComfyNodeInternal, _NodeOutputInternal, first_real_override, is_class, make_locked_method_func
 from comfy_api.latest import io, _io
+from app.history_store import HistoryStore
 
 
 class ExecutionResult(Enum):
@@ -123,6 +126,11 @@ class CacheSet:
         else:
             self.init_classic_cache()
 
+        cache_disk = cache_args.get("disk", None)
+        if cache_disk and cache_type != CacheType.NONE:
+            self.init_disk_cache(cache_disk, cache_args.get("disk_size", 10.0))
+            logging.info("Using disk cache at {}".format(cache_disk))
+
         self.all = [self.outputs, self.objects]
 
     # Performs like the old cache -- dump data ASAP
@@ -142,6 +150,10 @@ class CacheSet:
         self.outputs = NullCache()
         self.objects = NullCache()
 
+    # Persists tensor outputs across restarts behind whichever in memory cache is in use
+    def init_disk_cache(self, directory, max_size_gb):
+        self.outputs = DiskCache(self.outputs, directory, int(max_size_gb * (1024**3)), CacheEntry)
+
     def recursive_debug_dump(self):
         result = {
             "outputs": self.outputs.recursive_debug_dump(),
@@ -555,7 +567,10 @@ async def execute(server, dynprompt, caches, current_item, extra_data, executed,
                 "output": output_ui
             }
             if server.client_id is not None:
-                server.send_sync("executed", { "node": unique_id, "display_node": display_node_id, "output": output_ui, "prompt_id": prompt_id }, server.client_id)
+                # Sent once the node's images are written, the next node runs in the meantime
+                client_id = server.client_id
+                executed_message = { "node": unique_id, "display_node": display_node_id, "output": output_ui, "prompt_id": prompt_id }
+                image_writer.after_writes(prompt_id, unique_id, lambda: server.send_sync("executed", executed_message, client_id))
         if has_subgraph:
             cached_outputs = []
             new_node_ids = []
@@ -688,6 +703,23 @@ class PromptExecutor:
             }
             self.add_message("execution_error", mes, broadcast=False)
 
+    def wait_for_image_writes(self, prompt_id, prompt, current_outputs, executed):
+        """Waits for the images of the prompt to be written, a failed write fails the prompt."""
+        errors = image_writer.wait(prompt_id)
+        if len(errors) == 0:
+            return True
+        node_id, path, ex, tb = errors[0]
+        self.success = False
+        error = {
+            "node_id": node_id,
+            "exception_message": "Failed to write {}: {}".format(path, ex),
+            "exception_type": full_type_name(type(ex)),
+            "traceback": tb,
+            "current_inputs": {},
+        }
+        self.handle_execution_error(prompt_id, prompt, current_outputs, executed, error, ex)
+        return False
+
     def execute(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
         asyncio.run(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
 
@@ -750,7 +782,10 @@ class PromptExecutor:
                 self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
             else:
                 # Only execute when the while-loop ends without break
-                self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+                if self.wait_for_image_writes(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed):
+                    self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+            # The files must exist before the prompt shows up in the history, after a failure too
+            image_writer.wait(prompt_id)
 
             ui_outputs = {}
             meta_outputs = {}
@@ -1138,6 +1173,18 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
 
 MAXIMUM_HISTORY_SIZE = 10000
 
+# How many items from the front of the queue PromptQueue.get(affinity=...) chooses from, and how
+# often the front item may be passed over before it has to run.
+AFFINITY_WINDOW = 8
+AFFINITY_MAX_HEAD_SKIPS = 4
+# How many items from the front of the queue PromptQueue.get_matching looks at.
+MATCHING_WINDOW = 64
+
+class QueueSnapshot(NamedTuple):
+    version: int
+    running: tuple
+    queued: tuple
+
 class PromptQueue:
     def __init__(self, server):
         self.server = server
@@ -1146,28 +1193,86 @@ class PromptQueue:
         self.task_counter = 0
         self.queue = []
         self.currently_running = {}
-        self.history = {}
+        self.history = HistoryStore(MAXIMUM_HISTORY_SIZE)
         self.flags = {}
+        self.head_skips = 0
+        self.model_swaps_avoided = 0
+        self.snapshot = QueueSnapshot(0, (), ())
+
+    # Publishes the state of the queue for readers that don't take the mutex. Call with the mutex held
+    # after every change, queue items are immutable so the snapshot only copies references.
+    def _publish_snapshot(self):
+        self.snapshot = QueueSnapshot(self.snapshot.version + 1, tuple(self.currently_running.values()), tuple(self.queue))
 
     def put(self, item):
         with self.mutex:
             heapq.heappush(self.queue, item)
+            self._publish_snapshot()
             self.server.queue_updated()
             self.not_empty.notify()
 
-    def get(self, timeout=None):
+    def get(self, timeout=None, affinity=None):
         with self.not_empty:
             while len(self.queue) == 0:
                 self.not_empty.wait(timeout=timeout)
                 if timeout is not None and len(self.queue) == 0:
                     return None
-            item = heapq.heappop(self.queue)
+            item = self._pop_next(affinity)
             i = self.task_counter
             self.currently_running[i] = copy.deepcopy(item)
             self.task_counter += 1
+            self._publish_snapshot()
             self.server.queue_updated()
             return (item, i)
 
+    # Puts an item returned by get back into the queue, for a worker that failed before running it.
+    def requeue(self, item_id):
+        with self.mutex:
+            item = self.currently_running.pop(item_id)
+            heapq.heappush(self.queue, item)
+            self._publish_snapshot()
+            self.server.queue_updated()
+            self.not_empty.notify()
+
+    # Removes and returns up to limit more items among the front of the queue for which
+    # key(item) == value, the same way get returns a single item.
+    def get_matching(self, key, value, limit):
+        with self.mutex:
+            matches = [x for x in heapq.nsmallest(MATCHING_WINDOW, self.queue) if key(x) == value][:limit]
+            if len(matches) == 0:
+                return []
+            matched = set(id(x) for x in matches)
+            self.queue = [x for x in self.queue if id(x) not in matched]
+            heapq.heapify(self.queue)
+            out = []
+            for item in matches:
+                i = self.task_counter
+                self.currently_running[i] = copy.deepcopy(item)
+                self.task_counter += 1
+                out.append((item, i))
+            self._publish_snapshot()
+            self.server.queue_updated()
+            return out
+
+    # affinity(item) scores how well a queued item suits the caller, e.g. a worker that already has
+    # the item's models loaded. The best scoring item near the front of the queue is returned, and
+    # the front item is taken regardless once it was passed over AFFINITY_MAX_HEAD_SKIPS times.
+    def _pop_next(self, affinity):
+        if affinity is None or len(self.queue) == 1 or self.head_skips >= AFFINITY_MAX_HEAD_SKIPS:
+            self.head_skips = 0
+            return heapq.heappop(self.queue)
+        candidates = heapq.nsmallest(AFFINITY_WINDOW, self.queue)
+        best = max(candidates, key=affinity)
+        if best is candidates[0]:
+            self.head_skips = 0
+            return heapq.heappop(self.queue)
+        # best scored higher than the front item, so running it avoided loading other models
+        self.head_skips += 1
+        self.model_swaps_avoided += 1
+        self.queue.remove(best)
+        heapq.heapify(self.queue)
+        return best
+
     class ExecutionStatus(NamedTuple):
         status_str: Literal['success', 'error']
         completed: bool
@@ -1177,8 +1282,6 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
 
             status_dict: Optional[dict] = None
             if status is not None:
@@ -1187,36 +1290,37 @@ class PromptQueue:
             if process_item is not None:
                 prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
+            entry = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
-            self.server.queue_updated()
+            entry.update(history_result)
+            # Added to the history together with leaving currently_running, so readers always see the prompt
+            pending = self.history.add(prompt[1], entry)
+            self._publish_snapshot()
+        # Writing the entry to the database happens without locking the queue
+        self.history.write(pending)
+        self.server.queue_updated()
 
     # Note: slow
     def get_current_queue(self):
-        with self.mutex:
-            out = []
-            for x in self.currently_running.values():
-                out += [x]
-            return (out, copy.deepcopy(self.queue))
+        snapshot = self.snapshot
+        return (list(snapshot.running), copy.deepcopy(list(snapshot.queued)))
 
     # read-safe as long as queue items are immutable
     def get_current_queue_volatile(self):
-        with self.mutex:
-            running = [x for x in self.currently_running.values()]
-            queued = copy.copy(self.queue)
-            return (running, queued)
+        snapshot = self.snapshot
+        return (list(snapshot.running), list(snapshot.queued))
 
     def get_tasks_remaining(self):
-        with self.mutex:
-            return len(self.queue) + len(self.currently_running)
+        snapshot = self.snapshot
+        return len(snapshot.running) + len(snapshot.queued)
 
     def wipe_queue(self):
         with self.mutex:
             self.queue = []
+            self._publish_snapshot()
             self.server.queue_updated()
 
     def delete_queue_item(self, function):
@@ -1228,44 +1332,34 @@ class PromptQueue:
                     else:
                         self.queue.pop(x)
                         heapq.heapify(self.queue)
+                        self._publish_snapshot()
                     self.server.queue_updated()
                     return True
         return False
 
-    def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
-        with self.mutex:
-            if prompt_id is None:
-                out = {}
-                i = 0
-                if offset < 0 and max_items is not None:
-                    offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        p = self.history[k]
-                        if map_function is not None:
-                            p = map_function(p)
-                        out[k] = p
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
-                return out
-            elif prompt_id in self.history:
-                p = self.history[prompt_id]
-                if map_function is None:
-                    p = copy.deepcopy(p)
-                else:
+    # History entries are shared and must not be modified, map_function should return a new object
+    def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None, before=None, status=None, since=None, until=None):
+        if prompt_id is None:
+            out = {}
+            for _, k, p in self.history.list(max_items=max_items, offset=offset, before=before, status=status, since=since, until=until):
+                if map_function is not None:
                     p = map_function(p)
-                return {prompt_id: p}
-            else:
-                return {}
+                out[k] = p
+            return out
+        p = self.history.get(prompt_id)
+        if p is None:
+            return {}
+        if map_function is None:
+            p = copy.deepcopy(p)
+        else:
+            p = map_function(p)
+        return {prompt_id: p}
 
     def wipe_history(self):
-        with self.mutex:
-            self.history = {}
+        self.history.clear()
 
     def delete_history_item(self, id_to_delete):
-        with self.mutex:
-            self.history.pop(id_to_delete, None)
+        self.history.delete(id_to_delete)
 
     def set_flag(self, name, data):
         with self.mutex:
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import time
+import threading
 import mimetypes
 import logging
 from typing import Literal, List
@@ -89,6 +90,16 @@ class CacheHelper:
 
 cache_helper = CacheHelper()
 
+# app.model_file_index.ModelFileIndex when the model folders are indexed in the background, see enable_model_file_index
+model_file_index = None
+
+def enable_model_file_index(use_watchdog: bool = True) -> None:
+    """Lists the model folders from an index kept up to date in the background instead of walking them."""
+    global model_file_index
+    from app.model_file_index import ModelFileIndex
+    model_file_index = ModelFileIndex(use_watchdog=use_watchdog)
+    filename_list_cache.clear()
+
 extension_mimetypes_cache = {
     "webp" : "image",
     "fbx" : "model",
@@ -383,7 +394,10 @@ def get_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float], f
     folders = folder_names_and_paths[folder_name]
     output_folders = {}
     for x in folders[0]:
-        files, folders_all = recursive_search(x, excluded_dir_names=[".git"])
+        if model_file_index is not None:
+            files, folders_all = model_file_index.search(x)
+        else:
+            files, folders_all = recursive_search(x, excluded_dir_names=[".git"])
         output_list.update(filter_files_extensions(files, folders[1]))
         output_folders = {**output_folders, **folders_all}
 
@@ -404,7 +418,11 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
     for x in out[1]:
         time_modified = out[1][x]
         folder = x
-        if os.path.getmtime(folder) != time_modified:
+        if model_file_index is not None:
+            # out[1] has the index version of every folder instead of the mtimes of all directories
+            if model_file_index.version(folder) != time_modified:
+                return None
+        elif os.path.getmtime(folder) != time_modified:
             return None
 
     folders = folder_names_and_paths[folder_name]
@@ -425,16 +443,116 @@ def get_filename_list(folder_name: str) -> list[str]:
     cache_helper.set(folder_name, out)
     return list(out[0])
 
-def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
-    def map_filename(filename: str) -> tuple[int, str]:
-        prefix_len = len(os.path.basename(filename_prefix))
-        prefix = filename[:prefix_len + 1]
+# Endings of the files nodes save as {filename}_{counter:05}{ending}, checked before a counter is handed
+# out in addition to the ones seen in the folder
+SAVE_COUNTER_ENDINGS = frozenset([
+    "_.png", "_.webp", "_.jxl", "_.jpg", "_.gif", "_.svg", "_.latent", "_.safetensors", "_.flac", "_.mp3", "_.opus",
+    "_.wav", "_.mp4", "_.webm", "_.mov", "_.glb", "_.obj", "_.json", "_.txt",
+])
+
+# Hidden folder inside an output folder with the files that claim counters across processes
+SAVE_COUNTER_LOCK_DIR = ".counter_locks"
+# Claims older than this are removed, their files were written long ago
+SAVE_COUNTER_LOCK_AGE = 3600
+# Seconds between removing the old claims of a folder
+SAVE_COUNTER_PRUNE_INTERVAL = 300
+
+class SaveCounterRegistry:
+    """
+    Hands out the counters for get_save_image_path. An output folder is listed once, after that the
+    next counter of every filename prefix is kept in memory. Nodes may use more than one counter
+    per call (one per image of a batch) and other processes may save to the same folder, so the
+    files a counter would belong to are checked for before it is handed out.
+
+    Files are often written after the counter was handed out (SaveImage writes them on a background
+    pool), so every counter is also claimed by creating a lock file with O_EXCL, which only one
+    process can do. Claims older than SAVE_COUNTER_LOCK_AGE are removed every few minutes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # normcase(folder) -> {normcase(filename prefix): [next counter, endings seen]}
+        self.folders: dict[str, dict[str, list]] = {}
+        # normcase(folder) -> time.monotonic() of the last prune_locks
+        self.pruned: dict[str, float] = {}
+
+    @staticmethod
+    def scan(folder: str) -> dict[str, list]:
+        prefixes: dict[str, list] = {}
+        for name in os.listdir(folder):
+            # Any "_" may end the prefix, the counter is the text up to the next "_"
+            i = name.find("_")
+            while i >= 0:
+                digits = name[i + 1:].split("_")[0]
+                if digits.isascii() and digits.isdigit() and int(digits) > 0:
+                    entry = prefixes.setdefault(os.path.normcase(name[:i]), [1, set()])
+                    entry[0] = max(entry[0], int(digits) + 1)
+                    entry[1].add(name[i + 1 + len(digits):])
+                i = name.find("_", i + 1)
+        return prefixes
+
+    @staticmethod
+    def prune_locks(folder: str):
+        lock_dir = os.path.join(folder, SAVE_COUNTER_LOCK_DIR)
+        expired = time.time() - SAVE_COUNTER_LOCK_AGE
         try:
-            digits = int(filename[prefix_len + 1:].split('_')[0])
-        except:
-            digits = 0
-        return digits, prefix
-
+            with os.scandir(lock_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.stat().st_mtime < expired:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def claim(folder: str, filename: str, counter: int, endings) -> bool:
+        """Claims a counter for this process, False if another one has or had it."""
+        lock_path = os.path.join(folder, SAVE_COUNTER_LOCK_DIR, f"{filename}_{counter:05}")
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        # Checked after claiming, a claim is only removed once its files were written long ago
+        if any(os.path.exists(os.path.join(folder, f"{filename}_{counter:05}{ending}")) for ending in endings):
+            os.remove(lock_path)
+            return False
+        return True
+
+    def allocate(self, folder: str, filename: str, count: int = 1) -> int:
+        """Returns the first of count consecutive counters no other save uses."""
+        key = os.path.normcase(folder)
+        with self.lock:
+            prefixes = self.folders.get(key, None)
+            if prefixes is None or not os.path.isdir(os.path.join(folder, SAVE_COUNTER_LOCK_DIR)):
+                try:
+                    prefixes = self.scan(folder)
+                except FileNotFoundError:
+                    prefixes = {}
+                os.makedirs(os.path.join(folder, SAVE_COUNTER_LOCK_DIR), exist_ok=True)
+                self.pruned.pop(key, None)
+                self.folders[key] = prefixes
+            now = time.monotonic()
+            if key not in self.pruned or now - self.pruned[key] >= SAVE_COUNTER_PRUNE_INTERVAL:
+                self.prune_locks(folder)
+                self.pruned[key] = now
+            entry = prefixes.setdefault(os.path.normcase(filename), [1, set()])
+            endings = SAVE_COUNTER_ENDINGS.union(entry[1])
+            counter = entry[0]
+            claimed = 0
+            while claimed < count:
+                if self.claim(folder, filename, counter + claimed, endings):
+                    claimed += 1
+                else:
+                    # The range has to be consecutive, start over after the taken counter
+                    counter += claimed + 1
+                    claimed = 0
+            entry[0] = counter + count
+            return counter
+
+save_counters = SaveCounterRegistry()
+
+def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0, count=1) -> tuple[str, str, int, str, str]:
     def compute_vars(input: str, image_width: int, image_height: int) -> str:
         input = input.replace("%width%", str(image_width))
         input = input.replace("%height%", str(image_height))
@@ -463,13 +581,7 @@ def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, im
         logging.error(err)
         raise Exception(err)
 
-    try:
-        counter = max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
-    except ValueError:
-        counter = 1
-    except FileNotFoundError:
-        os.makedirs(full_output_folder, exist_ok=True)
-        counter = 1
+    counter = save_counters.allocate(full_output_folder, filename, count)
     return full_output_folder, filename, counter, subfolder, filename_prefix
 
 def get_input_subfolders() -> list[str]:
@@ -7,7 +7,7 @@ import folder_paths
 import time
 from comfy.cli_args import args, enables_dynamic_vram
 from app.logger import setup_logger
-from app.assets.scanner import seed_assets
+from app.assets.scanner import asset_scanner
 import itertools
 import utils.extra_config
 import logging
@@ -107,6 +107,9 @@ def apply_custom_paths():
         logging.info(f"Setting user directory to: {user_dir}")
         folder_paths.set_user_directory(user_dir)
 
+    if args.model_file_index:
+        folder_paths.enable_model_file_index()
+
 
 def execute_prestartup_script():
     if args.disable_all_custom_nodes and len(args.whitelist_custom_nodes) == 0:
@@ -178,6 +181,7 @@ import comfy.utils
 
 import execution
 import server
+from comfy_execution import batching, scheduling, worker_pool
 from protocol import BinaryEventTypes
 import nodes
 import comfy.model_management
@@ -237,40 +241,57 @@ def prompt_worker(q, server_instance):
     elif args.cache_none:
         cache_type = execution.CacheType.NONE
 
-    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram, "disk" : args.cache_disk, "disk_size" : args.cache_disk_size } )
+    server_instance.prompt_executors.append(e)
     last_gc_collect = 0
     need_gc = False
     gc_collect_interval = 10.0
 
+    affinity = None
+    if args.queue_policy == "model-affinity":
+        affinity = scheduling.ModelAffinity()
+
+    def execute_item(item, item_id):
+        prompt_id = item[1]
+        server_instance.last_prompt_id = prompt_id
+
+        sensitive = item[5]
+        extra_data = item[3].copy()
+        for k in sensitive:
+            extra_data[k] = sensitive[k]
+
+        e.execute(item[2], prompt_id, extra_data, item[4])
+
+        remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
+        q.task_done(item_id,
+                    e.history_result,
+                    status=execution.PromptQueue.ExecutionStatus(
+                        status_str='success' if e.success else 'error',
+                        completed=e.success,
+                        messages=e.status_messages), process_item=remove_sensitive)
+        if server_instance.client_id is not None:
+            server_instance.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server_instance.client_id)
+
     while True:
         timeout = 1000.0
         if need_gc:
             timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
 
-        queue_item = q.get(timeout=timeout)
+        queue_item = q.get(timeout=timeout, affinity=affinity)
         if queue_item is not None:
             item, item_id = queue_item
             execution_start_time = time.perf_counter()
-            prompt_id = item[1]
-            server_instance.last_prompt_id = prompt_id
-
-            sensitive = item[5]
-            extra_data = item[3].copy()
-            for k in sensitive:
-                extra_data[k] = sensitive[k]
 
-            e.execute(item[2], prompt_id, extra_data, item[4])
+            batch = [queue_item]
+            if args.batch_prompts > 1:
+                batch = batching.take_batch(q, queue_item, args.batch_prompts)
+            if len(batch) > 1:
+                batching.execute_batch(e, server_instance, q, batch, execute_item)
+            else:
+                execute_item(item, item_id)
             need_gc = True
-
-            remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
-            q.task_done(item_id,
-                        e.history_result,
-                        status=execution.PromptQueue.ExecutionStatus(
-                            status_str='success' if e.success else 'error',
-                            completed=e.success,
-                            messages=e.status_messages), process_item=remove_sensitive)
-            if server_instance.client_id is not None:
-                server_instance.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server_instance.client_id)
+            if affinity is not None:
+                affinity.update(item[2])
 
             current_time = time.perf_counter()
             execution_time = current_time - execution_start_time
@@ -287,6 +308,8 @@ def prompt_worker(q, server_instance):
 
         if flags.get("unload_models", free_memory):
             comfy.model_management.unload_all_models()
+            if affinity is not None:
+                affinity.reset()
             need_gc = True
             last_gc_collect = 0
 
@@ -351,26 +374,33 @@ def cleanup_temp():
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-def setup_database():
+def setup_database(prompt_server):
     try:
-        from app.database.db import init_db, dependencies_available
+        from app.database.db import init_db, dependencies_available, create_session
         if dependencies_available():
             init_db()
+            if args.persistent_history:
+                prompt_server.prompt_queue.history.enable_persistence(create_session)
             if not args.disable_assets_autoscan:
-                seed_assets(["models"], enable_logging=True)
+                asset_scanner.enqueue(("models",))
     except Exception as e:
         logging.error(f"Failed to initialize database. Please ensure you have installed the latest requirements. If the error persists, please report this as in future the database will be required: {e}")
 
 
+def apply_temp_directory():
+    # --temp-directory, the other directories are set by apply_custom_paths in every process
+    if args.temp_directory:
+        temp_dir = os.path.join(os.path.abspath(args.temp_directory), "temp")
+        logging.info(f"Setting temp directory to: {temp_dir}")
+        folder_paths.set_temp_directory(temp_dir)
+
+
 def start_comfyui(asyncio_loop=None):
     """
     Starts the ComfyUI server using the provided asyncio event loop or creates a new one.
     Returns the event loop, server instance, and a function to start the server asynchronously.
     """
-    if args.temp_directory:
-        temp_dir = os.path.join(os.path.abspath(args.temp_directory), "temp")
-        logging.info(f"Setting temp directory to: {temp_dir}")
-        folder_paths.set_temp_directory(temp_dir)
+    apply_temp_directory()
     cleanup_temp()
 
     if args.windows_standalone_build:
@@ -396,12 +426,17 @@ def start_comfyui(asyncio_loop=None):
     hook_breaker_ac10a0.restore_functions()
 
     cuda_malloc_warning()
-    setup_database()
+    setup_database(prompt_server)
 
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+    if args.workers > 0:
+        devices = worker_pool.parse_worker_devices(args.workers, args.worker_devices, args.cpu)
+        prompt_server.worker_pool = worker_pool.WorkerPool(prompt_server, prompt_server.prompt_queue, devices, worker_pool.strip_worker_args(sys.argv[1:]))
+        prompt_server.worker_pool.start()
+    else:
+        threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
 
     if args.quick_test_for_ci:
         exit(0)
@@ -426,7 +461,32 @@ def start_comfyui(asyncio_loop=None):
     return asyncio_loop, prompt_server, start_all
 
 
-if __name__ == "__main__":
+def start_worker():
+    """
+    Runs this process as one of the --workers of another ComfyUI instance: load the nodes and
+    execute the prompts it sends until the connection is closed.
+    """
+    # The main process cleans up the temp directory, workers only write their previews to it
+    apply_temp_directory()
+    asyncio_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(asyncio_loop)
+    server_instance, queue = worker_pool.connect_worker(args.worker_address)
+    server.PromptServer.instance = server_instance
+
+    hook_breaker_ac10a0.save_functions()
+    asyncio_loop.run_until_complete(nodes.init_extra_nodes(
+        init_custom_nodes=(not args.disable_all_custom_nodes) or len(args.whitelist_custom_nodes) > 0,
+        init_api_nodes=not args.disable_api_nodes
+    ))
+    hook_breaker_ac10a0.restore_functions()
+
+    hijack_progress(server_instance)
+    prompt_worker(queue, server_instance)
+
+
+if __name__ == "__main__" and args.worker_address is not None:
+    start_worker()
+elif __name__ == "__main__":
     # Running directly, just start ComfyUI.
     logging.info("Python version: {}".format(sys.version))
     logging.info("ComfyUI version: {}".format(comfyui_version.__version__))
@@ -42,6 +42,7 @@ import importlib
 
 import folder_paths
 import latent_preview
+from comfy_execution.image_writer import image_writer, save_image_format
 import node_helpers
 
 if args.enable_manager:
@@ -1542,6 +1543,9 @@ def common_ksampler(model, seed, steps, cfg, sampler_name, scheduler, positive,
 
     if disable_noise:
         noise = torch.zeros(latent_image.size(), dtype=latent_image.dtype, layout=latent_image.layout, device="cpu")
+    elif "batch_seeds" in latent and not latent_image.is_nested:
+        # Merged prompts: every latent gets the noise it would have gotten when sampled on its own
+        noise = torch.cat([comfy.sample.prepare_noise(latent_image[i:i + 1], s) for i, s in enumerate(latent["batch_seeds"])])
     else:
         batch_inds = latent["batch_index"] if "batch_index" in latent else None
         noise = comfy.sample.prepare_noise(latent_image, seed, batch_inds)
@@ -1557,6 +1561,7 @@ def common_ksampler(model, seed, steps, cfg, sampler_name, scheduler, positive,
                                   force_full_denoise=force_full_denoise, noise_mask=noise_mask, callback=callback, disable_pbar=disable_pbar, seed=seed)
     out = latent.copy()
     out.pop("downscale_ratio_spacial", None)
+    out.pop("batch_seeds", None)
     out["samples"] = samples
     return (out, )
 
@@ -1651,25 +1656,45 @@ class SaveImage:
     DESCRIPTION = "Saves the input images to your ComfyUI output directory."
     SEARCH_ALIASES = ["save", "save image", "export image", "output image", "write image", "download"]
 
+    def image_format(self):
+        # --save-image-format only applies to saved images, previews stay fast PNGs
+        if self.type != "output" or args.save_image_format == "png":
+            return ".png", {"compress_level": self.compress_level}
+        return save_image_format()
+
     def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
         filename_prefix += self.prefix_append
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
+        extension, save_args = self.image_format()
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0], count=len(images))
         results = list()
-        for (batch_number, image) in enumerate(images):
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
+        # Converts the whole batch at once, encoding and writing the files happens on the image writer threads
+        batch = np.clip(255. * images.cpu().numpy(), 0, 255).astype(np.uint8)
+        for (batch_number, image) in enumerate(batch):
+            img = Image.fromarray(image)
+            metadata = {}
             if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+                if extension == ".png":
+                    pnginfo = PngInfo()
+                    if prompt is not None:
+                        pnginfo.add_text("prompt", json.dumps(prompt))
+                    if extra_pnginfo is not None:
+                        for x in extra_pnginfo:
+                            pnginfo.add_text(x, json.dumps(extra_pnginfo[x]))
+                    metadata["pnginfo"] = pnginfo
+                else:
+                    exif = img.getexif()
+                    if prompt is not None:
+                        exif[0x0110] = "prompt:{}".format(json.dumps(prompt))  # EXIF 0x0110 = Model
+                    if extra_pnginfo is not None:
+                        tag = 0x010F  # EXIF 0x010f = Make
+                        for x in extra_pnginfo:
+                            exif[tag] = "{}:{}".format(x, json.dumps(extra_pnginfo[x]))
+                            tag -= 1
+                    metadata["exif"] = exif
 
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
+            file = f"{filename_with_batch_num}_{counter:05}_{extension}"
+            image_writer.save(img, os.path.join(full_output_folder, file), **metadata, **save_args)
             results.append({
                 "filename": file,
                 "subfolder": subfolder,
@@ -2374,6 +2399,7 @@ async def init_builtin_extra_nodes():
         "nodes_photomaker.py",
         "nodes_pixart.py",
         "nodes_cond.py",
+        "nodes_prompt_batching.py",
         "nodes_morphology.py",
         "nodes_stable_cascade.py",
         "nodes_differential_diffusion.py",
@@ -7,7 +7,8 @@ import time
 import nodes
 import folder_paths
 import execution
-from comfy_execution.jobs import JobStatus, get_job, get_all_jobs
+from comfy_execution.jobs import JobStatus, get_job, summarize_jobs, filter_jobs
+from comfy_execution import batching
 import uuid
 import urllib
 import json
@@ -16,7 +17,7 @@ import struct
 import ssl
 import socket
 import ipaddress
-from PIL import Image, ImageOps
+from PIL import Image
 from PIL.PngImagePlugin import PngInfo
 from io import BytesIO
 
@@ -33,7 +34,7 @@ import node_helpers
 from comfyui_version import __version__
 from app.frontend_management import FrontendManager, parse_version
 from comfy_api.internal import _ComfyNodeInternal
-from app.assets.scanner import seed_assets
+from app.assets.scanner import asset_scanner
 from app.assets.api.routes import register_assets_system
 
 from app.user_manager import UserManager
@@ -42,6 +43,11 @@ from app.custom_node_manager import CustomNodeManager
 from app.subgraph_manager import SubgraphManager
 from typing import Optional, Union
 from api_server.routes.internal.internal_routes import InternalRoutes
+from api_server.services.message_coalescer import coalesce_key, coalesce_messages
+from api_server.services.object_info_cache import ObjectInfoCache, object_info_fingerprint
+from api_server.services.preview_service import PreviewService
+from api_server.services.socket_writer import SocketWriter
+from api_server.utils.etag import make_etag, not_modified
 from protocol import BinaryEventTypes
 
 # Import cache control middleware
@@ -56,12 +62,6 @@ def _remove_sensitive_from_queue(queue: list) -> list:
     return [item[:5] for item in queue]
 
 
-async def send_socket_catch_exception(function, message):
-    try:
-        await function(message)
-    except (aiohttp.ClientError, aiohttp.ClientPayloadError, ConnectionResetError, BrokenPipeError, ConnectionError) as err:
-        logging.warning("send error: {}".format(err))
-
 # Track deprecated paths that have been warned about to only warn once per file
 _deprecated_paths_warned = set()
 
@@ -92,7 +92,7 @@ async def compress_body(request: web.Request, handler):
         return response
     if response.content_type not in ["application/json", "text/plain"]:
         return response
-    if response.body and "gzip" in accept_encoding:
+    if response.body and "gzip" in accept_encoding and "Content-Encoding" not in response.headers:
         response.enable_compression()
     return response
 
@@ -207,8 +207,14 @@ class PromptServer():
         self.internal_routes = InternalRoutes(self)
         self.supports = ["custom_nodes_from_web"]
         self.prompt_queue = execution.PromptQueue(self)
+        self.prompt_executors = []
+        self.worker_pool = None
         self.loop = loop
         self.messages = asyncio.Queue()
+        self.messages_coalesced = 0
+        # (etag, job summaries) for /api/jobs, rebuilt when the queue or history changed
+        self.jobs_summary = (None, [])
+        self.preview_service = PreviewService(self)
         self.client_session:Optional[aiohttp.ClientSession] = None
         self.number = 0
 
@@ -231,6 +237,7 @@ class PromptServer():
         self.app = web.Application(client_max_size=max_upload_size, middlewares=middlewares)
         self.sockets = dict()
         self.sockets_metadata = dict()
+        self.socket_writers = dict()
         self.web_root = (
             FrontendManager.init_frontend(args.front_end_version)
             if args.front_end_root is None
@@ -253,11 +260,16 @@ class PromptServer():
             if sid:
                 # Reusing existing session, remove old
                 self.sockets.pop(sid, None)
+                old_writer = self.socket_writers.pop(sid, None)
+                if old_writer is not None:
+                    old_writer.close()
             else:
                 sid = uuid.uuid4().hex
 
             # Store WebSocket for backward compatibility
             self.sockets[sid] = ws
+            writer = SocketWriter(ws, self.loop)
+            self.socket_writers[sid] = writer
             # Store metadata separately
             self.sockets_metadata[sid] = {"feature_flags": {}}
 
@@ -301,8 +313,12 @@ class PromptServer():
                         except Exception as e:
                             logging.error(f"Error processing WebSocket message: {e}")
             finally:
-                self.sockets.pop(sid, None)
-                self.sockets_metadata.pop(sid, None)
+                writer.close()
+                # A reconnect with the same clientId may already have replaced this socket
+                if self.socket_writers.get(sid, None) is writer:
+                    self.sockets.pop(sid, None)
+                    self.sockets_metadata.pop(sid, None)
+                    self.socket_writers.pop(sid, None)
             return ws
 
         @routes.get("/")
@@ -637,17 +653,40 @@ class PromptServer():
                         "torch_vram_total": torch_vram_total,
                         "torch_vram_free": torch_vram_free,
                     }
-                ]
+                ],
+                "queue": {
+                    "model_swaps_avoided": self.prompt_queue.model_swaps_avoided,
+                },
+                "websocket": {
+                    "messages_coalesced": self.messages_coalesced,
+                }
             }
             return web.json_response(system_stats)
 
+        @routes.get("/cache_stats")
+        async def get_cache_stats(request):
+            entries = []
+            for executor in self.prompt_executors:
+                report = getattr(executor.caches.outputs, "ram_usage_report", None)
+                if report is not None:
+                    entries.extend(report())
+            entries.sort(key=lambda x: x["ram_usage"], reverse=True)
+            return web.json_response({
+                "ram_usage": sum(x["ram_usage"] for x in entries),
+                "entries": entries,
+            })
+
         @routes.get("/features")
         async def get_features(request):
             return web.json_response(feature_flags.get_server_features())
 
         @routes.get("/prompt")
         async def get_prompt(request):
-            return web.json_response(self.get_queue_info())
+            etag = make_etag(self.prompt_queue.snapshot.version)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            return web.json_response(self.get_queue_info(), headers={"ETag": etag})
 
         def node_info(node_class):
             obj_class = nodes.NODE_CLASS_MAPPINGS[node_class]
@@ -689,12 +728,7 @@ class PromptServer():
             info['search_aliases'] = getattr(obj_class, 'SEARCH_ALIASES', [])
             return info
 
-        @routes.get("/object_info")
-        async def get_object_info(request):
-            try:
-                seed_assets(["models"])
-            except Exception as e:
-                logging.error(f"Failed to seed assets: {e}")
+        def build_object_info():
             with folder_paths.cache_helper:
                 out = {}
                 for x in nodes.NODE_CLASS_MAPPINGS:
@@ -703,7 +737,26 @@ class PromptServer():
                     except Exception:
                         logging.error(f"[ERROR] An error occurred while retrieving information for the '{x}' node.")
                         logging.error(traceback.format_exc())
-                return web.json_response(out)
+                return out
+
+        self.object_info_cache = ObjectInfoCache(build_object_info, lambda: object_info_fingerprint(nodes.NODE_CLASS_MAPPINGS))
+
+        @routes.get("/object_info")
+        async def get_object_info(request):
+            self.seed_assets_in_background()
+            # ?refresh=true rebuilds the payload in case a node lists something the cache doesn't watch.
+            # Not Cache-Control, browsers send no-cache on every request the frontend makes.
+            refresh = request.rel_url.query.get("refresh", None)
+            force = refresh == "true" or refresh == "1"
+            payload = await self.object_info_cache.get(force=force)
+            response = not_modified(request, payload.etag)
+            if response is not None:
+                return response
+            headers = {"ETag": payload.etag, "Vary": "Accept-Encoding"}
+            if "gzip" in request.headers.get("Accept-Encoding", ""):
+                headers["Content-Encoding"] = "gzip"
+                return web.Response(body=payload.gzip_body, content_type="application/json", headers=headers)
+            return web.Response(body=payload.body, content_type="application/json", headers=headers)
 
         @routes.get("/object_info/{node_class}")
         async def get_object_info_node(request):
@@ -783,14 +836,22 @@ class PromptServer():
                         status=400
                     )
 
-            running, queued = self.prompt_queue.get_current_queue_volatile()
-            history = self.prompt_queue.get_history()
-
-            running = _remove_sensitive_from_queue(running)
-            queued = _remove_sensitive_from_queue(queued)
-
-            jobs, total = get_all_jobs(
-                running, queued, history,
+            # Served from the queue snapshot and history without taking the queue mutex. The versions
+            # are read before the data so an ETag never claims newer data than was sent.
+            etag = make_etag(self.prompt_queue.snapshot.version, self.prompt_queue.history.version)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+
+            summary_etag, summary = self.jobs_summary
+            if summary_etag != etag:
+                running, queued = self.prompt_queue.get_current_queue_volatile()
+                history = self.prompt_queue.get_history()
+                summary = summarize_jobs(_remove_sensitive_from_queue(running), _remove_sensitive_from_queue(queued), history)
+                self.jobs_summary = (etag, summary)
+
+            jobs, total = filter_jobs(
+                summary,
                 status_filter=status_filter,
                 workflow_id=workflow_id,
                 sort_by=sort_by,
@@ -809,7 +870,7 @@ class PromptServer():
                     'total': total,
                     'has_more': has_more
                 }
-            })
+            }, headers={"ETag": etag})
 
         @routes.get("/api/jobs/{job_id}")
         async def get_job_by_id(request):
@@ -848,7 +909,28 @@ class PromptServer():
             else:
                 offset = -1
 
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset))
+            # Filters and cursor paging: status is success or error, since/until are completion times in
+            # milliseconds, before is the X-Next-Cursor header of the previous (newer) page.
+            filters = {}
+            for key in ("before", "since", "until"):
+                value = request.rel_url.query.get(key, None)
+                if value is not None:
+                    filters[key] = int(value)
+            status = request.rel_url.query.get("status", None)
+            if status is not None:
+                filters["status"] = status
+
+            etag = make_etag(self.prompt_queue.history.version)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+
+            # Filtered pages are queried from the database
+            items = await asyncio.to_thread(self.prompt_queue.history.list, max_items=max_items, offset=offset, **filters)
+            headers = {"ETag": etag}
+            if len(items) > 0 and max_items is not None and len(items) >= max_items:
+                headers["X-Next-Cursor"] = str(items[0][0])
+            return web.json_response({prompt_id: entry for _, prompt_id, entry in items}, headers=headers)
 
         @routes.get("/history/{prompt_id}")
         async def get_history_prompt_id(request):
@@ -857,11 +939,15 @@ class PromptServer():
 
         @routes.get("/queue")
         async def get_queue(request):
+            snapshot = self.prompt_queue.snapshot
+            etag = make_etag(snapshot.version)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
             queue_info = {}
-            current_queue = self.prompt_queue.get_current_queue_volatile()
-            queue_info['queue_running'] = _remove_sensitive_from_queue(current_queue[0])
-            queue_info['queue_pending'] = _remove_sensitive_from_queue(current_queue[1])
-            return web.json_response(queue_info)
+            queue_info['queue_running'] = _remove_sensitive_from_queue(snapshot.running)
+            queue_info['queue_pending'] = _remove_sensitive_from_queue(snapshot.queued)
+            return web.json_response(queue_info, headers={"ETag": etag})
 
         @routes.post("/prompt")
         async def post_prompt(request):
@@ -952,13 +1038,13 @@ class PromptServer():
                         break
 
                 if should_interrupt:
-                    nodes.interrupt_processing()
+                    self.interrupt_processing(prompt_id)
                 else:
                     logging.info(f"Prompt {prompt_id} is not currently running, skipping interrupt")
             else:
                 # No prompt_id provided, do a global interrupt
                 logging.info("Global interrupt (no prompt_id specified)")
-                nodes.interrupt_processing()
+                self.interrupt_processing()
 
             return web.Response(status=200)
 
@@ -976,16 +1062,26 @@ class PromptServer():
         @routes.post("/history")
         async def post_history(request):
             json_data =  await request.json()
+            # Deleting from the stored history writes to the database
             if "clear" in json_data:
                 if json_data["clear"]:
-                    self.prompt_queue.wipe_history()
+                    await asyncio.to_thread(self.prompt_queue.wipe_history)
             if "delete" in json_data:
                 to_delete = json_data['delete']
                 for id_to_delete in to_delete:
-                    self.prompt_queue.delete_history_item(id_to_delete)
+                    await asyncio.to_thread(self.prompt_queue.delete_history_item, id_to_delete)
 
             return web.Response(status=200)
 
+    def interrupt_processing(self, prompt_id=None):
+        if self.worker_pool is not None:
+            self.worker_pool.interrupt(prompt_id)
+        else:
+            # A batch of merged prompts is stopped and runs again without the interrupted one
+            if prompt_id is not None:
+                batching.interrupt_prompt(prompt_id)
+            nodes.interrupt_processing()
+
     async def setup(self):
         timeout = aiohttp.ClientTimeout(total=None) # no timeout
         self.client_session = aiohttp.ClientSession(timeout=timeout)
@@ -1052,6 +1148,10 @@ class PromptServer():
             web.static('/', self.web_root),
         ])
 
+    def seed_assets_in_background(self):
+        """Syncs the model assets with the database on the asset scanner thread, unless that scan is already queued."""
+        asset_scanner.enqueue(("models",), hash_files=not args.disable_assets_autoscan)
+
     def get_queue_info(self):
         prompt_info = {}
         exec_info = {}
@@ -1060,12 +1160,8 @@ class PromptServer():
         return prompt_info
 
     async def send(self, event, data, sid=None):
-        if event == BinaryEventTypes.UNENCODED_PREVIEW_IMAGE:
-            await self.send_image(data, sid=sid)
-        elif event == BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA:
-            # data is (preview_image, metadata)
-            preview_image, metadata = data
-            await self.send_image_with_metadata(preview_image, metadata, sid=sid)
+        if event == BinaryEventTypes.UNENCODED_PREVIEW_IMAGE or event == BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA:
+            self.preview_service.send(event, data, sid)
         elif isinstance(data, (bytes, bytearray)):
             await self.send_bytes(event, data, sid)
         else:
@@ -1081,85 +1177,29 @@ class PromptServer():
         return message
 
     async def send_image(self, image_data, sid=None):
-        image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
-
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
-        type_num = 1
-        if image_type == "JPEG":
-            type_num = 1
-        elif image_type == "PNG":
-            type_num = 2
-
-        bytesIO = BytesIO()
-        header = struct.pack(">I", type_num)
-        bytesIO.write(header)
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        preview_bytes = bytesIO.getvalue()
-        await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE, preview_bytes, sid=sid)
+        event, data = await self.preview_service.encode(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, image_data)
+        await self.send_bytes(event, data, sid=sid)
 
     async def send_image_with_metadata(self, image_data, metadata=None, sid=None):
-        image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
-
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
-
-        mimetype = "image/png" if image_type == "PNG" else "image/jpeg"
-
-        # Prepare metadata
-        if metadata is None:
-            metadata = {}
-        metadata["image_type"] = mimetype
-
-        # Serialize metadata as JSON
-        import json
-        metadata_json = json.dumps(metadata).encode('utf-8')
-        metadata_length = len(metadata_json)
-
-        # Prepare image data
-        bytesIO = BytesIO()
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        image_bytes = bytesIO.getvalue()
-
-        # Combine metadata and image
-        combined_data = bytearray()
-        combined_data.extend(struct.pack(">I", metadata_length))
-        combined_data.extend(metadata_json)
-        combined_data.extend(image_bytes)
-
-        await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, combined_data, sid=sid)
+        event, data = await self.preview_service.encode(BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, (image_data, metadata))
+        await self.send_bytes(event, data, sid=sid)
 
     async def send_bytes(self, event, data, sid=None):
-        message = self.encode_bytes(event, data)
-
-        if sid is None:
-            sockets = list(self.sockets.values())
-            for ws in sockets:
-                await send_socket_catch_exception(ws.send_bytes, message)
-        elif sid in self.sockets:
-            await send_socket_catch_exception(self.sockets[sid].send_bytes, message)
+        self.send_message(self.encode_bytes(event, data), sid)
 
     async def send_json(self, event, data, sid=None):
-        message = {"type": event, "data": data}
+        self.send_message(json.dumps({"type": event, "data": data}), sid)
 
+    def send_message(self, message, sid=None):
+        """Queues an encoded message for one client, or every client if sid is None. The message is encoded once for all of them."""
         if sid is None:
-            sockets = list(self.sockets.values())
-            for ws in sockets:
-                await send_socket_catch_exception(ws.send_json, message)
-        elif sid in self.sockets:
-            await send_socket_catch_exception(self.sockets[sid].send_json, message)
+            writers = list(self.socket_writers.values())
+        elif sid in self.socket_writers:
+            writers = [self.socket_writers[sid]]
+        else:
+            return
+        for writer in writers:
+            writer.send(message)
 
     def send_sync(self, event, data, sid=None):
         self.loop.call_soon_threadsafe(
@@ -1169,9 +1209,19 @@ class PromptServer():
         self.send_sync("status", { "status": self.get_queue_info() })
 
     async def publish_loop(self):
+        window = args.message_coalesce_ms / 1000.0
         while True:
-            msg = await self.messages.get()
-            await self.send(*msg)
+            messages = [await self.messages.get()]
+            # Give progress and status updates a moment to be superseded before sending them
+            if window > 0 and coalesce_key(*messages[0]) is not None:
+                await asyncio.sleep(window)
+            while not self.messages.empty():
+                messages.append(self.messages.get_nowait())
+
+            send = coalesce_messages(messages)
+            self.messages_coalesced += len(messages) - len(send)
+            for msg in send:
+                await self.send(*msg)
 
     async def start(self, address, port, verbose=True, call_on_start=None):
         await self.start_multi_address([(address, port)], call_on_start=call_on_start)
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import folder_paths
+from comfy.cli_args import args
+from app.database import db
+from app.database.models import Base
+from app.assets import scanner
+from app.assets.database.models import Asset, AssetCacheState, AssetInfo
+
+
+@pytest.fixture
+def input_dir(tmp_path, monkeypatch):
+    engine = create_engine("sqlite:///" + str(tmp_path / "assets.db"), connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    monkeypatch.setattr(db, "_DB_AVAILABLE", True)
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    monkeypatch.setattr(folder_paths, "input_directory", str(input_dir))
+    yield input_dir
+    engine.dispose()
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """The paths the scanner reads to hash them, with hashing turned on."""
+    monkeypatch.setattr(args, "assets_hash_workers", 2)
+    paths = []
+    hash_file = scanner._hash_file
+
+    def counting_hash_file(path):
+        paths.append(os.path.basename(path))
+        return hash_file(path)
+
+    monkeypatch.setattr(scanner, "_hash_file", counting_hash_file)
+    return paths
+
+
+def scan(roots=("input",)):
+    asset_scanner = scanner.AssetScanner()
+    asset_scanner.enqueue(roots)
+    assert asset_scanner.join(timeout=30)
+    return asset_scanner
+
+
+def assets_by_path():
+    with db.create_session() as sess:
+        rows = sess.execute(
+            select(AssetCacheState.file_path, Asset.id, Asset.hash).join(Asset, Asset.id == AssetCacheState.asset_id)
+        ).all()
+    return {os.path.basename(fp): (asset_id, asset_hash) for fp, asset_id, asset_hash in rows}
+
+
+def test_scan_hashes_and_merges_duplicates(input_dir, hashed):
+    (input_dir / "a.bin").write_bytes(b"same content")
+    (input_dir / "b.bin").write_bytes(b"same content")
+    (input_dir / "c.bin").write_bytes(b"other content")
+
+    progress = scan().progress()
+    assert progress["status"] == "idle"
+    assert (progress["files_total"], progress["files_hashed"], progress["files_failed"]) == (3, 3, 0)
+    assert progress["bytes_hashed"] == progress["bytes_total"] == 37
+    assert sorted(hashed) == ["a.bin", "b.bin", "c.bin"]
+
+    assets = assets_by_path()
+    assert assets["a.bin"] == assets["b.bin"]
+    assert assets["a.bin"][1].startswith("blake3:")
+    assert assets["c.bin"][1] not in (None, assets["a.bin"][1])
+    with db.create_session() as sess:
+        # the seed asset of the duplicate was merged, its info kept
+        assert sess.query(Asset).count() == 2
+        names = sess.execute(select(AssetInfo.name).where(AssetInfo.asset_id == assets["a.bin"][0])).scalars().all()
+        assert sorted(names) == ["a.bin", "b.bin"]
+
+
+def test_scan_only_seeds_by_default(input_dir, monkeypatch):
+    hashed = []
+    monkeypatch.setattr(scanner, "_hash_file", hashed.append)
+    (input_dir / "a.bin").write_bytes(b"a")
+
+    assert scan().progress()["files_total"] == 0
+    assert hashed == []
+    assert assets_by_path()["a.bin"][1] is None
+
+
+def test_rescan_only_hashes_changed_files(input_dir, hashed):
+    (input_dir / "a.bin").write_bytes(b"a")
+    (input_dir / "b.bin").write_bytes(b"b")
+    scan()
+    before = assets_by_path()
+    hashed.clear()
+
+    # a new scanner, as after a restart, finds nothing left to hash
+    assert scan().progress()["files_total"] == 0
+    assert hashed == []
+
+    (input_dir / "b.bin").write_bytes(b"changed")
+    os.utime(input_dir / "b.bin", ns=(1, 1))
+    scan()
+    assert hashed == ["b.bin"]
+    after = assets_by_path()
+    assert after["a.bin"] == before["a.bin"]
+    assert after["b.bin"][1] not in (None, before["b.bin"][1])
+
+
+def test_enqueue_skips_duplicate_requests(input_dir, monkeypatch):
+    asset_scanner = scanner.AssetScanner()
+    release = threading.Event()
+    started = []
+
+    def seed_assets(roots):
+        started.append(roots)
+        release.wait(timeout=10)
+
+    monkeypatch.setattr(scanner, "seed_assets", seed_assets)
+    asset_scanner.enqueue(("input",), hash_files=False)
+    while not started:
+        time.sleep(0.01)
+    asset_scanner.enqueue(("output",), hash_files=False)
+    asset_scanner.enqueue(("output",), hash_files=False)
+    progress = asset_scanner.progress()
+    assert (progress["status"], progress["roots"], progress["queued"]) == ("seeding", ["input"], [["output"]])
+    release.set()
+    assert asset_scanner.join(timeout=30)
+    assert started == [("input",), ("output",)]
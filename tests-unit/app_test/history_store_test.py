@@ -0,0 +1,130 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.models import Base
+from app.history_store import HistoryStore
+
+
+def make_entry(prompt_id, status="success"):
+    return {"prompt": [0, prompt_id, {}, {}, []], "outputs": {}, "status": {"status_str": status, "completed": status == "success", "messages": []}}
+
+
+def fill(store, count, start=0):
+    for i in range(start, start + count):
+        store.put("p{}".format(i), make_entry("p{}".format(i), "error" if i % 3 == 0 else "success"))
+
+
+@pytest.fixture
+def create_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture(params=["memory", "database"])
+def store(request, create_session):
+    store = HistoryStore(100)
+    if request.param == "database":
+        store.enable_persistence(create_session)
+    return store
+
+
+def ids(items):
+    return [prompt_id for _, prompt_id, _ in items]
+
+
+def test_offset_and_max_items(store):
+    fill(store, 10)
+    assert ids(store.list()) == ["p{}".format(i) for i in range(10)]
+    assert ids(store.list(max_items=3)) == ["p7", "p8", "p9"]
+    assert ids(store.list(max_items=3, offset=0)) == ["p0", "p1", "p2"]
+    assert ids(store.list(max_items=3, offset=8)) == ["p8", "p9"]
+    assert ids(store.list(offset=20)) == []
+    assert ids(store.list(max_items=30)) == ["p{}".format(i) for i in range(10)]
+
+
+def test_cursor_pages(store):
+    fill(store, 10)
+    pages = []
+    before = None
+    while True:
+        items = store.list(max_items=4, before=before)
+        if len(items) == 0:
+            break
+        pages.append(ids(items))
+        before = items[0][0]
+    assert pages == [["p6", "p7", "p8", "p9"], ["p2", "p3", "p4", "p5"], ["p0", "p1"]]
+
+
+def test_status_and_time_filters(store):
+    fill(store, 10)
+    assert ids(store.list(status="error")) == ["p0", "p3", "p6", "p9"]
+    assert ids(store.list(status="error", max_items=2)) == ["p6", "p9"]
+    completed_at = store.index["p5"][2]
+    assert "p9" in ids(store.list(since=completed_at))
+    assert ids(store.list(until=completed_at)) == [k for k in ids(store.list()) if store.index[k][2] < completed_at]
+
+
+def test_put_replaces_and_delete(store):
+    fill(store, 3)
+    store.put("p0", make_entry("p0"))
+    assert ids(store.list()) == ["p1", "p2", "p0"]
+    store.delete("p1")
+    assert ids(store.list()) == ["p2", "p0"]
+    assert store.get("p1") is None
+    store.clear()
+    assert len(store) == 0
+    assert store.list() == []
+
+
+def test_max_size(store):
+    fill(store, 120)
+    assert len(store) == 100
+    assert ids(store.list(max_items=1, offset=0)) == ["p20"]
+    assert ids(store.list(status="success", max_items=1, offset=0)) == ["p20"]
+
+
+def test_survives_restart(create_session):
+    store = HistoryStore(5)
+    store.enable_persistence(create_session)
+    fill(store, 8)
+    store.delete("p6")
+
+    restarted = HistoryStore(5)
+    fill(restarted, 1, start=100)
+    restarted.enable_persistence(create_session)
+    assert ids(restarted.list()) == ["p3", "p4", "p5", "p7", "p100"]
+    assert restarted.get("p7") == make_entry("p7")
+    restarted.put("p101", make_entry("p101"))
+    reloaded = HistoryStore(5)
+    reloaded.enable_persistence(create_session)
+    assert ids(reloaded.list()) == ["p4", "p5", "p7", "p100", "p101"]
+
+
+def test_unserializable_entry_stays_in_memory(create_session):
+    store = HistoryStore(10)
+    store.enable_persistence(create_session)
+    store.put("p0", {"outputs": {"1": {"value": object()}}, "status": {"status_str": "success"}})
+    assert store.get("p0") is not None
+    reloaded = HistoryStore(10)
+    reloaded.enable_persistence(create_session)
+    assert len(reloaded) == 0
+    # Filtered lists still find it
+    store.put("p1", make_entry("p1"))
+    assert ids(store.list(offset=0, status="success")) == ["p0", "p1"]
+    assert ids(store.list(offset=1)) == ["p1"]
+    store.delete("p0")
+    assert store.unstored == set()
+
+
+def test_entry_listed_before_it_is_written(create_session):
+    store = HistoryStore(10)
+    store.enable_persistence(create_session)
+    pending = store.add("p0", make_entry("p0"))
+    assert ids(store.list()) == ["p0"]
+    store.write(pending)
+    reloaded = HistoryStore(10)
+    reloaded.enable_persistence(create_session)
+    assert ids(reloaded.list()) == ["p0"]
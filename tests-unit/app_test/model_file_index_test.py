@@ -0,0 +1,116 @@
+import os
+import time
+
+import pytest
+
+import folder_paths
+from app.model_file_index import ModelFileIndex
+from app.model_manager import ModelFileManager
+
+
+def touch(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def bump_mtime(path):
+    # Directory mtimes may not change within the filesystem's timestamp resolution
+    t = time.time() + 10
+    os.utime(path, (t, t))
+
+
+@pytest.fixture
+def index():
+    return ModelFileIndex(use_watchdog=False)
+
+
+def test_initial_scan(index, tmp_path):
+    touch(str(tmp_path / "a.safetensors"))
+    touch(str(tmp_path / "sub" / "b.safetensors"))
+    touch(str(tmp_path / ".git" / "c.safetensors"))
+    files, versions = index.search(str(tmp_path))
+    assert sorted(files) == ["a.safetensors", os.path.join("sub", "b.safetensors")]
+    assert versions == {str(tmp_path): index.version(str(tmp_path))}
+    assert index.search(str(tmp_path / "missing")) == ([], {})
+
+
+def test_incremental_updates(index, tmp_path):
+    touch(str(tmp_path / "sub" / "b.safetensors"))
+    root = str(tmp_path)
+    _, versions = index.search(root)
+
+    touch(str(tmp_path / "sub" / "new.safetensors"))
+    touch(str(tmp_path / "sub" / "deeper" / "c.safetensors"))
+    bump_mtime(str(tmp_path / "sub"))
+    index.update(poll=True)
+    files, new_versions = index.search(root)
+    assert new_versions != versions
+    assert sorted(files) == [os.path.join("sub", name) for name in ["b.safetensors", os.path.join("deeper", "c.safetensors"), "new.safetensors"]]
+
+    for name in os.listdir(str(tmp_path / "sub" / "deeper")):
+        os.remove(str(tmp_path / "sub" / "deeper" / name))
+    os.rmdir(str(tmp_path / "sub" / "deeper"))
+    bump_mtime(str(tmp_path / "sub"))
+    index.update(poll=True)
+    files, _ = index.search(root)
+    assert sorted(files) == [os.path.join("sub", "b.safetensors"), os.path.join("sub", "new.safetensors")]
+
+    version = index.version(root)
+    index.update(poll=True)
+    assert index.version(root) == version
+
+
+def test_dirty_paths_are_rescanned(index, tmp_path):
+    root = str(tmp_path)
+    touch(str(tmp_path / "a.safetensors"), b"1")
+    entries, _ = index.stat_files(root)
+    assert entries["a.safetensors"].size == 1
+
+    touch(str(tmp_path / "a.safetensors"), b"1234")
+    index.mark_dirty(root)
+    index.update(poll=False)
+    entries, _ = index.stat_files(root)
+    assert entries["a.safetensors"].size == 4
+
+
+def test_rescan_sees_files_replaced_in_place(index, tmp_path):
+    root = str(tmp_path)
+    touch(str(tmp_path / "sub" / "a.safetensors"), b"1")
+    index.search(root)
+    version = index.version(root)
+    mtime = os.path.getmtime(str(tmp_path / "sub"))
+
+    touch(str(tmp_path / "sub" / "a.safetensors"), b"1234")
+    os.utime(str(tmp_path / "sub"), (mtime, mtime))
+    index.update(poll=True, rescan_files=False)
+    assert index.version(root) == version
+    index.update(poll=True, rescan_files=True)
+    assert index.version(root) != version
+    entries, _ = index.stat_files(root)
+    assert entries[os.path.join("sub", "a.safetensors")].size == 4
+
+
+def test_folder_paths_uses_index(tmp_path, monkeypatch):
+    touch(str(tmp_path / "a.safetensors"))
+    touch(str(tmp_path / "b.txt"))
+    monkeypatch.setattr(folder_paths, "folder_names_and_paths", {"loras": ([str(tmp_path)], {".safetensors"})})
+    monkeypatch.setattr(folder_paths, "filename_list_cache", {})
+    monkeypatch.setattr(folder_paths, "model_file_index", None)
+    folder_paths.enable_model_file_index(use_watchdog=False)
+    assert folder_paths.get_filename_list("loras") == ["a.safetensors"]
+
+    touch(str(tmp_path / "c.safetensors"))
+    bump_mtime(str(tmp_path))
+    assert folder_paths.get_filename_list("loras") == ["a.safetensors"]
+    folder_paths.model_file_index.update(poll=True)
+    assert folder_paths.get_filename_list("loras") == ["a.safetensors", "c.safetensors"]
+
+
+def test_model_manager_uses_index(tmp_path, monkeypatch):
+    touch(str(tmp_path / "a.safetensors"), b"12")
+    touch(str(tmp_path / ".hidden" / "b.safetensors"))
+    monkeypatch.setattr(folder_paths, "folder_names_and_paths", {"loras": ([str(tmp_path)], {".safetensors"})})
+    monkeypatch.setattr(folder_paths, "model_file_index", ModelFileIndex(use_watchdog=False))
+    files = ModelFileManager().get_model_file_list("loras")
+    assert [(f["name"], f["pathIndex"], f["size"]) for f in files] == [("a.safetensors", 0, 2)]
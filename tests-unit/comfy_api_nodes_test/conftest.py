@@ -0,0 +1,9 @@
+import pytest
+
+import folder_paths
+
+
+@pytest.fixture(autouse=True)
+def temp_directory(tmp_path, monkeypatch):
+    """The API node helpers log every request to temp/api_logs, keep those logs out of the repo."""
+    monkeypatch.setattr(folder_paths, "temp_directory", str(tmp_path / "temp"))
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+import torch
+from aiohttp import web
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import utils.install_util  # noqa: F401 imported before nodes puts comfy/ first on sys.path
+from comfy_api_nodes.util import client
+from comfy_api_nodes.util.client import ApiEndpoint, CompletionNotifier, _parse_retry_after, poll_op_raw
+
+
+class StubNode:
+    class hidden:
+        unique_id = "1"
+        auth_token_comfy_org = None
+        api_key_comfy_org = None
+
+
+class FakeProvider:
+    """Reports the task pending until complete() is called, optionally asking for a Retry-After."""
+
+    def __init__(self, retry_after=None, retry_after_header="Retry-After"):
+        self.done = False
+        self.polls = []
+        self.retry_after = retry_after
+        self.retry_after_header = retry_after_header
+
+    def complete(self):
+        self.done = True
+
+    async def status(self, request):
+        self.polls.append(time.monotonic())
+        headers = {}
+        if self.retry_after is not None and not self.done:
+            headers[self.retry_after_header] = self.retry_after
+        return web.json_response({"status": "completed" if self.done else "processing"}, headers=headers)
+
+
+def run_poll(provider, before_poll=None, **kwargs):
+    async def main():
+        app = web.Application()
+        app.router.add_get("/status", provider.status)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        try:
+            if before_poll is not None:
+                before_poll()
+            start = time.monotonic()
+            result = await poll_op_raw(
+                StubNode,
+                ApiEndpoint(f"http://127.0.0.1:{runner.addresses[0][1]}/status"),
+                status_extractor=lambda r: r["status"],
+                **kwargs,
+            )
+            return result, time.monotonic() - start
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def no_progress_display(monkeypatch):
+    monkeypatch.setattr(client, "_display_time_progress", lambda *a, **k: None)
+
+
+def test_first_polls_are_fast():
+    provider = FakeProvider()
+    threading.Timer(0.3, provider.complete).start()
+    result, elapsed = run_poll(provider, poll_interval=5.0, initial_poll_interval=0.05)
+    assert result == {"status": "completed"}
+    # A fixed 5s interval would only notice the completion after 5s
+    assert elapsed < 2.0
+    gaps = [b - a for a, b in zip(provider.polls, provider.polls[1:])]
+    assert gaps[-1] > gaps[0]
+
+
+@pytest.mark.parametrize("header", ["Retry-After", "retry-after"])
+def test_retry_after_is_honored(header):
+    provider = FakeProvider(retry_after="1", retry_after_header=header)
+    result, elapsed = run_poll(provider, before_poll=lambda: threading.Timer(0.1, provider.complete).start(), poll_interval=5.0, initial_poll_interval=0.05)
+    assert result == {"status": "completed"}
+    assert len(provider.polls) == 2
+    assert provider.polls[1] - provider.polls[0] >= 0.9
+
+
+def test_notifier_wakes_up_polling():
+    provider = FakeProvider()
+    notifier = CompletionNotifier()
+
+    def webhook():
+        provider.complete()
+        notifier.notify()
+
+    result, elapsed = run_poll(
+        provider,
+        before_poll=lambda: threading.Timer(0.3, webhook).start(),
+        poll_interval=30.0,
+        initial_poll_interval=30.0,
+        completion_notifier=notifier,
+    )
+    assert result == {"status": "completed"}
+    assert len(provider.polls) == 2
+    assert elapsed < 5.0
+
+
+def test_parse_retry_after():
+    assert _parse_retry_after(None) is None
+    assert _parse_retry_after("3") == 3.0
+    assert _parse_retry_after("garbage") is None
+    assert 55 < _parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
@@ -0,0 +1,91 @@
+import asyncio
+from io import BytesIO
+
+import torch
+from aiohttp import web
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import utils.install_util  # noqa: F401 imported before nodes puts comfy/ first on sys.path
+from comfy_api_nodes.util import _helpers, client
+from comfy_api_nodes.util.client import ApiEndpoint, poll_op_raw, sync_op_raw
+from comfy_api_nodes.util.download_helpers import download_url_to_bytesio
+from comfy_api_nodes.util.upload_helpers import upload_file
+
+
+class StubNode:
+    class hidden:
+        unique_id = "1"
+        auth_token_comfy_org = None
+        api_key_comfy_org = None
+
+
+def stub_app(connections):
+    """An API that creates a task, reports it pending twice and then returns its result."""
+    polls = []
+
+    def track(request):
+        connections.add(request.transport.get_extra_info("peername"))
+
+    async def create(request):
+        track(request)
+        return web.json_response({"id": "task"})
+
+    async def status(request):
+        track(request)
+        polls.append(1)
+        return web.json_response({"status": "completed" if len(polls) >= 3 else "pending"})
+
+    async def upload(request):
+        track(request)
+        await request.read()
+        return web.Response()
+
+    async def result(request):
+        track(request)
+        return web.Response(body=b"result")
+
+    app = web.Application()
+    app.router.add_post("/create", create)
+    app.router.add_get("/status", status)
+    app.router.add_put("/upload", upload)
+    app.router.add_get("/result", result)
+    return app
+
+
+async def run_job(base_url):
+    await upload_file(StubNode, base_url + "/upload", BytesIO(b"input"))
+    await sync_op_raw(StubNode, ApiEndpoint(base_url + "/create", "POST"), monitor_progress=False)
+    await poll_op_raw(StubNode, ApiEndpoint(base_url + "/status"), status_extractor=lambda r: r["status"], poll_interval=0.01)
+    out = BytesIO()
+    await download_url_to_bytesio(base_url + "/result", out)
+    return out.getvalue()
+
+
+def test_job_reuses_one_connection(monkeypatch):
+    monkeypatch.setattr(client, "_display_time_progress", lambda *a, **k: None)
+    connections = set()
+
+    async def main():
+        runner = web.AppRunner(stub_app(connections))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            result = await run_job(f"http://127.0.0.1:{port}")
+            session = await _helpers.get_session()
+            assert await _helpers.get_session() is session
+            return result, session
+        finally:
+            await runner.cleanup()
+
+    result, session = asyncio.run(main())
+    assert result == b"result"
+    # upload, create, three polls and the download over a single kept alive connection
+    assert len(connections) == 1
+    # The session is closed together with its event loop
+    assert session.closed
+    assert _helpers._SESSIONS == {}
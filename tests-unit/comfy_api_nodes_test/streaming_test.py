@@ -0,0 +1,131 @@
+import asyncio
+import os
+from io import BytesIO
+
+import numpy as np
+import torch
+from aiohttp import web
+from PIL import Image
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import utils.install_util  # noqa: F401 imported before nodes puts comfy/ first on sys.path
+import folder_paths
+from comfy_api_nodes.util.conversions import bytesio_to_image_tensor
+from comfy_api_nodes.util.download_helpers import download_url_to_image_tensor, download_url_to_video_output
+from comfy_api_nodes.util.upload_helpers import upload_file, upload_images_to_comfyapi
+
+
+class StubNode:
+    class hidden:
+        unique_id = "1"
+        auth_token_comfy_org = None
+        api_key_comfy_org = None
+
+
+def png_bytes():
+    image = Image.fromarray((np.random.rand(64, 48, 4) * 255).astype(np.uint8))
+    out = BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def run_with_server(routes, job):
+    async def main():
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_routes(routes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        try:
+            return await job(f"http://127.0.0.1:{runner.addresses[0][1]}")
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_upload_streams_with_content_length(tmp_path):
+    received = []
+
+    async def put(request):
+        received.append((request.headers.get("Content-Length"), request.headers.get("Transfer-Encoding"), await request.read()))
+        return web.Response()
+
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    path = tmp_path / "video.mp4"
+    path.write_bytes(data)
+    buffer = BytesIO(b"small")
+
+    async def job(base_url):
+        await upload_file(StubNode, base_url + "/upload", str(path))
+        await upload_file(StubNode, base_url + "/upload", buffer)
+
+    run_with_server([web.put("/upload", put)], job)
+    assert received == [(str(len(data)), None, data), ("5", None, b"small")]
+    # The buffer is released after the upload
+    buffer.write(b"more")
+
+
+def test_upload_images_in_order(monkeypatch):
+    uploads = {}
+
+    async def storage(request):
+        name = (await request.json())["file_name"]
+        base_url = f"http://{request.host}"
+        return web.json_response({"upload_url": f"{base_url}/upload/{name}", "download_url": f"{base_url}/files/{name}"})
+
+    async def put(request):
+        uploads[request.match_info["name"]] = await request.read()
+        return web.Response()
+
+    images = torch.rand(3, 16, 16, 3)
+
+    async def job(base_url):
+        monkeypatch.setattr(args, "comfy_api_base", base_url)
+        return await upload_images_to_comfyapi(StubNode, images, wait_label=None)
+
+    urls = run_with_server([web.post("/customers/storage", storage), web.put("/upload/{name}", put)], job)
+    names = [url.rsplit("/", 1)[1] for url in urls]
+    assert sorted(names) == sorted(uploads.keys())
+    for i, name in enumerate(names):
+        decoded = bytesio_to_image_tensor(BytesIO(uploads[name]), mode="RGB")
+        assert torch.allclose(decoded[0], images[i], atol=1 / 255)
+
+
+def test_download_image_decodes_while_streaming():
+    data = png_bytes()
+
+    async def get(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for i in range(0, len(data), 1000):
+            await response.write(data[i:i + 1000])
+        return response
+
+    async def job(base_url):
+        return await download_url_to_image_tensor(base_url + "/image.png")
+
+    tensor = run_with_server([web.get("/image.png", get)], job)
+    assert torch.equal(tensor, bytesio_to_image_tensor(BytesIO(data)))
+
+
+def test_download_video_to_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "temp_directory", str(tmp_path / "temp"))
+    data = os.urandom(100000)
+
+    async def get(request):
+        return web.Response(body=data)
+
+    async def job(base_url):
+        return await download_url_to_video_output(base_url + "/result.webm")
+
+    video = run_with_server([web.get("/result.webm", get)], job)
+    path = video.get_stream_source()
+    assert os.path.dirname(path) == str(tmp_path / "temp")
+    assert path.endswith(".webm")
+    with open(path, "rb") as f:
+        assert f.read() == data
@@ -0,0 +1,98 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from unittest.mock import patch, MagicMock
+
+import folder_paths
+from comfy.cli_args import args
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_extras import nodes_dataset
+    from comfy_extras.nodes_dataset import LoadImageDataSetFromFolderNode, LoadImageTextDataSetFromFolderNode
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "input_directory", str(tmp_path))
+    monkeypatch.setattr(nodes_dataset, "_decoded_cache", type(nodes_dataset._decoded_cache)())
+    monkeypatch.setattr(nodes_dataset, "_decoded_cache_bytes", 0)
+    folder = tmp_path / "set"
+    folder.mkdir()
+    rng = np.random.default_rng(0)
+    for i, (w, h) in enumerate([(64, 32), (40, 80), (50, 50)]):
+        Image.fromarray(rng.integers(0, 255, (h, w, 3), dtype=np.uint8)).save(folder / f"{i}.png")
+    Image.fromarray(rng.integers(0, 255, (96, 128, 3), dtype=np.uint8)).save(folder / "3.jpg", quality=95)
+    (folder / "1.txt").write_text("a caption")
+    return folder
+
+
+def test_loads_in_order(dataset):
+    images = LoadImageDataSetFromFolderNode.execute("set").result[0]
+    files = [f for f in os.listdir(dataset) if not f.endswith(".txt")]
+    assert len(images) == 4
+    for file, image in zip(files, images):
+        expected = np.array(Image.open(dataset / file).convert("RGB")).astype(np.float32) / 255.0
+        assert torch.equal(image, torch.from_numpy(expected)[None,])
+
+
+def test_resize_and_crop_while_loading(dataset):
+    images, texts = LoadImageTextDataSetFromFolderNode.execute("set", shorter_edge=16).result
+    files = [f for f in os.listdir(dataset) if not f.endswith(".txt")]
+    shapes = {f: tuple(img.shape) for f, img in zip(files, images)}
+    assert shapes == {"0.png": (1, 16, 32, 3), "1.png": (1, 32, 16, 3), "2.png": (1, 16, 16, 3), "3.jpg": (1, 16, 21, 3)}
+    assert texts[files.index("1.png")] == "a caption"
+
+    images = LoadImageDataSetFromFolderNode.execute("set", shorter_edge=16, center_crop=True).result[0]
+    assert all(tuple(img.shape) == (1, 16, 16, 3) for img in images)
+
+
+def count_opened(monkeypatch):
+    opened = []
+    pillow = nodes_dataset.node_helpers.pillow
+    monkeypatch.setattr(nodes_dataset.node_helpers, "pillow", lambda fn, path: opened.append(os.path.basename(path)) or pillow(fn, path))
+    return opened
+
+
+def available_ram(monkeypatch, gb):
+    monkeypatch.setattr(nodes_dataset.psutil, "virtual_memory", lambda: SimpleNamespace(available=gb * 1024**3))
+
+
+def test_decoded_images_are_cached(dataset, monkeypatch):
+    monkeypatch.setattr(args, "cache_ram", 4.0)
+    available_ram(monkeypatch, 16)
+    LoadImageDataSetFromFolderNode.execute("set")
+    opened = count_opened(monkeypatch)
+
+    LoadImageDataSetFromFolderNode.execute("set")
+    assert opened == []
+
+    Image.new("RGB", (8, 8)).save(dataset / "2.png")
+    os.utime(dataset / "2.png", ns=(1, 1))
+    images = LoadImageDataSetFromFolderNode.execute("set").result[0]
+    assert opened == ["2.png"]
+    assert any(tuple(img.shape) == (1, 8, 8, 3) for img in images)
+
+
+def test_decoded_images_not_cached_by_default(dataset, monkeypatch):
+    monkeypatch.setattr(args, "cache_ram", 0)
+    LoadImageDataSetFromFolderNode.execute("set")
+    assert len(nodes_dataset._decoded_cache) == 0
+
+
+def test_decoded_cache_freed_under_ram_pressure(dataset, monkeypatch):
+    monkeypatch.setattr(args, "cache_ram", 4.0)
+    available_ram(monkeypatch, 16)
+    LoadImageDataSetFromFolderNode.execute("set")
+    assert len(nodes_dataset._decoded_cache) == 4
+
+    available_ram(monkeypatch, 2)
+    Image.new("RGB", (8, 8)).save(dataset / "2.png")
+    os.utime(dataset / "2.png", ns=(1, 1))
+    LoadImageDataSetFromFolderNode.execute("set")
+    assert len(nodes_dataset._decoded_cache) == 0
+    assert nodes_dataset._decoded_cache_bytes == 0
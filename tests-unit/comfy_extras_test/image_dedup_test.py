@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import torch
+from unittest.mock import patch, MagicMock
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_extras.nodes_dataset import ImageDeduplicationNode, average_hashes, deduplicate_hashes
+
+
+def reference_dedup(hashes, max_distance):
+    """The pairwise loop the node used to run."""
+    values = hashes.tolist()
+    keep = []
+    for i, h in enumerate(values):
+        if not any((h ^ values[j]).bit_count() <= max_distance for j in keep):
+            keep.append(i)
+    return keep
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 7, 8, 20])
+def test_matches_pairwise_loop(max_distance):
+    rng = np.random.default_rng(max_distance)
+    base = rng.integers(0, 1 << 63, size=300, dtype=np.uint64) * np.uint64(2) + rng.integers(0, 2, size=300, dtype=np.uint64)
+    # Near copies with a few flipped bits
+    flips = [np.uint64(sum(1 << int(b) for b in rng.choice(64, size=rng.integers(0, 12), replace=False))) for _ in range(300)]
+    hashes = np.concatenate([base, base ^ np.array(flips, dtype=np.uint64)])
+    rng.shuffle(hashes)
+
+    keep, duplicates = deduplicate_hashes(hashes, max_distance)
+    assert keep == reference_dedup(hashes, max_distance)
+    for i, j, distance in duplicates:
+        assert j < i and j in keep
+        assert int(hashes[i] ^ hashes[j]).bit_count() == distance <= max_distance
+
+
+def test_average_hash_batches_by_size():
+    torch.manual_seed(0)
+    a = torch.rand(1, 64, 48, 3)
+    b = torch.rand(1, 32, 32, 3)
+    hashes = average_hashes([a, b, a.clone(), b[0], torch.rand(1, 64, 48, 3)])
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[2]
+    assert hashes[1] == hashes[3]
+    assert hashes[0] != hashes[4]
+
+
+def test_node_removes_duplicates():
+    torch.manual_seed(0)
+    images = [torch.rand(1, 32, 32, 3) for _ in range(4)]
+    near_copy = (images[1] + 0.001).clamp(0, 1)
+    out = ImageDeduplicationNode._group_process(images + [images[0], near_copy], 0.95)
+    assert len(out) == 4
+    assert all(o is i for o, i in zip(out, images))
+    assert ImageDeduplicationNode._group_process([], 0.95) == []
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+from unittest.mock import patch, MagicMock
+
+from comfy_execution.utils import CurrentNodeContext
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_extras.nodes_prompt_batching import PromptBatchSeeds, save_member_images, stack_conditioning_batches
+
+
+class TestStackConditioning:
+    def test_stacks_batches(self):
+        a = [[torch.zeros(1, 77, 8), {"pooled_output": torch.zeros(1, 8)}]]
+        b = [[torch.ones(1, 77, 8), {"pooled_output": torch.ones(1, 8)}]]
+        cond, options = stack_conditioning_batches(a, b)[0]
+        assert cond.shape == (2, 77, 8)
+        assert torch.equal(cond[1], b[0][0][0])
+        assert options["pooled_output"].shape == (2, 8)
+
+    def test_pads_different_lengths(self):
+        a = [[torch.zeros(1, 77, 8), {}]]
+        b = [[torch.ones(1, 154, 8), {}]]
+        cond, _ = stack_conditioning_batches(a, b)[0]
+        assert cond.shape == (2, 154, 8)
+        assert torch.equal(cond[0, 77:], a[0][0][0])
+
+    def test_mismatched_options(self):
+        a = [[torch.zeros(1, 77, 8), {"strength": 1.0}]]
+        b = [[torch.zeros(1, 77, 8), {"strength": 0.5}]]
+        with pytest.raises(ValueError):
+            stack_conditioning_batches(a, b)
+
+
+class TestBatchSeeds:
+    def test_seed_per_latent(self):
+        latent = {"samples": torch.zeros(3, 4, 8, 8)}
+        out = PromptBatchSeeds.execute(latent, "1,2,3")
+        assert out[0]["batch_seeds"] == [1, 2, 3]
+        assert "batch_seeds" not in latent
+
+    def test_wrong_count(self):
+        with pytest.raises(ValueError):
+            PromptBatchSeeds.execute({"samples": torch.zeros(2, 4, 8, 8)}, "1")
+
+
+class FakeSaver:
+    def __init__(self):
+        self.calls = []
+
+    def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
+        self.calls.append((len(images), prompt, extra_pnginfo))
+        return {"ui": {"images": [{"filename": "{}_{}.png".format(filename_prefix, len(self.calls))} for _ in images]}}
+
+
+class TestSaveMemberImages:
+    def save(self, images, members):
+        saver = FakeSaver()
+        batching = SimpleNamespace(batch_members={"merged": members})
+        with patch.dict('sys.modules', {'comfy_execution.batching': batching}), CurrentNodeContext("merged", "9"):
+            results = save_member_images(saver, images, "ComfyUI", {"merged": True}, {"workflow": "merged"})
+        return saver.calls, results
+
+    def test_metadata_of_each_prompt(self):
+        members = [({"prompt": 0}, {"workflow": 0}), ({"prompt": 1}, None)]
+        calls, ui = self.save(torch.zeros(4, 8, 8, 3), members)
+        assert calls == [(2, {"prompt": 0}, {"workflow": 0}), (2, {"prompt": 1}, None)]
+        assert len(ui["images"]) == 4
+        assert ui["prompt_slices"] == [[0, 2], [2, 4]]
+
+    def test_uneven_batch_keeps_merged_metadata(self):
+        calls, ui = self.save(torch.zeros(3, 8, 8, 3), [({}, None), ({}, None)])
+        assert calls == [(3, {"merged": True}, {"workflow": "merged"})]
+        assert len(ui["images"]) == 3
+        assert ui["prompt_slices"] == [[0, 3], [0, 3]]
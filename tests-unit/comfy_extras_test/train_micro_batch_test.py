@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+import pytest
+import safetensors.torch
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_management
+import comfy.utils
+from comfy_extras.nodes_train import TrainSampler, _prepare_latents_and_count
+
+
+class FakeModelWrap:
+    """Predicts x0 by scaling xt with a trained weight, failing batches larger than max_batch like a full GPU."""
+
+    def __init__(self, weight, num_images, max_batch=None):
+        self.weight = weight
+        self.max_batch = max_batch
+        self.batch_sizes = []
+        self.inner_model = SimpleNamespace(model_sampling=SimpleNamespace(
+            noise_scaling=lambda sigma, noise, latent, max_denoise: latent + sigma.reshape(-1, 1, 1, 1) * noise,
+            percent_to_sigma=lambda percent: 1.0 - percent,
+        ))
+        self.conds = {"positive": [{"model_conds": {}} for _ in range(num_images)]}
+
+    def __call__(self, xt, sigmas, **kwargs):
+        self.batch_sizes.append(xt.shape[0])
+        if self.max_batch is not None and xt.shape[0] > self.max_batch:
+            raise comfy.model_management.OOM_EXCEPTION("out of memory")
+        return xt * self.weight
+
+
+def train(micro_batch_size, max_batch=None, metrics_callback=None, grad_acc=1):
+    torch.manual_seed(0)
+    latents = torch.randn(8, 4, 8, 8)
+    lora_sd = {"weight": torch.nn.Parameter(torch.ones(1))}
+    optimizer = torch.optim.AdamW(lora_sd.values(), lr=0.01)
+    losses = []
+    sampler = TrainSampler(
+        torch.nn.MSELoss(),
+        optimizer,
+        loss_callback=losses.append,
+        batch_size=4,
+        grad_acc=grad_acc,
+        total_steps=5 * grad_acc,
+        seed=3,
+        training_dtype=torch.float32,
+        micro_batch_size=micro_batch_size,
+        metrics_callback=metrics_callback,
+    )
+    model_wrap = FakeModelWrap(lora_sd["weight"], len(latents), max_batch=max_batch)
+    sampler.sample(model_wrap, torch.arange(len(latents)), {}, None, None, latent_image=latents)
+    return lora_sd["weight"].detach().clone(), losses, model_wrap.batch_sizes, sampler
+
+
+@pytest.mark.parametrize("grad_acc", [1, 2])
+def test_micro_batches_match_full_batch(grad_acc):
+    weight, losses, batch_sizes, _ = train(4, grad_acc=grad_acc)
+    assert set(batch_sizes) == {4}
+    for micro_batch_size, expected_sizes in ((1, {1}), (3, {3, 1})):
+        micro_weight, micro_losses, micro_batch_sizes, _ = train(micro_batch_size, grad_acc=grad_acc)
+        assert set(micro_batch_sizes) == expected_sizes
+        assert torch.allclose(micro_weight, weight, atol=1e-6)
+        assert micro_losses == pytest.approx(losses, rel=1e-5)
+
+
+def test_auto_micro_batch_shrinks_on_out_of_memory():
+    weight, losses, _, _ = train(4)
+    auto_weight, auto_losses, batch_sizes, sampler = train(0, max_batch=2)
+    assert sampler.micro_batch_size == 2
+    # Only the first step ran out of memory, its partial gradients were discarded
+    assert batch_sizes[:3] == [4, 2, 2]
+    assert set(batch_sizes[3:]) == {2}
+    assert torch.allclose(auto_weight, weight, atol=1e-6)
+    assert auto_losses == pytest.approx(losses, rel=1e-5)
+
+
+def test_fixed_micro_batch_raises_out_of_memory():
+    with pytest.raises(comfy.model_management.OOM_EXCEPTION):
+        train(4, max_batch=2)
+
+
+def test_metrics_report_throughput():
+    reported = []
+    train(2, metrics_callback=lambda step, metrics: reported.append((step, metrics)), grad_acc=2)
+    assert [step for step, _ in reported] == [1, 2, 3, 4, 5]
+    for _, metrics in reported:
+        assert metrics["micro_batch_size"] == 2
+        assert metrics["samples_per_sec"] > 0
+        # 4 samples of 8x8 latent positions per micro step, two micro steps per optimizer step
+        assert metrics["tokens_per_sec"] == pytest.approx(metrics["samples_per_sec"] * 64)
+
+
+def test_memory_mapped_latents_are_read_per_sample(tmp_path):
+    latents = torch.randn(3, 4, 8, 8)
+    path = str(tmp_path / "shard.safetensors")
+    safetensors.torch.save_file({str(i): latents[i:i + 1].clone() for i in range(3)}, path)
+    tensors, _ = comfy.utils.load_safetensors(path)
+    mapped = [tensors[str(i)] for i in range(3)]
+
+    # Same shaped samples are not concatenated in RAM when they are memory mapped
+    prepared, num_images, multi_res = _prepare_latents_and_count(mapped, torch.float32, False)
+    assert multi_res
+    assert num_images == 3
+    sample = prepared[1]
+    assert torch.equal(sample, latents[1:2])
+    # Training can't write into the read only mapping
+    sample += 1
+    assert torch.equal(mapped[1], latents[1:2])
+
+    prepared, _, multi_res = _prepare_latents_and_count([latents[i:i + 1] for i in range(3)], torch.float32, False)
+    assert not multi_res
+    assert torch.equal(prepared, latents)
@@ -0,0 +1,91 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths
+from comfy_extras import nodes_train
+from comfy_extras.nodes_train import TrainSampler
+
+
+class FakeModelWrap:
+    """Predicts x0 by scaling xt with a trained weight, enough for TrainSampler's loop."""
+
+    def __init__(self, weight, num_images):
+        self.weight = weight
+        self.inner_model = SimpleNamespace(model_sampling=SimpleNamespace(
+            noise_scaling=lambda sigma, noise, latent, max_denoise: latent + sigma.reshape(-1, 1, 1, 1) * noise,
+            percent_to_sigma=lambda percent: 1.0 - percent,
+        ))
+        self.conds = {"positive": [{"model_conds": {}} for _ in range(num_images)]}
+
+    def __call__(self, xt, sigmas, **kwargs):
+        return xt * self.weight
+
+
+def train(tmp_path, steps, crash_at=None, resume=False, grad_acc=1):
+    """Trains the fake model, optionally crashing at a step or resuming from the last checkpoint."""
+    torch.manual_seed(0)
+    latents = torch.randn(6, 4, 8, 8)
+    lora_sd = {"weight": torch.nn.Parameter(torch.ones(1))}
+    optimizer = torch.optim.AdamW(lora_sd.values(), lr=0.01)
+    path = str(tmp_path / "checkpoint.pt")
+    losses = []
+
+    def loss_callback(loss):
+        if crash_at is not None and len(losses) == crash_at:
+            raise RuntimeError("preempted")
+        losses.append(loss)
+
+    start_step, rng_state = 0, None
+    if resume:
+        start_step, rng_state, losses[:] = nodes_train._load_training_checkpoint(path, lora_sd, optimizer, {})
+    # Initialization after the checkpoint state was taken must not matter on resume
+    torch.rand(100)
+
+    sampler = TrainSampler(
+        torch.nn.MSELoss(),
+        optimizer,
+        loss_callback=loss_callback,
+        batch_size=2,
+        grad_acc=grad_acc,
+        total_steps=steps * grad_acc,
+        seed=3,
+        training_dtype=torch.float32,
+        start_step=start_step,
+        rng_state=rng_state,
+        checkpoint_every=2,
+        checkpoint_callback=lambda step: nodes_train._save_training_checkpoint(path, step, lora_sd, optimizer, losses, {}),
+    )
+    model_wrap = FakeModelWrap(lora_sd["weight"], len(latents))
+    sampler.sample(model_wrap, torch.arange(len(latents)), {}, None, None, latent_image=latents)
+    return lora_sd["weight"].detach().clone(), list(losses)
+
+
+@pytest.mark.parametrize("grad_acc", [1, 2])
+def test_resume_matches_uninterrupted_run(tmp_path, grad_acc):
+    weight, losses = train(tmp_path / "full", 7, grad_acc=grad_acc)
+
+    with pytest.raises(RuntimeError, match="preempted"):
+        train(tmp_path / "resumed", 7, crash_at=5 * grad_acc, grad_acc=grad_acc)
+    state = torch.load(str(tmp_path / "resumed" / "checkpoint.pt"), weights_only=True)
+    assert state["step"] == 4 * grad_acc
+    assert not os.path.exists(str(tmp_path / "resumed" / "checkpoint.pt.tmp"))
+
+    resumed_weight, resumed_losses = train(tmp_path / "resumed", 7, resume=True, grad_acc=grad_acc)
+    assert torch.equal(resumed_weight, weight)
+    assert resumed_losses == losses
+    # The last step is always checkpointed
+    assert torch.load(str(tmp_path / "resumed" / "checkpoint.pt"), weights_only=True)["step"] == 7 * grad_acc
+
+
+def test_checkpoint_path_stays_in_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "output_directory", str(tmp_path))
+    assert nodes_train._training_checkpoint_path("run") == str(tmp_path / "training_checkpoints" / "run" / "checkpoint.pt")
+    with pytest.raises(ValueError):
+        nodes_train._training_checkpoint_path("../../elsewhere")
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+import torch
+from unittest.mock import patch, MagicMock
+
+import folder_paths
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_extras.nodes_dataset import LoadTrainingDataset, SaveTrainingDataset
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "output_directory", str(tmp_path))
+    return tmp_path
+
+
+def make_dataset(count):
+    base = torch.randn(count, 4, 8, 8)
+    latents = [{"samples": base[i:i + 1]} for i in range(count)]
+    latents[-1] = {"samples": torch.randn(1, 4, 16, 8).to(torch.bfloat16)}
+    conditioning = [
+        [[torch.randn(1, 77, 16), {"pooled_output": torch.randn(1, 16), "guidance": 3.5, "lengths": [1, 2]}]]
+        for _ in range(count)
+    ]
+    return latents, conditioning
+
+
+def test_save_and_load_roundtrip(output_dir):
+    latents, conditioning = make_dataset(5)
+    SaveTrainingDataset.execute(latents, conditioning, ["dataset"], [2])
+
+    files = sorted(os.listdir(output_dir / "dataset"))
+    assert files == ["metadata.json", "shard_0000.safetensors", "shard_0001.safetensors", "shard_0002.safetensors"]
+    metadata = json.loads((output_dir / "dataset" / "metadata.json").read_text())
+    assert metadata["num_samples"] == 5
+    assert [s["shard"] for s in metadata["samples"]] == [0, 0, 1, 1, 2]
+    assert metadata["samples"][-1]["shape"] == [1, 4, 16, 8]
+    assert metadata["samples"][-1]["bucket"] == [16, 8]
+
+    out = LoadTrainingDataset.execute("dataset")
+    loaded_latents, loaded_conditioning = out.result
+    assert len(loaded_latents) == len(loaded_conditioning) == 5
+    for latent, loaded in zip(latents, loaded_latents):
+        assert loaded["samples"].dtype == latent["samples"].dtype
+        assert torch.equal(loaded["samples"], latent["samples"])
+    for cond, loaded in zip(conditioning, loaded_conditioning):
+        assert torch.equal(loaded[0][0], cond[0][0])
+        assert torch.equal(loaded[0][1]["pooled_output"], cond[0][1]["pooled_output"])
+        assert loaded[0][1]["guidance"] == 3.5
+        assert loaded[0][1]["lengths"] == [1, 2]
+
+
+def test_load_pickled_shards(output_dir):
+    latents, conditioning = make_dataset(3)
+    os.makedirs(output_dir / "old")
+    torch.save({"latents": latents, "conditioning": conditioning}, str(output_dir / "old" / "shard_0000.pkl"))
+    (output_dir / "old" / "metadata.json").write_text(json.dumps({"num_samples": 3, "num_shards": 1, "shard_size": 1000}))
+
+    loaded_latents, loaded_conditioning = LoadTrainingDataset.execute("old").result
+    assert len(loaded_latents) == 3
+    assert torch.equal(loaded_latents[0]["samples"], latents[0]["samples"])
+
+
+def test_unsupported_conditioning_value(output_dir):
+    latents, conditioning = make_dataset(1)
+    conditioning[0][0][1]["control"] = object()
+    with pytest.raises(ValueError, match="control"):
+        SaveTrainingDataset.execute(latents, conditioning, ["dataset"], [2])
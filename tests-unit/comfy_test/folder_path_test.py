@@ -116,6 +116,59 @@ def test_get_save_image_path(temp_dir):
         assert filename_prefix == "test"
 
 
+def test_save_image_path_counter(temp_dir):
+    for name in ["test_00003_.png", "test_00007_.latent", "test_ab_.png", "test_extra_00009_.png", "other_00020_custom.bin"]:
+        open(os.path.join(temp_dir, name), "w").close()
+    registry = folder_paths.SaveCounterRegistry()
+    assert registry.allocate(temp_dir, "test") == 8
+    assert registry.allocate(temp_dir, "test") == 9
+    assert registry.allocate(temp_dir, "test_extra") == 10
+    assert registry.allocate(temp_dir, "new") == 1
+
+    # A node that saved a batch used more counters than it was given
+    for counter in range(10, 13):
+        open(os.path.join(temp_dir, f"test_{counter:05}_.png"), "w").close()
+    assert registry.allocate(temp_dir, "test") == 13
+    # Files with endings only seen in the folder are checked too
+    open(os.path.join(temp_dir, "other_00021_custom.bin"), "w").close()
+    assert registry.allocate(temp_dir, "other") == 22
+
+    subfolder = os.path.join(temp_dir, "sub")
+    assert registry.allocate(subfolder, "test") == 1
+    assert os.path.isdir(subfolder)
+
+
+def test_save_counters_claimed_across_processes(temp_dir):
+    # Two workers with their own registries, neither has written its files yet
+    first, second = folder_paths.SaveCounterRegistry(), folder_paths.SaveCounterRegistry()
+    assert first.allocate(temp_dir, "test", count=3) == 1
+    assert second.allocate(temp_dir, "test") == 4
+    assert first.allocate(temp_dir, "test") == 5
+    assert second.allocate(temp_dir, "test", count=2) == 6
+
+    # Old claims are removed once their files exist
+    lock_dir = os.path.join(temp_dir, folder_paths.SAVE_COUNTER_LOCK_DIR)
+    for name in os.listdir(lock_dir):
+        os.utime(os.path.join(lock_dir, name), (0, 0))
+    open(os.path.join(temp_dir, "test_00001_.png"), "w").close()
+    assert folder_paths.SaveCounterRegistry().allocate(temp_dir, "test") == 2
+    # Counters whose files exist are not left claimed
+    assert sorted(os.listdir(lock_dir)) == ["test_00002"]
+
+
+def test_save_counter_claims_pruned_while_running(temp_dir, monkeypatch):
+    registry = folder_paths.SaveCounterRegistry()
+    for counter in range(1, 4):
+        assert registry.allocate(temp_dir, "test") == counter
+    lock_dir = os.path.join(temp_dir, folder_paths.SAVE_COUNTER_LOCK_DIR)
+    for name in os.listdir(lock_dir):
+        os.utime(os.path.join(lock_dir, name), (0, 0))
+
+    monkeypatch.setattr(folder_paths, "SAVE_COUNTER_PRUNE_INTERVAL", 0)
+    assert registry.allocate(temp_dir, "test") == 4
+    assert os.listdir(lock_dir) == ["test_00004"]
+
+
 def test_base_path_changes(set_base_dir):
     test_dir = os.path.abspath("/test/dir")
     set_base_dir(test_dir)
@@ -0,0 +1,345 @@
+import asyncio
+from types import SimpleNamespace
+from typing import NamedTuple
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+import pytest
+import torch
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_execution import caching
+    from comfy_execution.graph import DynamicPrompt
+
+
+class CacheEntry(NamedTuple):
+    ui: dict
+    outputs: list
+
+
+class FakeIsChangedCache:
+    async def get(self, node_id):
+        return False
+
+
+class EncodeNode:
+    RETURN_TYPES = ("CONDITIONING",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"text": ("STRING",)}}
+
+
+class ModelNode:
+    RETURN_TYPES = ("MODEL",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"name": (["model.safetensors"],)}}
+
+
+@pytest.fixture(autouse=True)
+def fake_nodes(monkeypatch):
+    mappings = {"EncodeNode": EncodeNode, "ModelNode": ModelNode}
+    monkeypatch.setattr(caching, "nodes", SimpleNamespace(NODE_CLASS_MAPPINGS=mappings))
+    monkeypatch.setattr(caching, "NODE_CLASS_CONTAINS_UNIQUE_ID", {})
+    monkeypatch.setattr(caching, "_NODE_CLASS_VERSIONS", {})
+
+
+def make_prompt(text="a cat"):
+    return {
+        "1": {"class_type": "EncodeNode", "inputs": {"text": text}},
+        "2": {"class_type": "ModelNode", "inputs": {"name": "model.safetensors"}},
+    }
+
+
+def make_cache(directory, max_size=1024**3):
+    inner = caching.HierarchicalCache(caching.CacheKeySetInputSignature)
+    return caching.DiskCache(inner, str(directory), max_size, CacheEntry)
+
+
+def set_prompt(cache, prompt):
+    asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), FakeIsChangedCache()))
+
+
+class TestSignatureDigest:
+    def test_stable_for_equal_signatures(self):
+        a = caching.to_hashable(["EncodeNode", {"text": "a", "clip": ["x", 0]}])
+        b = caching.to_hashable(["EncodeNode", {"clip": ["x", 0], "text": "a"}])
+        assert caching.signature_digest(a) == caching.signature_digest(b)
+
+    def test_differs_for_different_inputs(self):
+        a = caching.to_hashable(["EncodeNode", {"text": "a"}])
+        b = caching.to_hashable(["EncodeNode", {"text": "b"}])
+        assert caching.signature_digest(a) != caching.signature_digest(b)
+
+    def test_unhashable_inputs_are_not_persisted(self):
+        assert caching.signature_digest(caching.to_hashable([object()])) is None
+        assert caching.signature_digest(caching.to_hashable([float("NaN")])) is None
+
+
+class TestDiskCache:
+    def test_outputs_survive_new_cache_instance(self, tmp_path):
+        cache = make_cache(tmp_path)
+        set_prompt(cache, make_prompt())
+        cond = [[torch.ones(1, 4, 8), {"pooled_output": torch.zeros(1, 8)}]]
+        cache.set("1", CacheEntry(ui=None, outputs=[cond]))
+
+        restarted = make_cache(tmp_path)
+        set_prompt(restarted, make_prompt())
+        entry = restarted.get("1")
+        assert entry is not None
+        assert torch.equal(entry.outputs[0][0][0], cond[0][0])
+        assert torch.equal(entry.outputs[0][0][1]["pooled_output"], cond[0][1]["pooled_output"])
+
+    def test_changed_inputs_miss(self, tmp_path):
+        cache = make_cache(tmp_path)
+        set_prompt(cache, make_prompt())
+        cache.set("1", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+
+        restarted = make_cache(tmp_path)
+        set_prompt(restarted, make_prompt("a dog"))
+        assert restarted.get("1") is None
+
+    def test_non_tensor_types_not_spilled(self, tmp_path):
+        cache = make_cache(tmp_path)
+        set_prompt(cache, make_prompt())
+        cache.set("2", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+        cache.set("1", CacheEntry(ui=None, outputs=[[object()]]))
+        assert len(list(tmp_path.iterdir())) == 0
+
+    def test_replaced_model_file_misses(self, tmp_path, monkeypatch):
+        models = tmp_path / "models"
+        models.mkdir()
+        monkeypatch.setattr(caching.folder_paths, "folder_names_and_paths", {"checkpoints": ([str(models)], {".safetensors"})})
+        (models / "model.safetensors").write_bytes(b"old")
+        prompt = make_prompt()
+        prompt["1"]["inputs"]["model"] = ["2", 0]
+        cache = make_cache(tmp_path / "cache")
+        set_prompt(cache, prompt)
+        cache.set("1", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+
+        restarted = make_cache(tmp_path / "cache")
+        set_prompt(restarted, prompt)
+        assert restarted.get("1") is not None
+        (models / "model.safetensors").write_bytes(b"new model")
+        restarted = make_cache(tmp_path / "cache")
+        set_prompt(restarted, prompt)
+        assert restarted.get("1") is None
+
+    def test_text_inputs_not_looked_up_as_files(self, tmp_path, monkeypatch):
+        looked_up = []
+        monkeypatch.setattr(caching.folder_paths, "folder_names_and_paths", {"checkpoints": ([str(tmp_path)], set())})
+        monkeypatch.setattr(caching.folder_paths, "get_full_path", lambda folder_name, name: looked_up.append(name))
+        prompt = make_prompt("a photo of model.safetensors")
+        prompt["1"]["inputs"]["model"] = ["2", 0]
+        cache = make_cache(tmp_path / "cache")
+        set_prompt(cache, prompt)
+        cache.set("1", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+        assert looked_up == ["model.safetensors"]
+
+    def test_failed_write_leaves_no_temp_file(self, tmp_path, monkeypatch):
+        def failing_save(obj, f):
+            f.write(b"partial")
+            raise OSError("disk full")
+        monkeypatch.setattr(caching.torch, "save", failing_save)
+        cache = make_cache(tmp_path)
+        set_prompt(cache, make_prompt())
+        cache.set("1", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_comfyui_update_misses(self, tmp_path, monkeypatch):
+        cache = make_cache(tmp_path)
+        set_prompt(cache, make_prompt())
+        cache.set("1", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+        monkeypatch.setattr(caching, "_COMFYUI_VERSION", "0.0.0:updated")
+        restarted = make_cache(tmp_path)
+        set_prompt(restarted, make_prompt())
+        assert restarted.get("1") is None
+
+    def test_size_bounded_eviction(self, tmp_path):
+        cache = make_cache(tmp_path, max_size=1)
+        for text in ("a", "b", "c"):
+            set_prompt(cache, make_prompt(text))
+            cache.set("1", CacheEntry(ui=None, outputs=[[torch.ones(16)]]))
+        assert len(list(tmp_path.iterdir())) == 1
+
+        restarted = make_cache(tmp_path)
+        set_prompt(restarted, make_prompt("c"))
+        assert restarted.get("1") is not None
+        set_prompt(restarted, make_prompt("a"))
+        assert restarted.get("1") is None
+
+
+class ChainNode:
+    RETURN_TYPES = ("LATENT",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT",)}, "optional": {"previous": ("LATENT",)}}
+
+
+def make_chain(length, value=0):
+    prompt = {"0": {"class_type": "ChainNode", "inputs": {"value": value}}}
+    for i in range(1, length):
+        prompt[str(i)] = {"class_type": "ChainNode", "inputs": {"value": i, "previous": [str(i - 1), 0]}}
+    return prompt
+
+
+def get_keys(prompt):
+    caching.nodes.NODE_CLASS_MAPPINGS["ChainNode"] = ChainNode
+    key_set = caching.CacheKeySetInputSignature(DynamicPrompt(prompt), prompt.keys(), FakeIsChangedCache())
+    asyncio.run(key_set.add_keys(prompt.keys()))
+    return key_set
+
+
+class TestNodeSignature:
+    def test_each_node_hashed_once(self, monkeypatch):
+        calls = []
+        original = caching.CacheKeySetInputSignature.get_immediate_node_signature
+
+        async def counting(self, dynprompt, node_id):
+            calls.append(node_id)
+            return await original(self, dynprompt, node_id)
+        monkeypatch.setattr(caching.CacheKeySetInputSignature, "get_immediate_node_signature", counting)
+
+        get_keys(make_chain(2000))
+        assert len(calls) == 2000
+
+    def test_ancestor_change_propagates(self):
+        keys = get_keys(make_chain(10)).keys
+        changed = get_keys(make_chain(10, value=5)).keys
+        assert keys["9"] != changed["9"]
+        assert get_keys(make_chain(10)).keys == keys
+
+    def test_identical_subgraphs_share_keys(self):
+        prompt = make_chain(3)
+        prompt["a"] = {"class_type": "ChainNode", "inputs": {"value": 0}}
+        prompt["b"] = {"class_type": "ChainNode", "inputs": {"value": 1, "previous": ["a", 0]}}
+        keys = get_keys(prompt).keys
+        assert keys["b"] == keys["1"]
+
+    def test_missing_ancestor_is_uncacheable(self):
+        prompt = make_chain(3)
+        prompt["1"]["inputs"]["previous"] = ["missing", 0]
+        keys = get_keys(prompt).keys
+        assert isinstance(keys["1"], caching.Unhashable)
+        assert isinstance(keys["2"], caching.Unhashable)
+        assert isinstance(keys["0"], str)
+
+
+class HashableConfig:
+    def __init__(self, value):
+        self.value = value
+
+    def __comfy_hash__(self):
+        return {"value": self.value}
+
+
+class TestToHashable:
+    def test_tensor_hashed_by_content(self):
+        a = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+        assert caching.to_hashable(a) == caching.to_hashable(a.clone())
+        assert caching.to_hashable(a) != caching.to_hashable(a.reshape(4, 3))
+        assert caching.to_hashable(a) != caching.to_hashable(a.to(torch.float64))
+
+    def test_in_place_modification_rehashes(self):
+        a = torch.zeros(4)
+        before = caching.to_hashable(a)
+        a[0] = 1
+        assert caching.to_hashable(a) != before
+
+    def test_ndarray_hashed_by_content(self):
+        a = np.arange(6).reshape(2, 3)
+        assert caching.to_hashable(a) == caching.to_hashable(a.copy())
+        assert caching.to_hashable(a) != caching.to_hashable(a.T)
+        assert isinstance(caching.to_hashable(np.array([object()])), caching.Unhashable)
+
+    def test_comfy_hash_hook(self):
+        assert caching.to_hashable(HashableConfig(1)) == caching.to_hashable(HashableConfig(1))
+        assert caching.to_hashable(HashableConfig(1)) != caching.to_hashable(HashableConfig(2))
+        assert caching.signature_digest(caching.to_hashable([HashableConfig(1)])) is not None
+
+    def test_tensor_input_makes_node_cacheable(self):
+        prompt = make_chain(2)
+        prompt["0"]["inputs"]["value"] = torch.ones(2, 2)
+        first = get_keys(prompt).keys
+        prompt["0"]["inputs"]["value"] = torch.ones(2, 2)
+        assert isinstance(first["1"], str)
+        assert get_keys(prompt).keys == first
+
+
+class FakeModel:
+    def __init__(self, size):
+        self.size = size
+
+    def get_ram_usage(self):
+        return self.size
+
+
+class FakeOpaque:
+    pass
+
+
+class TestRamUsage:
+    def test_latent_and_conditioning(self):
+        samples = torch.zeros(1, 4, 8, 8)
+        cond = [[torch.zeros(1, 77, 16), {"pooled_output": torch.zeros(1, 16)}]]
+        total, tensors = caching.estimate_ram_usage([[{"samples": samples}], [cond]])
+        expected = (samples.numel() + 77 * 16 + 16) * 4
+        assert total == expected
+        assert tensors == expected
+
+    def test_shared_objects_counted_once(self):
+        t = torch.zeros(256)
+        model = FakeModel(1000)
+        total, _ = caching.estimate_ram_usage([[t, t], [model], [model]])
+        assert total == 1024 + 1000
+
+    def test_registered_estimator(self, monkeypatch):
+        monkeypatch.setattr(caching, "RAM_USAGE_ESTIMATORS", {})
+        assert caching.estimate_ram_usage([[FakeOpaque()]]) == (0, 0)
+        caching.register_ram_usage_estimator(FakeOpaque, lambda x: 123)
+        assert caching.estimate_ram_usage([[FakeOpaque()]]) == (123, 0)
+
+
+class TestRAMPressureCache:
+    def make_cache(self, sizes):
+        caching.nodes.NODE_CLASS_MAPPINGS["ModelNode"] = ModelNode
+        prompt = {str(i): {"class_type": "ModelNode", "inputs": {"name": str(i)}} for i in range(len(sizes))}
+        cache = caching.RAMPressureCache(caching.CacheKeySetInputSignature)
+        asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), FakeIsChangedCache()))
+        for i, size in enumerate(sizes):
+            cache.set(str(i), CacheEntry(ui=None, outputs=[[FakeModel(size)]]))
+        return cache
+
+    def poll_until(self, cache, monkeypatch, remaining):
+        # Pretend RAM is short until only `remaining` entries are left
+        def virtual_memory():
+            available = 0 if len(cache.cache) > remaining else 2**40
+            return SimpleNamespace(available=available)
+        monkeypatch.setattr(caching.psutil, "virtual_memory", virtual_memory)
+        cache.poll(ram_headroom=1)
+
+    def test_evicts_largest_first(self, monkeypatch):
+        cache = self.make_cache([10, 1000, 100])
+        self.poll_until(cache, monkeypatch, 1)
+        assert cache.get("0") is not None
+        assert cache.get("1") is None
+        assert cache.get("2") is None
+
+    def test_older_generation_evicted_first(self, monkeypatch):
+        cache = self.make_cache([1000, 1000])
+        for _ in range(3):
+            asyncio.run(cache.set_prompt(cache.dynprompt, ["1"], FakeIsChangedCache()))
+        self.poll_until(cache, monkeypatch, 1)
+        assert cache.get("0") is None
+        assert cache.get("1") is not None
+
+    def test_report(self):
+        cache = self.make_cache([10, 1000])
+        report = cache.ram_usage_report()
+        assert [x["node_id"] for x in report] == ["1", "0"]
+        assert report[0]["ram_usage"] == 1000
+        assert report[0]["class_type"] == "ModelNode"
@@ -0,0 +1,83 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from comfy_execution.image_writer import ImageWriter
+from comfy_execution.utils import CurrentNodeContext
+
+
+class BlockingImage:
+    """Writes an image once released."""
+
+    def __init__(self, fail=False):
+        self.release = threading.Event()
+        self.fail = fail
+
+    def save(self, path, **kwargs):
+        self.release.wait(timeout=10)
+        if self.fail:
+            raise OSError("disk full")
+        Image.fromarray(np.zeros((2, 2, 3), dtype=np.uint8)).save(path, **kwargs)
+
+
+@pytest.fixture
+def writer():
+    writer = ImageWriter(threads=2)
+    yield writer
+    writer.executor.shutdown(wait=True)
+
+
+def test_save_outside_node_is_synchronous(writer, tmp_path):
+    path = str(tmp_path / "a.png")
+    writer.save(Image.new("RGB", (2, 2)), path, compress_level=1)
+    assert os.path.exists(path)
+
+
+def test_executed_waits_for_writes(writer, tmp_path):
+    images = [BlockingImage(), BlockingImage()]
+    with CurrentNodeContext("prompt", "9"):
+        for i, image in enumerate(images):
+            writer.save(image, str(tmp_path / "{}.png".format(i)))
+    sent = []
+    writer.after_writes("prompt", "9", lambda: sent.append(sorted(os.listdir(tmp_path))))
+    writer.after_writes("prompt", "other", lambda: sent.append("other"))
+    assert sent == ["other"]
+
+    for image in images:
+        image.release.set()
+    assert writer.wait("prompt") == []
+    assert sent == ["other", ["0.png", "1.png"]]
+    assert writer.groups == {}
+
+
+def test_write_errors(writer, tmp_path):
+    image = BlockingImage(fail=True)
+    image.release.set()
+    with CurrentNodeContext("prompt", "3"):
+        writer.save(image, str(tmp_path / "a.png"))
+    errors = writer.wait("prompt")
+    assert [(node_id, path, str(ex)) for node_id, path, ex, _ in errors] == [("3", str(tmp_path / "a.png"), "disk full")]
+    assert writer.wait("prompt") == []
+
+
+def test_write_saved_after_last_write_is_waited_for(writer, tmp_path):
+    first = BlockingImage()
+    second = BlockingImage()
+    with CurrentNodeContext("prompt", "9"):
+        writer.save(first, str(tmp_path / "0.png"))
+
+    def save_again():
+        with CurrentNodeContext("prompt", "9"):
+            writer.save(second, str(tmp_path / "1.png"))
+    writer.after_writes("prompt", "9", save_again)
+
+    first.release.set()
+    group = writer.groups[("prompt", "9")]
+    # The callback saved a second write, finishing the first one must not set done
+    assert not group.done.wait(timeout=0.5)
+    second.release.set()
+    assert writer.wait("prompt") == []
+    assert os.path.exists(tmp_path / "1.png")
@@ -0,0 +1,264 @@
+from unittest.mock import MagicMock
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+from comfy_execution import batching
+from comfy_execution.scheduling import ModelAffinity, get_prompt_model_keys
+from comfy_execution.worker_pool import WorkerPool, parse_worker_devices, strip_worker_args
+
+
+def checkpoint_prompt(name):
+    return {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": name}},
+        "2": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "seed": 0}},
+    }
+
+
+def make_queue(checkpoints):
+    queue = execution.PromptQueue(MagicMock())
+    for number, name in enumerate(checkpoints):
+        queue.put((number, "prompt{}".format(number), checkpoint_prompt(name), {}, [], {}))
+    return queue
+
+
+def affinity_for(name):
+    affinity = ModelAffinity()
+    affinity.update(checkpoint_prompt(name))
+    return affinity
+
+
+class TestModelKeys:
+    def test_loader_inputs(self):
+        prompt = checkpoint_prompt("a.safetensors")
+        prompt["3"] = {"class_type": "VAELoader", "inputs": {"vae_name": "vae.safetensors"}}
+        prompt["4"] = {"class_type": "VAELoader", "inputs": {"vae_name": ["5", 0]}}
+        assert get_prompt_model_keys(prompt) == frozenset([
+            ("CheckpointLoaderSimple", "a.safetensors"),
+            ("VAELoader", "vae.safetensors"),
+        ])
+
+
+class TestAffinity:
+    def test_without_affinity_is_fifo(self):
+        queue = make_queue(["a", "b", "a"])
+        assert [queue.get()[0][0] for _ in range(3)] == [0, 1, 2]
+
+    def test_prefers_loaded_models(self):
+        queue = make_queue(["a", "b", "a"])
+        assert queue.get(affinity=affinity_for("b"))[0][0] == 1
+        assert queue.get(affinity=affinity_for("b"))[0][0] == 0
+
+    def test_head_is_not_starved(self):
+        queue = make_queue(["a"] + ["b"] * (execution.AFFINITY_MAX_HEAD_SKIPS + 2))
+        numbers = [queue.get(affinity=affinity_for("b"))[0][0] for _ in range(execution.AFFINITY_MAX_HEAD_SKIPS + 1)]
+        assert numbers[-1] == 0
+
+    def test_model_swaps_avoided(self):
+        queue = make_queue(["a", "b", "a", "b"])
+        affinity = ModelAffinity()
+        order = []
+        for _ in range(4):
+            item = queue.get(affinity=affinity)[0]
+            affinity.update(item[2])
+            order.append(item[0])
+        assert order == [0, 2, 1, 3]
+        assert queue.model_swaps_avoided == 1
+
+
+def text_to_image_prompt(text, seed, sampler_name="euler"):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "model.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 1}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": text, "clip": ["4", 1]}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["4", 1]}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": seed, "steps": 20, "cfg": 8.0, "sampler_name": sampler_name, "scheduler": "normal", "denoise": 1.0,
+                                                     "model": ["4", 0], "positive": ["6", 0], "negative": ["7", 0], "latent_image": ["5", 0]}},
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["3", 0], "vae": ["4", 2]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "ComfyUI", "images": ["8", 0]}},
+    }
+
+
+def queue_item(number, prompt):
+    return (number, "prompt{}".format(number), prompt, {}, ["9"], {})
+
+
+class TestBatching:
+    def test_batch_key(self):
+        key = batching.batch_key(queue_item(0, text_to_image_prompt("a cat", 1)))
+        assert key is not None
+        assert batching.batch_key(queue_item(1, text_to_image_prompt("a dog", 2))) == key
+        assert batching.batch_key(queue_item(2, text_to_image_prompt("a cat", 1, "euler_ancestral"))) is None
+        prompt = text_to_image_prompt("a cat", 1)
+        prompt["3"]["inputs"]["steps"] = 30
+        assert batching.batch_key(queue_item(3, prompt)) != key
+        prompt = text_to_image_prompt("a cat", 1)
+        prompt["10"] = {"class_type": "SomeCustomNode", "inputs": {}}
+        assert batching.batch_key(queue_item(4, prompt)) is None
+
+    def test_merge_prompts(self):
+        merged = batching.merge_prompts([text_to_image_prompt(text, seed) for text, seed in [("a", 1), ("b", 2), ("c", 3)]])
+        assert merged["5"]["inputs"]["batch_size"] == 3
+        assert merged["3"]["inputs"]["latent_image"] == ["3.seeds", 0]
+        assert merged["3.seeds"]["inputs"] == {"samples": ["5", 0], "seeds": "1,2,3"}
+        assert [merged["6.{}".format(i)]["inputs"]["text"] for i in range(3)] == ["a", "b", "c"]
+        assert merged["6"]["class_type"] == "PromptBatchStackConditioning"
+        assert merged["6"]["inputs"] == {"conditioning_a": ["6.stack1", 0], "conditioning_b": ["6.2", 0]}
+        assert merged["7"]["class_type"] == "CLIPTextEncode"
+        assert merged["9"]["class_type"] == "PromptBatchSaveImage"
+
+    def test_split_history_result(self):
+        images = [{"filename": "ComfyUI_{}.png".format(i)} for i in range(4)]
+        outputs = {"9": {"images": images, "prompt_slices": [[0, 1], [1, 4]]}, "10": {"text": ["a", "b"]}}
+        results = batching.split_history_result({"outputs": outputs, "meta": {}}, 2)
+        assert results[0]["outputs"]["9"] == {"images": images[:1]}
+        assert results[1]["outputs"]["9"] == {"images": images[1:]}
+        # Without slices the output is not guessed to be split
+        assert results[0]["outputs"]["10"] == results[1]["outputs"]["10"] == {"text": ["a", "b"]}
+
+    def test_take_batch(self):
+        queue = execution.PromptQueue(MagicMock())
+        for number, prompt in enumerate([text_to_image_prompt("a", 1), text_to_image_prompt("b", 2, "euler_ancestral"), text_to_image_prompt("c", 3)]):
+            queue.put(queue_item(number, prompt))
+        batch = batching.take_batch(queue, queue.get(), 4)
+        assert [item[0] for item, _ in batch] == [0, 2]
+        assert len(queue.currently_running) == 2
+        assert [item[0] for item in queue.queue] == [1]
+
+    def test_execute_batch(self):
+        queue = execution.PromptQueue(MagicMock())
+        for number, text in enumerate(["a", "b"]):
+            item = queue_item(number, text_to_image_prompt(text, number))
+            item[3]["client_id"] = "client{}".format(number)
+            item[3]["extra_pnginfo"] = {"workflow": text}
+            queue.put(item)
+        batch = batching.take_batch(queue, queue.get(), 4)
+
+        executor = MagicMock(success=True, status_messages=[], history_result={"outputs": {}, "meta": {}})
+        seen = {}
+        def execute(prompt, prompt_id, extra_data, execute_outputs):
+            seen["client_id"] = extra_data["client_id"]
+            seen["members"] = batching.batch_members[prompt_id]
+        executor.execute.side_effect = execute
+        server = MagicMock()
+        batching.execute_batch(executor, server, queue, batch, MagicMock())
+
+        # Progress of the merged prompt goes to a client id nobody is connected with
+        assert seen["client_id"] not in (None, "client0", "client1")
+        assert [(prompt["6"]["inputs"]["text"], extra_pnginfo) for prompt, extra_pnginfo in seen["members"]] == [("a", {"workflow": "a"}), ("b", {"workflow": "b"})]
+        assert batching.batch_members == {}
+        assert {call.args[2] for call in server.send_sync.call_args_list} == {"client0", "client1"}
+
+    def test_interrupt_one_prompt_of_batch(self):
+        queue = execution.PromptQueue(MagicMock())
+        for number, text in enumerate(["a", "b", "c"]):
+            queue.put(queue_item(number, text_to_image_prompt(text, number)))
+        batch = batching.take_batch(queue, queue.get(), 4)
+        assert not batching.interrupt_prompt("prompt1")
+
+        executor = MagicMock(success=True, status_messages=[], history_result={"outputs": {}, "meta": {}})
+        runs = []
+        def execute(prompt, prompt_id, extra_data, execute_outputs):
+            runs.append([member[0]["6"]["inputs"]["text"] for member in batching.batch_members[prompt_id]])
+            if len(runs) == 1:
+                assert batching.interrupt_prompt("prompt1")
+                executor.success = False
+                executor.status_messages = [("execution_interrupted", {"prompt_id": prompt_id})]
+            else:
+                executor.success = True
+                executor.status_messages = []
+        executor.execute.side_effect = execute
+        batching.execute_batch(executor, MagicMock(), queue, batch, MagicMock())
+
+        # The batch is run again without the interrupted prompt
+        assert runs == [["a", "b", "c"], ["a", "c"]]
+        history = queue.get_history()
+        assert history["prompt1"]["status"]["status_str"] == "error"
+        assert history["prompt0"]["status"]["status_str"] == history["prompt2"]["status"]["status_str"] == "success"
+        assert batching.running_prompts == batching.interrupted_prompts == set()
+
+
+class TestSnapshot:
+    def test_published_on_every_change(self):
+        queue = make_queue(["a", "b"])
+        snapshot = queue.snapshot
+        assert queue.get_tasks_remaining() == 2
+        item, item_id = queue.get()
+        assert queue.snapshot.version > snapshot.version
+        assert [x[0] for x in snapshot.queued] == [0, 1]
+        assert [x[0] for x in queue.snapshot.running] == [0]
+        assert [x[0] for x in queue.snapshot.queued] == [1]
+        queue.task_done(item_id, {}, None)
+        assert queue.snapshot.running == ()
+        assert "prompt0" in queue.get_history()
+        version = queue.snapshot.version
+        queue.delete_queue_item(lambda x: x[0] == 1)
+        assert queue.snapshot.version > version
+        assert queue.get_tasks_remaining() == 0
+
+    def test_history_version(self):
+        queue = make_queue(["a"])
+        version = queue.history.version
+        item, item_id = queue.get()
+        queue.task_done(item_id, {}, None)
+        assert queue.history.version > version
+        version = queue.history.version
+        queue.delete_history_item("prompt0")
+        assert queue.history.version > version
+
+
+class TestWorkerArgs:
+    def test_strip_worker_args(self):
+        argv = ["--port", "8188", "--workers", "2", "--worker-devices=0,1", "--cpu", "--cuda-device", "1", "--cache-lru", "10"]
+        assert strip_worker_args(argv) == ["--port", "8188", "--cache-lru", "10"]
+
+    def test_parse_worker_devices(self):
+        assert parse_worker_devices(2) == ["0", "1"]
+        assert parse_worker_devices(3, cpu=True) == ["cpu", "cpu", "cpu"]
+        assert parse_worker_devices(3, "0, cpu") == ["0", "cpu", "0"]
+
+
+class DeadConnection:
+    """A connection to a worker that exits after sending the given messages."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def send(self, message):
+        pass
+
+    def recv(self):
+        if len(self.messages) == 0:
+            raise EOFError()
+        return self.messages.pop(0)
+
+    def close(self):
+        pass
+
+
+class TestWorkerFailure:
+    def run_on_dead_worker(self, messages):
+        queue = make_queue(["a", "b"])
+        server = MagicMock()
+        server.sockets_metadata = {}
+        pool = WorkerPool(server, queue, ["cpu"], [])
+        worker = pool.workers[0]
+        worker.conn = DeadConnection(messages)
+        pool._run_item(worker, *queue.get())
+        assert worker.conn is None
+        return queue
+
+    def test_prompt_not_received_is_queued_again(self):
+        queue = self.run_on_dead_worker([])
+        assert queue.currently_running == {}
+        assert sorted(x[0] for x in queue.queue) == [0, 1]
+        assert queue.get_history() == {}
+
+    def test_prompt_received_fails(self):
+        queue = self.run_on_dead_worker([("accepted",)])
+        assert [x[0] for x in queue.queue] == [1]
+        assert queue.get_history()["prompt0"]["status"]["status_str"] == "error"
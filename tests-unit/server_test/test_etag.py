@@ -0,0 +1,16 @@
+from api_server.utils.etag import etag_matches, make_etag
+
+
+def test_make_etag():
+    etag = make_etag(3, 7)
+    assert etag.startswith('"') and etag.endswith('-3-7"')
+    assert etag != make_etag(3, 8)
+
+
+def test_etag_matches():
+    etag = make_etag(1)
+    assert etag_matches(etag, etag)
+    assert etag_matches('"other", W/{}'.format(etag), etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag(2), etag)
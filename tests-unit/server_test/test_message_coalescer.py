@@ -0,0 +1,33 @@
+"""Tests for merging superseded progress and status messages"""
+
+from api_server.services.message_coalescer import coalesce_messages
+
+
+def progress(value, node="3", prompt_id="p1", sid="c1"):
+    return ("progress", {"value": value, "max": 20, "prompt_id": prompt_id, "node": node}, sid)
+
+
+def status(remaining):
+    return ("status", {"status": {"exec_info": {"queue_remaining": remaining}}}, None)
+
+
+def test_latest_progress_kept():
+    messages = [progress(1), progress(2), progress(3)]
+    assert coalesce_messages(messages) == [progress(3)]
+
+
+def test_keys_kept_apart():
+    messages = [progress(1, node="3"), progress(1, node="4"), progress(1, sid="c2"), progress(2, node="3")]
+    assert coalesce_messages(messages) == [progress(1, node="4"), progress(1, sid="c2"), progress(2, node="3")]
+
+
+def test_order_with_other_events():
+    executing = ("executing", {"node": "4", "prompt_id": "p1"}, "c1")
+    executed = ("executed", {"node": "3", "output": {}, "prompt_id": "p1"}, "c1")
+    messages = [status(3), progress(1), executed, executing, status(2), progress(2), status(1)]
+    assert coalesce_messages(messages) == [executed, executing, progress(2), status(1)]
+
+
+def test_binary_events_untouched():
+    messages = [(1, b"a", None), (1, b"b", None)]
+    assert coalesce_messages(messages) == messages
@@ -0,0 +1,76 @@
+"""Tests for the cached /object_info payload"""
+
+import asyncio
+import gzip
+import json
+
+import folder_paths
+from app.model_file_index import ModelFileIndex
+from api_server.services.object_info_cache import ObjectInfoCache, object_info_fingerprint
+
+
+class Node:
+    pass
+
+
+def test_fingerprint_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "folder_names_and_paths", {"checkpoints": ([str(tmp_path / "checkpoints")], {".safetensors"})})
+    monkeypatch.setattr(folder_paths, "filename_list_cache", {})
+    monkeypatch.setattr(folder_paths, "input_directory", str(tmp_path / "input"))
+    (tmp_path / "checkpoints").mkdir()
+    (tmp_path / "input").mkdir()
+    mappings = {"Node": Node}
+
+    fingerprint = object_info_fingerprint(mappings)
+    assert object_info_fingerprint(mappings) == fingerprint
+
+    (tmp_path / "checkpoints" / "model.safetensors").write_bytes(b"")
+    changed = object_info_fingerprint(mappings)
+    assert changed != fingerprint
+
+    mappings["Other"] = Node
+    assert object_info_fingerprint(mappings) != changed
+
+
+def test_fingerprint_covers_indexed_subfolders(tmp_path, monkeypatch):
+    (tmp_path / "loras" / "sdxl").mkdir(parents=True)
+    (tmp_path / "input").mkdir()
+    monkeypatch.setattr(folder_paths, "folder_names_and_paths", {"loras": ([str(tmp_path / "loras")], {".safetensors"})})
+    monkeypatch.setattr(folder_paths, "filename_list_cache", {})
+    monkeypatch.setattr(folder_paths, "input_directory", str(tmp_path / "input"))
+    index = ModelFileIndex(use_watchdog=False)
+    monkeypatch.setattr(folder_paths, "model_file_index", index)
+    folder_paths.get_filename_list("loras")
+    mappings = {"Node": Node}
+    fingerprint = object_info_fingerprint(mappings)
+
+    # Only the subfolder's mtime changes, which the folder listings don't hold with the index
+    (tmp_path / "loras" / "sdxl" / "model.safetensors").write_bytes(b"")
+    index.mark_dirty(str(tmp_path / "loras" / "sdxl"))
+    index.update(poll=False)
+    assert object_info_fingerprint(mappings) != fingerprint
+
+
+def test_cache_rebuilds_on_change():
+    builds = []
+    state = {"fingerprint": 1}
+
+    def build():
+        builds.append(state["fingerprint"])
+        return {"Node": {"version": state["fingerprint"]}}
+
+    cache = ObjectInfoCache(build, lambda: (0, frozenset([state["fingerprint"]])))
+
+    async def run():
+        first, second = await asyncio.gather(cache.get(), cache.get())
+        assert first is second
+        state["fingerprint"] = 2
+        third = await cache.get()
+        forced = await cache.get(force=True)
+        return first, third, forced
+
+    first, third, forced = asyncio.run(run())
+    assert builds == [1, 2, 2]
+    assert json.loads(gzip.decompress(first.gzip_body)) == {"Node": {"version": 1}}
+    assert first.etag != third.etag
+    assert third.etag == forced.etag
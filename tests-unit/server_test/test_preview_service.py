@@ -0,0 +1,101 @@
+"""Tests for preview encoding and sending"""
+
+import asyncio
+import json
+import struct
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from api_server.services.preview_service import PreviewService, encode_preview_message, PREVIEW_IMAGE_TYPES
+from api_server.services.socket_writer import SocketWriter
+from protocol import BinaryEventTypes
+
+
+def make_preview(image_type="JPEG", color=(255, 0, 0)):
+    return (image_type, Image.new("RGB", (64, 64), color), 32)
+
+
+def encode_bytes(event, data):
+    return bytearray(struct.pack(">I", event)) + data
+
+
+def preview_color(message):
+    return Image.open(BytesIO(message[8:])).convert("RGB").getpixel((16, 16))
+
+
+class SlowSocket:
+    def __init__(self):
+        self.received = []
+        self.release = asyncio.Event()
+
+    async def send_bytes(self, message):
+        await self.release.wait()
+        self.received.append(bytes(message))
+
+
+def make_service(sockets):
+    loop = asyncio.get_running_loop()
+    writers = {sid: SocketWriter(ws, loop) for sid, ws in sockets.items()}
+    server = SimpleNamespace(loop=loop, socket_writers=writers, encode_bytes=encode_bytes)
+    return PreviewService(server, threads=1)
+
+
+def idle(service):
+    return len(service.pending) == 0 and all(w.preview is None for w in service.server.socket_writers.values())
+
+
+async def wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize("image_type", ["JPEG", "PNG", "WEBP"])
+def test_encode_formats(image_type):
+    event, data = encode_preview_message(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, make_preview(image_type))
+    assert event == BinaryEventTypes.PREVIEW_IMAGE
+    assert struct.unpack(">I", data[:4])[0] == PREVIEW_IMAGE_TYPES[image_type]
+    image = Image.open(BytesIO(data[4:]))
+    assert image.format == image_type
+    assert image.size == (32, 32)
+
+
+def test_encode_with_metadata():
+    event, data = encode_preview_message(BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, (make_preview("WEBP"), {"node_id": "3"}))
+    assert event == BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA
+    length = struct.unpack(">I", data[:4])[0]
+    assert json.loads(data[4:4 + length]) == {"node_id": "3", "image_type": "image/webp"}
+    assert Image.open(BytesIO(data[4 + length:])).format == "WEBP"
+
+
+def test_slow_socket_gets_latest_frame():
+    async def run():
+        slow = SlowSocket()
+        fast = SlowSocket()
+        fast.release.set()
+        service = make_service({"slow": slow, "fast": fast})
+        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+        for color in colors:
+            service.send(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, make_preview("PNG", color))
+            await wait_for(lambda: len(service.pending) == 0 and service.server.socket_writers["fast"].preview is None)
+            await asyncio.sleep(0.01)
+        slow.release.set()
+        await wait_for(lambda: idle(service))
+        await asyncio.sleep(0.01)
+        return slow, fast, colors
+
+    slow, fast, colors = asyncio.run(run())
+    # The slow socket was still sending the first frame, only the newest of the others is kept
+    assert [preview_color(m) for m in slow.received] == [colors[0], colors[-1]]
+    assert [preview_color(m) for m in fast.received] == colors
+
+
+def test_no_clients():
+    async def run():
+        service = make_service({})
+        service.send(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, make_preview())
+        return service.pending
+
+    assert asyncio.run(run()) == {}
@@ -0,0 +1,82 @@
+"""Tests for the per websocket message queues"""
+
+import asyncio
+
+from api_server.services.socket_writer import SocketWriter
+
+
+class FakeSocket:
+    def __init__(self, blocked=False):
+        self.received = []
+        self.release = asyncio.Event()
+        self.closed = False
+        if not blocked:
+            self.release.set()
+
+    async def send_str(self, message):
+        await self.release.wait()
+        self.received.append(message)
+
+    async def send_bytes(self, message):
+        await self.release.wait()
+        self.received.append(bytes(message))
+
+    async def close(self, code=None, message=None):
+        self.closed = True
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_messages_sent_in_order():
+    async def run():
+        ws = FakeSocket()
+        writer = SocketWriter(ws, asyncio.get_running_loop())
+        writer.send_preview(b"preview1")
+        writer.send_preview(b"preview2")
+        writer.send("a")
+        writer.send(b"b")
+        await settle()
+        writer.close()
+        return ws.received
+
+    # Queued messages go before the latest preview
+    assert asyncio.run(run()) == ["a", b"b", b"preview2"]
+
+
+def test_slow_socket_does_not_block_others():
+    async def run():
+        loop = asyncio.get_running_loop()
+        slow = FakeSocket(blocked=True)
+        fast = FakeSocket()
+        writers = [SocketWriter(slow, loop), SocketWriter(fast, loop)]
+        for i in range(5):
+            for writer in writers:
+                writer.send(str(i))
+        await settle()
+        fast_received = list(fast.received)
+        slow.release.set()
+        await settle()
+        for writer in writers:
+            writer.close()
+        return fast_received, slow.received
+
+    fast_received, slow_received = asyncio.run(run())
+    assert fast_received == ["0", "1", "2", "3", "4"]
+    assert slow_received == ["0", "1", "2", "3", "4"]
+
+
+def test_too_slow_client_disconnected():
+    async def run():
+        ws = FakeSocket(blocked=True)
+        writer = SocketWriter(ws, asyncio.get_running_loop(), max_queued=3)
+        for i in range(5):
+            writer.send(str(i))
+        await settle()
+        return ws, writer
+
+    ws, writer = asyncio.run(run())
+    assert writer.closed
+    assert ws.closed
@@ -0,0 +1,71 @@
+"""
+Times ImageDeduplicationNode on growing image lists against the per image PIL hashing and the
+pairwise string comparison it replaced. The old node is only timed up to --old-max images.
+
+Usage: python -m tests.benchmarks.image_dedup_benchmark [--images 1000 10000 100000] [--size 64] [--old-max 10000]
+"""
+import argparse
+import time
+from unittest.mock import patch, MagicMock
+
+import torch
+from PIL import Image
+
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_extras.nodes_dataset import ImageDeduplicationNode, tensor_to_pil
+
+
+def old_dedup(images, similarity_threshold):
+    # The node before the hashes were batched and indexed
+    def compute_hash(img_tensor):
+        img_small = tensor_to_pil(img_tensor).resize((8, 8), Image.Resampling.LANCZOS).convert("L")
+        pixels = list(img_small.getdata())
+        avg = sum(pixels) / len(pixels)
+        return "".join("1" if p > avg else "0" for p in pixels)
+
+    hashes = [compute_hash(img) for img in images]
+    keep_indices = []
+    for i in range(len(images)):
+        for j in keep_indices:
+            distance = sum(c1 != c2 for c1, c2 in zip(hashes[i], hashes[j]))
+            if 1.0 - (distance / 64.0) >= similarity_threshold:
+                break
+        else:
+            keep_indices.append(i)
+    return [images[i] for i in keep_indices]
+
+
+def make_images(count, size):
+    # Every fourth image is a slightly brightened copy of an earlier one
+    torch.manual_seed(0)
+    unique = torch.rand(count - count // 4, 1, size, size, 3)
+    copies = (unique[torch.randint(0, len(unique), (count // 4,))] + 0.002).clamp(0, 1)
+    return list(unique) + list(copies)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--old-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>10} {:>8} {:>8}".format("images", "old s", "new s", "old kept", "new kept"))  # noqa: T201
+    for count in args.images:
+        images = make_images(count, args.size)
+        old_s, old_kept = (float("nan"), "-")
+        if count <= args.old_max:
+            old_s, old_kept = timed(old_dedup, images, args.threshold)
+        new_s, new_kept = timed(ImageDeduplicationNode._group_process, images, args.threshold)
+        print("{:>8} {:>10.3f} {:>10.3f} {:>8} {:>8}".format(count, old_s, new_s, old_kept, new_kept))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Times folder_paths.get_save_image_path() in output folders of growing size, with the counter
+registry and with the listing of the whole folder it replaced.
+
+Usage: python -m tests.benchmarks.save_counter_benchmark [--files 1000 10000 100000] [--saves 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import folder_paths
+
+
+def listdir_counter(folder, filename):
+    # The counter lookup get_save_image_path did before the registry
+    def map_filename(name):
+        prefix_len = len(filename)
+        prefix = name[:prefix_len + 1]
+        try:
+            digits = int(name[prefix_len + 1:].split('_')[0])
+        except:
+            digits = 0
+        return digits, prefix
+    try:
+        return max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(folder))))[0] + 1
+    except ValueError:
+        return 1
+
+
+def fill(folder, count):
+    for i in range(1, count + 1):
+        open(os.path.join(folder, "ComfyUI_{:05}_.png".format(i)), "w").close()
+
+
+def time_saves(folder, saves, allocate):
+    # Every save creates its file like SaveImage does
+    start = time.perf_counter()
+    for _ in range(saves):
+        counter = allocate(folder)
+        open(os.path.join(folder, "ComfyUI_{:05}_.png".format(counter)), "w").close()
+    return (time.perf_counter() - start) / saves
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--saves", type=int, default=200)
+    args = parser.parse_args()
+
+    print("{:>8} {:>14} {:>14} {:>14}".format("files", "listdir ms", "first scan ms", "registry ms"))  # noqa: T201
+    for count in args.files:
+        with tempfile.TemporaryDirectory() as folder:
+            fill(folder, count)
+            listdir_ms = time_saves(folder, args.saves, lambda f: listdir_counter(f, "ComfyUI")) * 1000
+            registry = folder_paths.SaveCounterRegistry()
+            scan_ms = time_saves(folder, 1, lambda f: registry.allocate(f, "ComfyUI")) * 1000
+            registry_ms = time_saves(folder, args.saves, lambda f: registry.allocate(f, "ComfyUI")) * 1000
+        print("{:>8} {:>14.3f} {:>14.3f} {:>14.3f}".format(count, listdir_ms, scan_ms, registry_ms))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Times cache.set_prompt() on synthetic graphs to track the cost of computing node signatures.
+
+Usage: python -m tests.benchmarks.set_prompt_benchmark [--nodes 600 1200 2400] [--repeat 5]
+"""
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_execution import caching
+    from comfy_execution.graph import DynamicPrompt
+
+
+class BenchmarkNode:
+    RETURN_TYPES = ("LATENT",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"seed": ("INT",), "text": ("STRING",)}, "optional": {"a": ("LATENT",), "b": ("LATENT",)}}
+
+
+class NoIsChanged:
+    async def get(self, node_id):
+        return False
+
+
+def make_graph(node_count, rng):
+    # Every node links to up to two random earlier nodes, which gives deep, heavily shared ancestries
+    prompt = {}
+    for i in range(node_count):
+        inputs = {"seed": rng.randint(0, 2**32), "text": "prompt text {}".format(i)}
+        if i > 0:
+            inputs["a"] = [str(rng.randrange(max(0, i - 8), i)), 0]
+        if i > 1:
+            inputs["b"] = [str(rng.randrange(0, i)), 0]
+        prompt[str(i)] = {"class_type": "BenchmarkNode", "inputs": inputs}
+    return prompt
+
+
+def time_set_prompt(prompt, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        cache = caching.HierarchicalCache(caching.CacheKeySetInputSignature)
+        start = time.perf_counter()
+        asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), NoIsChanged()))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, nargs="+", default=[150, 300, 600, 1200, 2400])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    caching.nodes = SimpleNamespace(NODE_CLASS_MAPPINGS={"BenchmarkNode": BenchmarkNode})
+    rng = random.Random(0)
+    for node_count in args.nodes:
+        elapsed = time_set_prompt(make_graph(node_count, rng), args.repeat)
+        print("{:>6} nodes: {:8.2f} ms".format(node_count, elapsed * 1000))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from comfy_execution.jobs import (
     normalize_history_item,
     get_outputs_summary,
     apply_sorting,
+    summarize_jobs,
+    filter_jobs,
 )
 
 
@@ -395,3 +397,45 @@ class TestNormalizeHistoryItem:
             'prompt': {'nodes': {'1': {}}},
             'extra_data': {'create_time': 1234567890, 'client_id': 'abc'},
         }
+
+
+class TestSummarizeAndFilterJobs:
+    """Unit tests for summarize_jobs() and filter_jobs()"""
+
+    def _summary(self):
+        running = [(0, 'running', {}, {'create_time': 3}, [])]
+        queued = [(1, 'queued', {}, {'create_time': 4}, [])]
+        history = {
+            'done': {
+                'prompt': (2, 'done', {}, {'create_time': 1}, []),
+                'outputs': {},
+                'status': {'status_str': 'success', 'completed': True, 'messages': []},
+            },
+            'failed': {
+                'prompt': (3, 'failed', {}, {'create_time': 2}, []),
+                'outputs': {},
+                'status': {'status_str': 'error', 'completed': False, 'messages': []},
+            },
+        }
+        return summarize_jobs(running, queued, history)
+
+    def test_summarize_all_items(self):
+        """Every running, queued and history item becomes one job."""
+        jobs = self._summary()
+        assert [(j['id'], j['status']) for j in jobs] == [
+            ('running', JobStatus.IN_PROGRESS),
+            ('queued', JobStatus.PENDING),
+            ('done', JobStatus.COMPLETED),
+            ('failed', JobStatus.FAILED),
+        ]
+
+    def test_filter_status_sort_and_page(self):
+        """Filtering a summary gives the same jobs for every request."""
+        jobs = self._summary()
+        page, total = filter_jobs(jobs, status_filter=[JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.PENDING], limit=2)
+        assert total == 3
+        assert [j['id'] for j in page] == ['queued', 'failed']
+        page, total = filter_jobs(jobs, sort_order='asc', offset=1)
+        assert total == 4
+        assert [j['id'] for j in page] == ['failed', 'running', 'queued']
+        assert [j['id'] for j in jobs] == ['running', 'queued', 'done', 'failed']
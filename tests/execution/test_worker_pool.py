@@ -0,0 +1,102 @@
+import json
+import time
+import subprocess
+import urllib.request
+
+import pytest
+import torch
+from pytest import fixture
+
+from comfy_execution.graph_utils import GraphBuilder
+from tests.execution.test_execution import ComfyClient, run_warmup
+
+
+@pytest.mark.execution
+class TestWorkerPool:
+    @fixture(scope="class", autouse=True)
+    def _server(self, args_pytest):
+        pargs = [
+            'python','main.py',
+            '--output-directory', args_pytest["output_dir"],
+            '--listen', args_pytest["listen"],
+            '--port', str(args_pytest["port"]),
+            '--extra-model-paths-config', 'tests/execution/extra_model_paths.yaml',
+            '--cpu',
+            '--workers', '2',
+        ]
+        p = subprocess.Popen(pargs)
+        yield
+        p.kill()
+        torch.cuda.empty_cache()
+
+    @fixture(scope="class", autouse=True)
+    def shared_client(self, args_pytest, _server):
+        client = ComfyClient()
+        n_tries = 5
+        for i in range(n_tries):
+            time.sleep(4)
+            try:
+                client.connect(listen=args_pytest["listen"], port=args_pytest["port"])
+            except ConnectionRefusedError:
+                pass
+            else:
+                break
+        # Warm up both workers so node loading doesn't count towards the timings below
+        for i in range(2):
+            run_warmup(client, prefix=f"warmup{i}")
+        yield client
+        del client
+        torch.cuda.empty_cache()
+
+    @fixture
+    def client(self, shared_client, request):
+        shared_client.set_test_name(f"worker_pool[{request.node.name}]")
+        yield shared_client
+
+    def sleep_graph(self, prefix, seconds):
+        g = GraphBuilder(prefix=prefix)
+        image = g.node("StubImage", content="NOISE", height=64, width=64, batch_size=1)
+        sleep_node = g.node("TestSleep", value=image.out(0), seconds=seconds)
+        output = g.node("SaveImage", images=sleep_node.out(0), filename_prefix="worker_pool")
+        return g, output
+
+    def test_single_prompt(self, client: ComfyClient):
+        g, output = self.sleep_graph("single", 0.1)
+        result = client.run(g)
+        assert result.did_run(output)
+        assert len(result.get_images(output)) == 1
+
+    def test_prompts_run_in_parallel(self, client: ComfyClient, skip_timing_checks):
+        first, first_output = self.sleep_graph("parallel_a", 2.0)
+        second, second_output = self.sleep_graph("parallel_b", 2.0)
+
+        start = time.time()
+        first_id = client.queue_prompt(first.finalize())["prompt_id"]
+        second_result = client.run(second)
+        elapsed = time.time() - start
+
+        # Both prompts finish at about the same time, the first one may land in the history a bit later
+        for _ in range(50):
+            history = client.get_history(first_id)
+            if first_id in history:
+                break
+            time.sleep(0.1)
+        history = history[first_id]
+        assert history["status"]["status_str"] == "success"
+        assert first_output.id in history["outputs"]
+        assert second_result.did_run(second_output)
+        if not skip_timing_checks:
+            assert elapsed < 3.5, f"Two 2s prompts on two workers took {elapsed:.1f}s"
+
+    def test_interrupt(self, client: ComfyClient):
+        g, _ = self.sleep_graph("interrupt", 10.0)
+        prompt_id = client.queue_prompt(g.finalize())["prompt_id"]
+        time.sleep(1.0)
+        req = urllib.request.Request("http://{}/interrupt".format(client.server_address), data=json.dumps({"prompt_id": prompt_id}).encode("utf-8"))
+        urllib.request.urlopen(req)
+        for _ in range(50):
+            history = client.get_history(prompt_id)
+            if prompt_id in history:
+                break
+            time.sleep(0.1)
+        assert history[prompt_id]["status"]["status_str"] == "error"